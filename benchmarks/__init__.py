@@ -0,0 +1,5 @@
+''' Benchmarks for the gdbmi package.
+
+    Run them from the top of the source tree, e.g.:
+        python -m benchmarks.record_memory
+'''
@@ -0,0 +1,113 @@
+''' A generated, deterministic corpus of GDB/MI output lines.
+
+    Each scenario stresses a different part of the parser; all return a
+    list of bytes lines (without newlines). `scale` multiplies the size.
+'''
+import random
+
+
+_named = {0x5c: '\\\\', 0x22: '\\"', 0x0a: '\\n', 0x08: '\\b', 0x09: '\\t',
+        0x0c: '\\f', 0x0d: '\\r', 0x1b: '\\e', 0x07: '\\a'}
+
+def _c_quote(b):
+    # Escape like gdb's printchar().
+    out = []
+    for c in bytearray(b):
+        if c in _named:
+            out.append(_named[c])
+        elif 32 <= c < 127:
+            out.append(chr(c))
+        else:
+            out.append('\\%03o' % c)
+    return '"%s"' % ''.join(out)
+
+_funcs = ['recurse', 'visit_node', 'walk_tree', 'dispatch_event', 'std::vector<int>::push_back']
+
+def backtraces(scale=1):
+    ''' Deep -stack-list-frames replies. '''
+    lines = []
+    for n in range(20 * scale):
+        frames = []
+        for i in range(500):
+            func = _funcs[(i + n) % len(_funcs)]
+            frames.append('frame={level="%d",addr="0x%016x",func="%s",'
+                    'file="walk.c",fullname="/home/user/src/project/walk.c",'
+                    'line="%d",arch="i386:x86-64"}' % (i, 0x401000 + 48 * (i % 97), func, 100 + i % 311))
+        lines.append('%d^done,stack=[%s]' % (n, ','.join(frames)))
+    return [line.encode('ascii') for line in lines]
+
+def var_children(scale=1):
+    ''' Wide -var-list-children replies, as for a big array. '''
+    lines = []
+    for n in range(20 * scale):
+        children = []
+        for i in range(1000):
+            children.append('child={name="var%d.[%d]",exp="[%d]",numchild="0",'
+                    'value="%d",type="int",thread-id="1"}' % (n, i, i, (i * 7919) % 100003))
+        lines.append('%d^done,numchild="1000",children=[%s],has-more="0"' % (n, ','.join(children)))
+    return [line.encode('ascii') for line in lines]
+
+def source_files(scale=1):
+    ''' Huge -file-list-exec-source-files replies. '''
+    rng = random.Random(20)
+    dirs = ['src', 'lib', 'include', 'third_party/zlib', 'third_party/boost/libs/asio']
+    lines = []
+    for n in range(2 * scale):
+        files = []
+        for i in range(10000):
+            path = '%s/%s/mod%d_%d.cc' % (dirs[i % len(dirs)], 'pkg%d' % rng.randrange(50), i, n)
+            files.append('{file="%s",fullname="/build/project/%s",debug-fully-read="false"}' % (path, path))
+        lines.append('%d^done,files=[%s]' % (n, ','.join(files)))
+    return [line.encode('ascii') for line in lines]
+
+def console(scale=1):
+    ''' Long console stream records, full of escapes. '''
+    rng = random.Random(4)
+    words = [b'value', b'= {', b'}', b'"quoted"', b'back\\slash', b'tab\there', b'\r\x07\x00\x0b',
+            b'\x1b[1;32mcolour\x1b[0m', b'caf\xc3\xa9', b'\xff\x01', b'0x7fffffffe0a0']
+    lines = []
+    for _ in range(5000 * scale):
+        text = b' '.join(rng.choice(words) for _ in range(rng.randrange(10, 40))) + b'\n'
+        lines.append(b'~' + _c_quote(text).encode('ascii'))
+    return lines
+
+def memory(scale=1):
+    ''' Bulk -data-read-memory-bytes replies, 64KiB each. '''
+    rng = random.Random(8)
+    lines = []
+    for n in range(16 * scale):
+        begin = 0x7ffff7a00000 + n * 0x10000
+        contents = ''.join('%02x' % rng.randrange(256) for _ in range(0x10000))
+        lines.append('%d^done,memory=[{begin="0x%x",offset="0x0000000000000000",'
+                'end="0x%x",contents="%s"}]' % (n, begin, begin + 0x10000, contents))
+    return [line.encode('ascii') for line in lines]
+
+def session(scale=1):
+    ''' The small records of a typical stepping session. '''
+    lines = []
+    for n in range(2000 * scale):
+        lines += [
+            '%d^running' % n,
+            '*running,thread-id="all"',
+            '(gdb) ',
+            '=breakpoint-modified,bkpt={number="1",type="breakpoint",disp="keep",'
+            'enabled="y",addr="0x0000555555555149",func="main",file="a.c",'
+            'fullname="/src/a.c",line="%d",thread-groups=["i1"],times="%d",'
+            'original-location="a.c:%d"}' % (n % 50, n, n % 50),
+            '*stopped,reason="end-stepping-range",frame={addr="0x0000555555555151",'
+            'func="main",args=[],file="a.c",fullname="/src/a.c",line="%d",'
+            'arch="i386:x86-64"},thread-id="1",stopped-threads="all",core="%d"' % (n % 50, n % 8),
+            '=thread-created,id="%d",group-id="i1"' % (n % 16 + 2),
+            '~"step %d\\n"' % n,
+            '(gdb) ',
+        ]
+    return [line.encode('ascii') for line in lines]
+
+scenarios = [
+    ('backtraces', backtraces),
+    ('var_children', var_children),
+    ('source_files', source_files),
+    ('console', console),
+    ('memory', memory),
+    ('session', session),
+]
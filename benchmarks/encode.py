@@ -0,0 +1,81 @@
+''' Throughput of the MI command encoder.
+
+    The size and speed of whole commands are compared with the old
+    all-octal quoting. That the encoding is read back correctly by
+    GDB is checked by tests/test_encode.py.
+'''
+import argparse
+import random
+import time
+
+from gdbmi.mixin import MiCommandsMixin, quote
+
+
+class _Encoder(MiCommandsMixin):
+    def __init__(self):
+        self.counter = iter(range(1 << 62))
+    def raw_command(self, token, line):
+        return line
+
+def _old_mi(cmd, args, kwargs, token=0):
+    # _mi as it was, with quote() on every argument.
+    bits = ['%d%s' % (token, cmd)]
+    has_kwargs = False
+    for (k, v) in sorted(kwargs.items()):
+        if v is None:
+            continue
+        has_kwargs = True
+        k = k.replace('_', '-')
+        bits.append(('--' if len(k) > 1 else '-') + k)
+        if v:
+            bits.append(quote(v))
+    if args:
+        if has_kwargs:
+            bits.append('--')
+        bits.extend(quote(a) for a in args if a is not None)
+    return ' '.join(bits).encode('ascii')
+
+def _workload(n):
+    rng = random.Random(2)
+    for i in range(n):
+        yield '-data-evaluate-expression', ['node->children[%d].name' % i], {}
+        yield '-break-insert', ['walk.c:%d' % rng.randrange(1, 5000)], {
+                't': None, 'h': None, 'f': None, 'd': None, 'a': None,
+                'c': 'depth > %d' % (i % 10), 'i': None, 'p': None}
+        yield '-data-read-memory-bytes', ['0x%x' % (0x7ffff7a00000 + 64 * i), '64'], {'o': None}
+        yield '-var-create', ['-', '*', 'tree.nodes[%d]' % i], {}
+        yield '-stack-list-frames', ['0', '%d' % i], {'no_frame_filters': None}
+
+def throughput(n, repeat):
+    work = list(_workload(n))
+    gdb = _Encoder()
+    def new():
+        return [gdb._mi(cmd, args, kwargs) for cmd, args, kwargs in work]
+    def old():
+        return [_old_mi(cmd, args, kwargs) for cmd, args, kwargs in work]
+    rv = {}
+    for name, fn in [('old', old), ('new', new)]:
+        size = sum(len(line) + 1 for line in fn())
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        rv[name] = (len(work) / best, size)
+    return rv
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--commands', type=int, default=4000)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    results = throughput(args.commands, args.repeat)
+    print('%-6s %14s %14s' % ('', 'commands/s', 'bytes sent'))
+    for name in ['old', 'new']:
+        rate, size = results[name]
+        print('%-6s %14.0f %14d' % (name, rate, size))
+
+if __name__ == '__main__':
+    main()
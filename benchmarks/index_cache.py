@@ -0,0 +1,113 @@
+''' Time to load a big executable's symbols, with symcache.IndexCache.
+
+    A C program with many functions and types is generated and built
+    with `gcc -g`, unless --executable is given. Each load is in a new
+    GDB session, and ends with looking up the last function, so GDB has
+    read (or indexed) the debug info it needs:
+
+      * cold: without the cache, as before it existed;
+      * first: with an empty cache, so this includes saving the index;
+      * second: with the cache filled by the first.
+'''
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from gdbmi.parser import result_record
+from gdbmi.pipe import PipeGdbMi
+from gdbmi.symcache import IndexCache
+
+
+_unit = '''
+struct node_%(u)d_%(i)d {
+    int key;
+    double weight[%(n)d];
+    struct node_%(u)d_%(i)d *children[4];
+    const char *name;
+};
+
+int f_%(u)d_%(i)d(struct node_%(u)d_%(i)d *n, int depth)
+{
+    int total = n->key;
+    for (int c = 0; c < 4; c++)
+        if (n->children[c] && depth > 0)
+            total += f_%(u)d_%(i)d(n->children[c], depth - 1);
+    return total;
+}
+'''
+
+def build(directory, units, functions):
+    ''' Write and compile the program; return (path, last function). '''
+    sources = []
+    for u in range(units):
+        path = os.path.join(directory, 'unit%d.c' % u)
+        with open(path, 'w') as f:
+            for i in range(functions):
+                f.write(_unit % {'u': u, 'i': i, 'n': 1 + i % 7})
+        sources.append(path)
+    main = os.path.join(directory, 'main.c')
+    with open(main, 'w') as f:
+        f.write('int main(void) { return 0; }\n')
+    exe = os.path.join(directory, 'big')
+    subprocess.check_call(['gcc', '-g', '-O0', '-Wl,--build-id', '-o', exe, main] + sources)
+    return exe, 'f_%d_%d' % (units - 1, functions - 1)
+
+def load(exe, profile, path, function, cache=None):
+    ''' Seconds to load `path` and look up `function` in a new session. '''
+    gdb = PipeGdbMi(exe, profile)
+    try:
+        if cache is not None:
+            cache.configure(gdb)
+        start = time.perf_counter()
+        if cache is None:
+            result_record(gdb.mi_file_exec_and_symbols(path))
+        else:
+            cache.load(gdb, path)
+        result_record(gdb.mi_data_evaluate_expression('&' + function))
+        return time.perf_counter() - start
+    finally:
+        gdb.mi_gdb_exit()
+        gdb.wait()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--gdb', default='gdb')
+    ap.add_argument('--profile', default='fast', help='see gdbmi.launch')
+    ap.add_argument('--units', type=int, default=40)
+    ap.add_argument('--functions', type=int, default=500,
+            help='functions (and types) per compilation unit')
+    ap.add_argument('--executable', help='load this, instead of building one')
+    ap.add_argument('--function', default='main',
+            help='function to look up in --executable')
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='gdbmi-index-cache-')
+    try:
+        if args.executable is not None:
+            path, function = os.path.abspath(args.executable), args.function
+        else:
+            path, function = build(tmp, args.units, args.functions)
+        print('%s: %.1f MB' % (path, os.path.getsize(path) / 1e6))
+        cache = IndexCache(os.path.join(tmp, 'cache'))
+
+        cold = min(load(args.gdb, args.profile, path, function)
+                for _ in range(args.repeat))
+        first = load(args.gdb, args.profile, path, function, cache)
+        if not cache.size():
+            print('no index was saved (does it have DWARF, and no index yet?)')
+        second = min(load(args.gdb, args.profile, path, function, cache)
+                for _ in range(args.repeat))
+
+        print('%-8s %10s %9s' % ('load', 'seconds', 'vs cold'))
+        for name, seconds in [('cold', cold), ('first', first), ('second', second)]:
+            print('%-8s %10.3f %8.2fx' % (name, seconds, cold / seconds))
+        print('second load is %.1fx faster than the first' % (first / second))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+''' Throughput and allocations of the parsing and encoding hot paths.
+
+    Every scenario in benchmarks.corpus is parsed with each engine and
+    layout; _c_string and MiCommandsMixin._mi are measured on their own.
+    Reports lines/s, MB/s and memory blocks retained per record.
+
+    Throughput is also given relative to the Tokenizer-based engine
+    (parse(fast=False)) on a reference scenario, measured in the same
+    run, so that it does not depend on the machine. baselines.json (next
+    to this file) records those ratios. A case fails if its ratio drops
+    by more than --tolerance, or if it retains more blocks per record
+    than recorded, which is deterministic and so is checked tightly.
+    Exits non-zero on any failure. Use --update to record new baselines,
+    after a deliberate change.
+'''
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+from gdbmi import parser
+from gdbmi.mixin import MiCommandsMixin, PrintValues
+
+from . import corpus
+
+
+_baselines = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+_engines = [
+    ('fast', {}),
+    ('compact', {'compact': True}),
+    ('lazy', {'lazy': True}),
+    ('checked', {'checked': True}),
+    ('tokenizer', {'fast': False}),
+]
+
+# The case each one's throughput is compared to: the Tokenizer-based
+# engine on the same scenario, or for the other hot paths, on the one
+# closest to their input.
+_reference_engine = 'tokenizer'
+
+def reference(case):
+    kind, rest = case.split('/', 1)
+    if kind == 'parse':
+        scenario = rest.split('/')[0]
+    elif kind == 'c_string':
+        scenario = rest
+    else:
+        scenario = 'session'
+    return 'parse/%s/%s' % (scenario, _reference_engine)
+
+def _loops(fn, min_time):
+    # Calls per sample, for samples long enough to not be all noise.
+    start = time.perf_counter()
+    fn()
+    once = time.perf_counter() - start
+    return max(1, int(min_time / once))
+
+def _time(fns, repeat, min_time=0.2):
+    # Best time of each function, over `repeat` samples. The samples of
+    # each are taken in turn, so they all see the same machine load.
+    loops = [_loops(fn, min_time) for fn in fns]
+    best = [None] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            start = time.perf_counter()
+            for _ in range(loops[i]):
+                fn()
+            elapsed = (time.perf_counter() - start) / loops[i]
+            if best[i] is None or elapsed < best[i]:
+                best[i] = elapsed
+    return best
+
+def _blocks_per_item(fn, n):
+    # Blocks still allocated while the results are alive.
+    gc.collect()
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        kept = fn()
+        after = sys.getallocatedblocks()
+    finally:
+        gc.enable()
+    del kept
+    return (after - before) / n
+
+# Each returns (run, items, bytes), where run() returns a list of `items`
+# results for `bytes` of input.
+
+def bench_parse(lines, **kwargs):
+    parse = parser.parse
+    def run():
+        return [parse(line, **kwargs) for line in lines]
+    # Once first, to fill the intern tables.
+    run()
+    return run, len(lines), sum(len(line) + 1 for line in lines)
+
+def bench_c_string(lines):
+    bodies = [line[1:] for line in lines]
+    c_string = parser._c_string
+    def run():
+        return [c_string(b) for b in bodies]
+    return run, len(bodies), sum(len(line) for line in lines)
+
+class _Encoder(MiCommandsMixin):
+    def __init__(self):
+        self.counter = iter(range(1 << 62))
+    def raw_command(self, token, line):
+        return line
+
+def _commands(n):
+    gdb = _Encoder()
+    for i in range(n):
+        yield lambda i=i: gdb.mi_break_insert('/home/user/src/project/walk.c:%d' % i, condition='depth > 10')
+        yield lambda i=i: gdb.mi_data_evaluate_expression('node->children[%d].name' % i)
+        yield lambda i=i: gdb.mi_var_create('-', '*', 'tree.nodes[%d]' % i)
+        yield lambda i=i: gdb.mi_var_list_children('var%d' % i, print_values=PrintValues.all_values)
+        yield lambda i=i: gdb.mi_data_read_memory_bytes('0x7ffff7a00000', '65536')
+
+def bench_mi(n):
+    calls = list(_commands(n))
+    def run():
+        return [call() for call in calls]
+    out = run()
+    return run, len(calls), sum(len(line) + 1 for line in out)
+
+def run_all(scale, repeat, only=None):
+    ''' Return {case: {'lines_per_s', 'mb_per_s', 'blocks_per_record',
+        'vs_reference'}}.
+    '''
+    benches = {}
+    for name, make in corpus.scenarios:
+        lines = make(scale)
+        for engine, kwargs in _engines:
+            benches['parse/%s/%s' % (name, engine)] = (bench_parse, lines, kwargs)
+    benches['c_string/console'] = (bench_c_string, corpus.console(scale), {})
+    benches['encode/_mi'] = (bench_mi, 2000 * scale, {})
+    def prepare(case):
+        bench, arg, kwargs = benches[case]
+        return bench(arg, **kwargs)
+
+    results = {}
+    # In this order: blocks retained depend a little on what ran before.
+    for case in benches:
+        if only and not any(o in case for o in only):
+            continue
+        run, n, size = prepare(case)
+        blocks = _blocks_per_item(run, n)
+        if case == reference(case):
+            elapsed, = _time([run], repeat)
+            ratio = 1.0
+        else:
+            elapsed, ref_elapsed = _time([run, prepare(reference(case))[0]], repeat)
+            ratio = ref_elapsed / elapsed
+        results[case] = {
+            'lines_per_s': n / elapsed,
+            'mb_per_s': size / elapsed / 1e6,
+            'blocks_per_record': round(blocks, 3),
+            'vs_reference': round(ratio, 3),
+        }
+    return results
+
+def check(results, baselines, tolerance):
+    ''' Return a list of regressions, as strings. '''
+    failures = []
+    for case, r in sorted(results.items()):
+        base = baselines.get(case)
+        if base is None:
+            continue
+        if 'vs_reference' in base and r['vs_reference'] < base['vs_reference'] * (1 - tolerance):
+            failures.append('%s: %.3fx the reference, baseline %.3fx' % (
+                    case, r['vs_reference'], base['vs_reference']))
+        # Allow for rounding, and a few blocks of noise per run.
+        if r['blocks_per_record'] > base['blocks_per_record'] * 1.01 + 0.01:
+            failures.append('%s: %.3f blocks/record, baseline %.3f' % (
+                    case, r['blocks_per_record'], base['blocks_per_record']))
+    return failures
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--scale', type=int, default=1)
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--tolerance', type=float, default=0.35,
+            help='allowed fractional drop in throughput, relative to the reference')
+    ap.add_argument('--runs', type=int, default=1,
+            help='run everything this many times; --update records the lowest '
+            'ratio to the reference seen, and checks use the highest')
+    ap.add_argument('--update', action='store_true', help='record new baselines')
+    ap.add_argument('--baselines', default=_baselines)
+    ap.add_argument('only', nargs='*', help='only run cases containing these')
+    args = ap.parse_args()
+
+    results = run_all(args.scale, args.repeat, args.only)
+    pick = min if args.update else max
+    for _ in range(args.runs - 1):
+        for case, r in run_all(args.scale, args.repeat, args.only).items():
+            if pick(r['vs_reference'], results[case]['vs_reference']) != results[case]['vs_reference']:
+                results[case] = r
+    try:
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    except IOError:
+        baselines = {}
+
+    print('%-32s %12s %9s %14s %8s %9s' % (
+            'case', 'lines/s', 'MB/s', 'blocks/record', 'vs ref', 'vs base'))
+    for case, r in sorted(results.items()):
+        base = baselines.get(case)
+        rel = ''
+        if base and 'vs_reference' in base:
+            rel = '%+8.0f%%' % (100 * (r['vs_reference'] / base['vs_reference'] - 1))
+        print('%-32s %12.0f %9.1f %14.3f %7.2fx %9s' % (case, r['lines_per_s'],
+                r['mb_per_s'], r['blocks_per_record'], r['vs_reference'], rel))
+
+    if args.update:
+        # Absolute numbers are only meaningful on this machine.
+        baselines.update((case, {
+            'vs_reference': r['vs_reference'],
+            'blocks_per_record': r['blocks_per_record'],
+        }) for case, r in results.items())
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        return
+    failures = check(results, baselines, args.tolerance)
+    if failures:
+        print('\nREGRESSIONS:', file=sys.stderr)
+        for failure in failures:
+            print('  ' + failure, file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
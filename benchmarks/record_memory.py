@@ -0,0 +1,57 @@
+''' Compare memory use of the default and compact Record layouts.
+
+    The transcript is a synthetic 100k-frame backtrace (a deep recursion
+    through a handful of functions), both as a single -stack-list-frames
+    reply and as one -stack-info-frame reply per frame.
+'''
+import argparse
+import gc
+import time
+import tracemalloc
+
+from gdbmi import parser
+
+
+_funcs = ['recurse', 'visit_node', 'walk', 'dispatch', 'apply']
+
+def _frame(i):
+    func = _funcs[i % len(_funcs)]
+    return ('{level="%d",addr="0x%016x",func="%s",file="walk.c",'
+            'fullname="/home/user/src/project/walk.c",line="%d",'
+            'arch="i386:x86-64"}' % (i, 0x401000 + 16 * (i % len(_funcs)), func, 100 + i % len(_funcs)))
+
+def backtrace_line(n):
+    return '^done,stack=[%s]' % ','.join('frame=' + _frame(i) for i in range(n))
+
+def frame_lines(n):
+    return ['%d^done,frame=%s' % (i, _frame(i)) for i in range(n)]
+
+def measure(lines, **kwargs):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = [parser.parse(line, **kwargs) for line in lines]
+    elapsed = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size, peak, elapsed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--frames', type=int, default=100000)
+    args = ap.parse_args()
+
+    transcripts = [
+        ('backtrace (1 record)', [backtrace_line(args.frames)]),
+        ('frames (%d records)' % args.frames, frame_lines(args.frames)),
+    ]
+    print('%-24s %-8s %12s %12s %9s' % ('transcript', 'layout', 'retained', 'peak', 'time'))
+    for name, lines in transcripts:
+        for layout, kwargs in [('default', {}), ('compact', {'compact': True})]:
+            size, peak, elapsed = measure(lines, **kwargs)
+            print('%-24s %-8s %10.1fMB %10.1fMB %8.2fs' % (
+                name, layout, size / 1e6, peak / 1e6, elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+''' Time to import a backend, start GDB and get the first reply.
+
+    Each run uses a fresh interpreter, so import costs are included.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+_script = r'''
+import json, sys, time
+t0 = time.perf_counter()
+if sys.argv[1] == 'twisted':
+    from gdbmi.sync import GdbMi
+else:
+    from gdbmi.pipe import PipeGdbMi as GdbMi
+t1 = time.perf_counter()
+gdb = GdbMi(sys.argv[2], sys.argv[3])
+t2 = time.perf_counter()
+gdb.mi_gdb_version()
+t3 = time.perf_counter()
+print(json.dumps([t1 - t0, t2 - t1, t3 - t2]))
+'''
+
+def run(backend, exe, profile):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output([sys.executable, '-c', _script, backend, exe, profile], cwd=root)
+    return json.loads(out.decode('ascii').splitlines()[-1])
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--exe', default='gdb')
+    ap.add_argument('--profile', default='default', help='see gdbmi.launch')
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('backends', nargs='*', default=['pipe', 'twisted'])
+    args = ap.parse_args()
+
+    print('%-8s %10s %10s %10s %10s' % ('backend', 'import', 'start', 'command', 'total'))
+    for backend in args.backends:
+        runs = [run(backend, args.exe, args.profile) for _ in range(args.repeat)]
+        best = [min(col) for col in zip(*runs)]
+        print('%-8s %8.1fms %8.1fms %8.1fms %8.1fms' % (
+            backend, *(1000 * t for t in best + [sum(best)])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+''' Throughput of core-dump triage: cores per second.
+
+    The same cores are triaged one at a time, the old way (a new
+    sync.GdbMi per core), and by gdbmi.triage with different numbers of
+    worker processes.
+
+    Give an executable and a core to measure real GDB; each run triages
+    that core --cores times. With --stand-in, tests/fakegdb.py plays
+    GDB instead, and answers at once: that measures what triage itself
+    costs per core (spawning, dispatch, parsing and JSON), and so the
+    most it could ever do.
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+from gdbmi import triage
+from gdbmi.parser import MiError, result_record
+
+
+_stand_in = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'tests', 'fakegdb.py')
+
+def serial(pairs, exe, profile):
+    ''' One new session per core, as before triage existed. '''
+    from gdbmi.sync import GdbMi
+    errors = 0
+    for executable, core in pairs:
+        gdb = GdbMi(exe, profile)
+        try:
+            result_record(gdb.mi_file_exec_and_symbols(executable))
+            triage.backtraces(gdb, core)
+        except MiError:
+            errors += 1
+        gdb.mi_gdb_exit()
+    return errors
+
+def parallel(pairs, exe, profile, processes, sessions):
+    errors = 0
+    for rv in triage.triage(pairs, processes, exe, sessions, profile=profile):
+        # As the CLI does.
+        json.dumps(rv, sort_keys=True)
+        errors += 'error' in rv
+    return errors
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--gdb', default='gdb')
+    ap.add_argument('--profile', default='fast', help='see gdbmi.launch')
+    ap.add_argument('--stand-in', action='store_true',
+            help='use tests/fakegdb.py, not GDB')
+    ap.add_argument('--cores', type=int, default=200)
+    ap.add_argument('--sessions', type=int, default=2)
+    ap.add_argument('-j', '--processes', default='1,2,4',
+            help='comma-separated numbers of worker processes to try')
+    ap.add_argument('--no-serial', action='store_true',
+            help='skip the one-session-per-core run')
+    ap.add_argument('files', nargs='*', metavar='EXECUTABLE CORE')
+    args = ap.parse_args()
+
+    if args.stand_in:
+        if args.files:
+            ap.error('--stand-in does not take an executable and core')
+        # Any existing files do; the pool looks at the executable.
+        exe, profile = _stand_in, 'default'
+        executable, core = sys.executable, _stand_in
+    else:
+        if len(args.files) != 2:
+            ap.error('need an executable and a core, or --stand-in')
+        exe, profile = args.gdb, args.profile
+        executable, core = [os.path.abspath(f) for f in args.files]
+    pairs = [(executable, core)] * args.cores
+
+    runs = []
+    if not args.no_serial:
+        runs.append(('serial', lambda: serial(pairs, exe, profile)))
+    for j in [int(j) for j in args.processes.split(',')]:
+        runs.append(('triage -j %d' % j,
+                lambda j=j: parallel(pairs, exe, profile, j, args.sessions)))
+
+    print('%-14s %8s %10s %8s %9s' % ('run', 'cores', 'seconds', 'cores/s', 'speedup'))
+    base = None
+    for name, run in runs:
+        start = time.monotonic()
+        errors = run()
+        elapsed = time.monotonic() - start
+        rate = len(pairs) / elapsed
+        if base is None:
+            base = rate
+        print('%-14s %8d %10.2f %8.1f %8.1fx' % (name, len(pairs), elapsed, rate, rate / base))
+        if errors:
+            print('  %d errors' % errors, file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 ''' Interfaces to GDB's MI mode.
 
     There are three ways to use this module:
-      * Synchronously, by creating an instance of .sync.GdbMi
-        (This is the easiest way for scripting).
+      * Synchronously, by creating an instance of .pipe.PipeGdbMi
+        (This is the easiest way for scripting), or of .sync.GdbMi
+        if you want it to be driven by a Twisted reactor. Only the
+        latter imports Twisted. To run many short tasks against the
+        same executables, lease sessions from a .pool.SessionPool.
       * Asynchronously, by subclassing .protocol.GdbMiProtocol and handling
         events as they come. Note that under normal circumstances, GDB is
         not *truly* asynchronous, but it can be configured to be.
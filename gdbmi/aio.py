@@ -0,0 +1,179 @@
+''' asyncio backend, for when Twisted is not wanted.
+
+    Usage:
+        gdb = await AsyncGdbMi.start()
+        record, oob = await gdb.mi_gdb_version()
+        async for record in gdb.events():
+            ...
+'''
+import asyncio
+import itertools
+import signal
+import subprocess
+import time
+
+from .dispatch import Dispatcher
+from .framing import LineBuffer
+from .launch import gdb_command, report_startup
+from .metrics import ReplyMeter
+from .mixin import MiCommandsMixin, encode_line
+from .parser import parse
+from . import metrics
+from . import parser
+
+
+class AsyncGdbMi(MiCommandsMixin):
+    ''' GDB/MI over an asyncio subprocess.
+
+        Every mi_* method returns a Future, which resolves to
+        (result_record, out_of_band_records), like the Deferreds of
+        protocol.DeferredGdbMiProtocol. If GDB exits, outstanding
+        Futures fail with ConnectionError.
+
+        Out-of-band records are also available from events().
+
+        Use the start() coroutine rather than creating this directly.
+    '''
+    # See parser.parse().
+    lazy = False
+    compact = False
+
+    def __init__(self, loop, max_in_flight=None):
+        self._loop = loop
+        self.counter = itertools.count()
+        self._lines = LineBuffer()
+        self._meter = ReplyMeter()
+        self._dispatcher = Dispatcher(self._send,
+                _resolve_future, _fail_future, max_in_flight)
+        self._subscribers = set()
+        self._ready = loop.create_future()
+        self._exited = loop.create_future()
+        self._transport = None
+        self._stdin = None
+
+    @classmethod
+    async def start(cls, exe='gdb', max_in_flight=None, profile='default'):
+        ''' Spawn GDB, and wait for its initial prompt.
+
+            `profile` is a launch.Profile, or the name of one.
+        '''
+        loop = asyncio.get_running_loop()
+        self = cls(loop, max_in_flight)
+        full_exe, args, env = gdb_command(exe, profile)
+        spawned = time.monotonic()
+        # Like ExecGdbMiEndpoint, stderr is passed through.
+        transport, _ = await loop.subprocess_exec(
+                lambda: _GdbMiSubprocessProtocol(self),
+                full_exe, *args[1:], env=env,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None)
+        self._transport = transport
+        self._stdin = transport.get_pipe_transport(0)
+        await self._ready
+        # Seconds from spawning GDB to its first prompt.
+        self.startup_time = report_startup(self, spawned)
+        return self
+
+    @property
+    def pid(self):
+        return self._transport.get_pid()
+
+    def raw_command(self, token, line):
+        future = self._loop.create_future()
+        if self._exited.done():
+            future.set_exception(ConnectionError('gdb has exited'))
+        else:
+            self._dispatcher.submit(token, encode_line(line), future)
+        return future
+
+    def raw_commands(self, tokens, lines):
+        futures = [self._loop.create_future() for _ in tokens]
+        if self._exited.done():
+            for future in futures:
+                future.set_exception(ConnectionError('gdb has exited'))
+        else:
+            self._dispatcher.submit_many(zip(tokens, map(encode_line, lines), futures))
+        return futures
+
+    def _send(self, line):
+        self._stdin.write(line + b'\n')
+
+    async def events(self):
+        ''' Asynchronously iterate over out-of-band records.
+
+            Only records that arrive while iterating are seen. Iteration
+            stops when GDB exits.
+        '''
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while True:
+                record = await queue.get()
+                if record is None:
+                    return
+                yield record
+        finally:
+            self._subscribers.discard(queue)
+
+    async def wait(self):
+        ''' Wait for GDB to exit, and return its exit status.
+        '''
+        await self._exited
+        return self._transport.get_returncode()
+
+    def do_signal_interrupt(self):
+        self._transport.send_signal(signal.SIGINT)
+    def do_signal_terminate(self):
+        self._transport.terminate()
+    def do_signal_kill(self):
+        self._transport.kill()
+    def do_close(self):
+        self._stdin.close()
+
+    def _data_received(self, data):
+        lazy = self.lazy
+        compact = self.compact
+        lines = self._lines.feed(data)
+        if metrics.enabled:
+            records = self._meter.parse(lines, lazy, compact)
+        else:
+            records = [parse(line, lazy=lazy, compact=compact) for line in lines]
+        for record in records:
+            if self._dispatcher.handle_record(record):
+                continue
+            if isinstance(record, parser.PromptRecord):
+                if not self._ready.done():
+                    self._ready.set_result(None)
+                continue
+            for queue in self._subscribers:
+                queue.put_nowait(record)
+
+    def _process_exited(self):
+        if self._exited.done():
+            return
+        self._exited.set_result(None)
+        self._dispatcher.fail_all(ConnectionError('gdb has exited'))
+        if not self._ready.done():
+            self._ready.set_exception(ConnectionError('gdb exited during startup'))
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+def _resolve_future(future, record, oob):
+    if not future.done():
+        future.set_result((record, oob))
+
+def _fail_future(future, reason):
+    if not future.done():
+        future.set_exception(reason)
+
+
+class _GdbMiSubprocessProtocol(asyncio.SubprocessProtocol):
+    def __init__(self, gdb):
+        self._gdb = gdb
+
+    def pipe_data_received(self, fd, data):
+        if fd == 1:
+            self._gdb._data_received(data)
+
+    def connection_lost(self, exc):
+        # Unlike process_exited(), this waits for the pipes to be drained.
+        self._gdb._process_exited()
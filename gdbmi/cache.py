@@ -0,0 +1,258 @@
+''' Caching replies that can only change when the inferior does.
+
+    StopCache wraps a client, and answers repeated requests for
+    registers, frames, locals and expression values from a cache keyed
+    by (thread, frame, stop generation). The generation advances on
+    every *stopped, *running, =thread-selected and =memory-changed
+    record, and after commands that may change the inferior; the cache
+    is then emptied, except for register values: those are refreshed
+    using -data-list-changed-registers, so only registers that changed
+    are fetched again.
+'''
+import re
+
+from .mixin import MiCommandsMixin, encode_line
+from .parser import Class, ExecAsyncRecord, NotifyAsyncRecord, ResultRecord, with_token
+
+
+_line_re = re.compile(br'(\d*)(-\S+)(.*)', re.S)
+
+_advance = frozenset([Class.STOPPED, Class.RUNNING, Class.THREAD_SELECTED, Class.MEMORY_CHANGED])
+
+_cached = frozenset([
+    b'-data-evaluate-expression',
+    b'-data-list-register-names',
+    b'-stack-info-depth',
+    b'-stack-info-frame',
+    b'-stack-list-arguments',
+    b'-stack-list-frames',
+    b'-stack-list-locals',
+    b'-stack-list-variables',
+])
+
+# Commands after which nothing cached can be trusted. GDB does not
+# always report changes made by the MI client itself.
+_mutating = (b'-exec-', b'-data-write-', b'-var-assign', b'-gdb-set',
+        b'-interpreter-exec', b'-target-', b'-file-')
+
+# Assignment (including <<= and >>=), increment or decrement, or a
+# function call (a '(' after a name, ')' or ']'), in an expression.
+_side_effect_re = re.compile(br'<<=|>>=|(?<![=!<>])=(?!=)|\+\+|--|[\w)\]]\s*\(')
+
+
+class StopCache(MiCommandsMixin):
+    ''' A caching front for a synchronous client (sync.GdbMi,
+        pipe.PipeGdbMi or threaded.ThreadedGdbMi).
+
+        Use its mi_* methods instead of the client's; replies from the
+        cache are a list of a copy of the ResultRecord, with the token of
+        the new command. Every record from GDB must be seen by
+        observe(). Replies to commands sent through here are; records
+        that arrive between commands are too if they are waited for
+        with this wait_for_replies(). ThreadedGdbMi has no
+        wait_for_replies(): pass what is taken from its `events` to
+        observe() instead.
+
+        Commands sent to the client directly are not seen either; if they
+        may change anything, call advance().
+    '''
+    def __init__(self, gdb):
+        self._gdb = gdb
+        self.generation = 0
+        # The selected thread id (bytes) and frame level, if known.
+        self.thread = None
+        self.frame = None
+        # (thread, frame, command without token) -> ResultRecord
+        self._cache = {}
+        # Register values as of the last -data-list-changed-registers,
+        # for one (thread, frame): {(fmt, options): {number: entry}}.
+        self._registers_at = None
+        self._registers = {}
+        self._registers_generation = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def counter(self):
+        return self._gdb.counter
+
+    def advance(self):
+        ''' Start a new generation, emptying the cache.
+        '''
+        self.generation += 1
+        self._cache.clear()
+
+    def observe(self, records):
+        ''' Advance the generation and note the selected thread and frame,
+            for records from GDB. Returns `records`.
+        '''
+        for r in records:
+            if isinstance(r, (ExecAsyncRecord, NotifyAsyncRecord)) and r._class in _advance:
+                self.advance()
+                if r._class is Class.STOPPED:
+                    self.thread = getattr(r, 'thread_id', self.thread)
+                    self.frame = 0
+                elif r._class is Class.THREAD_SELECTED:
+                    self._select(r.id, r)
+        return records
+
+    def _select(self, thread, r):
+        self.thread = thread
+        frame = getattr(r, 'frame', None)
+        self.frame = int(frame['level']) if frame and 'level' in frame else None
+
+    def wait_for_replies(self, deadline=None):
+        ''' The client's wait_for_replies(), observed.
+        '''
+        return self.observe(self._gdb.wait_for_replies(deadline))
+
+    def raw_command(self, token, line):
+        line = encode_line(line)
+        token_s, cmd, rest = _line_re.match(line).groups()
+        if _cacheable(cmd, rest):
+            key = (self.thread, self.frame, line[len(token_s):])
+            hit = self._cache.get(key)
+            if hit is not None:
+                self.hits += 1
+                return [with_token(hit, token)]
+            self.misses += 1
+            generation = self.generation
+            records = self.observe(self._gdb.raw_command(token, line))
+            self._store(key, records, generation)
+            return records
+        if cmd == b'-data-list-register-values':
+            return self._register_values(token, line, rest)
+        if cmd == b'-data-list-changed-registers':
+            # This moves GDB's base for the next one, which the cached
+            # register values were relative to.
+            self._registers = {}
+        records = self.observe(self._gdb.raw_command(token, line))
+        r = _result(records)
+        if cmd.startswith(_mutating) or cmd == b'-data-evaluate-expression':
+            self.advance()
+        elif r is not None and r._class is Class.DONE:
+            if cmd == b'-thread-select':
+                self._select(r.new_thread_id, r)
+            elif cmd == b'-stack-select-frame':
+                self.frame = int(rest.split()[0])
+        return records
+
+    def raw_commands(self, tokens, lines):
+        # Commands that are all simple cache lookups can still be sent
+        # as one write; anything else may change what later ones see.
+        lines = [encode_line(line) for line in lines]
+        matches = [_line_re.match(line).groups() for line in lines]
+        if not all(_cacheable(cmd, rest) for (_, cmd, rest) in matches):
+            return MiCommandsMixin.raw_commands(self, tokens, lines)
+        rv = []
+        misses = []
+        for token, line, (token_s, _, _) in zip(tokens, lines, matches):
+            key = (self.thread, self.frame, line[len(token_s):])
+            hit = self._cache.get(key)
+            if hit is not None:
+                self.hits += 1
+                rv.append([with_token(hit, token)])
+            else:
+                misses.append((len(rv), key, token, line))
+                rv.append(None)
+        if not misses:
+            return rv
+        self.misses += len(misses)
+        generation = self.generation
+        replies = self._gdb.raw_commands([m[2] for m in misses], [m[3] for m in misses])
+        for (i, key, token, line), records in zip(misses, replies):
+            rv[i] = self.observe(records)
+        for (i, key, token, line) in misses:
+            self._store(key, rv[i], generation)
+        return rv
+
+    def _store(self, key, records, generation):
+        # Not if the generation changed while waiting for the reply.
+        r = _result(records)
+        if self.generation == generation and r is not None and r._class is Class.DONE:
+            self._cache[key] = r
+
+    def _register_values(self, token, line, rest):
+        # -data-list-register-values [options] fmt [regno...]
+        words = rest.split()
+        i = 0
+        while i < len(words) and words[i].startswith(b'-'):
+            i += 1
+        if i == len(words):
+            # No format: GDB has the error message.
+            return self._forward(token, line)
+        fmt = tuple(words[:i + 1])
+        regnos = words[i + 1:]
+        if self._registers_at == (self.thread, self.frame) and fmt in self._registers:
+            values = self._registers[fmt]
+            if self._registers_generation == self.generation:
+                self.hits += 1
+            else:
+                values = self._refresh_registers(fmt, values)
+        else:
+            values = None
+        if values is None:
+            values = self._fetch_registers(fmt)
+            if values is None:
+                return self._forward(token, line)
+        if not all(n in values for n in regnos):
+            # Not a register, or one that is unavailable; again, leave
+            # the reply to GDB.
+            return self._forward(token, line)
+        if regnos:
+            entries = [values[n] for n in regnos]
+        else:
+            entries = list(values.values())
+        return [ResultRecord(token, None, 'done', {'register_values': entries})]
+
+    def _forward(self, token, line):
+        return self.observe(self._gdb.raw_command(token, line))
+
+    def _fetch_registers(self, fmt):
+        # All of them, and a new base for -data-list-changed-registers;
+        # None on failure.
+        self.misses += 1
+        with self._gdb.batch() as b:
+            b.mi_data_list_changed_registers()
+            b._mi('-data-list-register-values', list(fmt), {})
+        for records in b.results:
+            self.observe(records)
+        r = _result(b.results[1])
+        if r is None or r._class is not Class.DONE:
+            return None
+        values = {e['number']: e for e in r.register_values}
+        self._registers_at = (self.thread, self.frame)
+        self._registers = {fmt: values}
+        self._registers_generation = self.generation
+        return values
+
+    def _refresh_registers(self, fmt, values):
+        # Fetch only those that changed since the base; None on failure.
+        self.misses += 1
+        r = _result(self.observe(self._gdb.mi_data_list_changed_registers()))
+        if r is None or r._class is not Class.DONE:
+            return None
+        changed = list(r.changed_registers)
+        values = dict(values)
+        if changed:
+            r = _result(self.observe(self._gdb._mi(
+                    '-data-list-register-values', list(fmt) + changed, {})))
+            if r is None or r._class is not Class.DONE:
+                return None
+            for e in r.register_values:
+                values[e['number']] = e
+        # Values in any other format are now out of date.
+        self._registers = {fmt: values}
+        self._registers_generation = self.generation
+        return values
+
+def _cacheable(cmd, rest):
+    if cmd == b'-data-evaluate-expression':
+        return not _side_effect_re.search(rest)
+    return cmd in _cached
+
+def _result(records):
+    for r in records:
+        if isinstance(r, ResultRecord):
+            return r
+    return None
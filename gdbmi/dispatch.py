@@ -0,0 +1,118 @@
+from collections import OrderedDict, deque
+import time
+
+from . import metrics
+from . import parser
+
+
+class Dispatcher(object):
+    ''' Matches replies to outstanding commands by token.
+
+        This knows nothing about the transport or about what kind of
+        object (Deferred, Future, ...) a caller is waiting on; those are
+        supplied as callbacks:
+
+          * send(line) actually writes a command line (bytes).
+          * resolve(waiter, result_record, out_of_band_records) is
+            called when the ResultRecord for a command arrives.
+          * fail(waiter, reason) is called for every outstanding command
+            by fail_all(), e.g. when the connection is lost.
+
+        GDB runs commands in order, so out-of-band records that arrive
+        while commands are in flight are collected for the oldest one.
+
+        If `max_in_flight` is given, commands beyond that many are held
+        back, and sent as earlier ones complete.
+    '''
+    def __init__(self, send, resolve, fail, max_in_flight=None):
+        self._send = send
+        self._resolve = resolve
+        self._fail = fail
+        self.max_in_flight = max_in_flight
+        # token -> (waiter, list of out-of-band records)
+        self._pending = OrderedDict()
+        # (token, line, waiter) not sent yet, due to max_in_flight.
+        self._backlog = deque()
+        # token -> (command, start) for commands from submit_many(), whose
+        # latency is reported here; submit() leaves that to the caller.
+        self._timed = {}
+
+    def __len__(self):
+        ''' Number of commands in flight or held back.
+        '''
+        return len(self._pending) + len(self._backlog)
+
+    def submit(self, token, line, waiter):
+        assert token not in self._pending, token
+        if self._backlog or not self._has_room():
+            self._backlog.append((token, line, waiter))
+        else:
+            self._start(token, line, waiter)
+        if metrics.enabled:
+            metrics.sink.queue_depth('in_flight', len(self))
+
+    def submit_many(self, commands):
+        ''' Submit (token, line, waiter) for many commands, sending all
+            those there is room for with a single call of send().
+        '''
+        lines = []
+        timed = metrics.enabled
+        start = time.perf_counter()
+        for (token, line, waiter) in commands:
+            assert token not in self._pending, token
+            if timed:
+                self._timed[token] = (metrics.command_name(line), start)
+            if self._backlog or not self._has_room():
+                self._backlog.append((token, line, waiter))
+            else:
+                self._pending[token] = (waiter, [])
+                lines.append(line)
+        if lines:
+            # send() adds the last newline.
+            self._send(b'\n'.join(lines))
+        if metrics.enabled:
+            metrics.sink.queue_depth('in_flight', len(self))
+
+    def _has_room(self):
+        return self.max_in_flight is None or len(self._pending) < self.max_in_flight
+
+    def _start(self, token, line, waiter):
+        self._pending[token] = (waiter, [])
+        self._send(line)
+
+    def handle_record(self, record):
+        ''' Returns true if the record completed a command.
+
+            Out-of-band records are collected, but still reported as
+            unclaimed, since others may be interested in them too.
+        '''
+        if isinstance(record, parser.ResultRecord):
+            entry = self._pending.pop(record._token, None)
+            if entry is None:
+                return False
+            waiter, oob = entry
+            if self._timed:
+                timed = self._timed.pop(record._token, None)
+                if timed is not None and metrics.enabled:
+                    metrics.sink.command_latency(timed[0],
+                            time.perf_counter() - timed[1])
+            while self._backlog and self._has_room():
+                self._start(*self._backlog.popleft())
+            self._resolve(waiter, record, oob)
+            return True
+        if isinstance(record, parser.OutOfBandRecord) and self._pending:
+            for waiter, oob in self._pending.values():
+                oob.append(record)
+                break
+        return False
+
+    def fail_all(self, reason):
+        ''' Fail every outstanding command, including held back ones.
+        '''
+        pending = [waiter for (waiter, oob) in self._pending.values()]
+        pending.extend(waiter for (token, line, waiter) in self._backlog)
+        self._pending.clear()
+        self._backlog.clear()
+        self._timed.clear()
+        for waiter in pending:
+            self._fail(waiter, reason)
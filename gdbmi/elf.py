@@ -0,0 +1,76 @@
+''' Just enough ELF parsing to find a file's build-id.
+'''
+import binascii
+import struct
+
+
+_NT_GNU_BUILD_ID = 3
+_PT_NOTE = 4
+_SHT_NOTE = 7
+
+def build_id(path):
+    ''' Return the GNU build-id of an ELF file as a hex string.
+
+        Returns None if the file is not ELF or has no build-id.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            return _build_id(f)
+    except (IOError, OSError, struct.error):
+        return None
+
+def _build_id(f):
+    ident = f.read(16)
+    if len(ident) < 16 or ident[:4] != b'\x7fELF':
+        return None
+    is64 = ident[4:5] == b'\x02'
+    endian = '<' if ident[5:6] == b'\x01' else '>'
+    if is64:
+        header = struct.unpack(endian + 'HHIQQQIHHHHHH', f.read(48))
+    else:
+        header = struct.unpack(endian + 'HHIIIIIHHHHHH', f.read(36))
+    (_, _, _, _, phoff, shoff, _, _, phentsize, phnum, shentsize, shnum, _) = header
+
+    # Section headers are the usual place, but are optional (and may be
+    # stripped), so fall back to the program headers.
+    notes = []
+    for i in range(shnum):
+        f.seek(shoff + i * shentsize)
+        if is64:
+            sh = struct.unpack(endian + 'IIQQQQIIQQ', f.read(64))
+            sh_type, offset, size = sh[1], sh[4], sh[5]
+        else:
+            sh = struct.unpack(endian + 'IIIIIIIIII', f.read(40))
+            sh_type, offset, size = sh[1], sh[4], sh[5]
+        if sh_type == _SHT_NOTE:
+            notes.append((offset, size))
+    for i in range(phnum):
+        f.seek(phoff + i * phentsize)
+        if is64:
+            ph = struct.unpack(endian + 'IIQQQQQQ', f.read(56))
+            p_type, offset, size = ph[0], ph[2], ph[5]
+        else:
+            ph = struct.unpack(endian + 'IIIIIIII', f.read(32))
+            p_type, offset, size = ph[0], ph[1], ph[4]
+        if p_type == _PT_NOTE:
+            notes.append((offset, size))
+
+    for offset, size in notes:
+        f.seek(offset)
+        rv = _find_build_id(f.read(size), endian)
+        if rv is not None:
+            return rv
+    return None
+
+def _find_build_id(data, endian):
+    pos = 0
+    while pos + 12 <= len(data):
+        namesz, descsz, note_type = struct.unpack_from(endian + 'III', data, pos)
+        pos += 12
+        name = data[pos:pos + namesz]
+        pos += (namesz + 3) & ~3
+        desc = data[pos:pos + descsz]
+        pos += (descsz + 3) & ~3
+        if note_type == _NT_GNU_BUILD_ID and name == b'GNU\0':
+            return binascii.hexlify(desc).decode('ascii')
+    return None
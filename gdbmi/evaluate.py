@@ -0,0 +1,151 @@
+''' Evaluating many expressions in one round trip.
+
+    Evaluator installs a small MI command, -gdbmi-evaluate-many, into
+    GDB's Python interpreter; it evaluates all its arguments and returns
+    their values in a single reply. GDB without Python, or older than 13
+    (which added gdb.MICommand), gets the expressions as a Batch of
+    -data-evaluate-expression instead: still one write, but one reply
+    (and parse) per expression.
+'''
+from .mixin import encode_arg
+from .parser import MiError, ResultRecord, result_record
+
+
+command = 'gdbmi-evaluate-many'
+
+# Runs inside GDB. Arguments are [-t THREAD] [-f FRAME] [--] EXPR...,
+# where THREAD is a global thread id and FRAME a level. Replies with
+# values=[...] (with "" for failures) and errors=[{index,msg}...].
+_helper_source = r'''
+import gdb
+
+class _EvaluateMany(gdb.MICommand):
+    def __init__(self):
+        super().__init__('-gdbmi-evaluate-many')
+
+    def invoke(self, argv):
+        thread = frame = None
+        while argv and argv[0] in ('-t', '-f'):
+            if argv[0] == '-t':
+                thread = int(argv[1])
+            else:
+                frame = int(argv[1])
+            argv = argv[2:]
+        if argv and argv[0] == '--':
+            argv = argv[1:]
+        old_thread = gdb.selected_thread()
+        old_frame = None
+        if old_thread is not None:
+            try:
+                old_frame = gdb.selected_frame()
+            except gdb.error:
+                pass
+        try:
+            if thread is not None:
+                for t in gdb.selected_inferior().threads():
+                    if t.global_num == thread:
+                        t.switch()
+                        break
+                else:
+                    raise gdb.GdbError('Invalid thread id: %d' % thread)
+            if frame is not None:
+                f = gdb.newest_frame()
+                for _ in range(frame):
+                    f = f.older()
+                    if f is None:
+                        raise gdb.GdbError('No frame at level %d.' % frame)
+                f.select()
+            values = []
+            errors = []
+            for i, expr in enumerate(argv):
+                try:
+                    values.append(str(gdb.parse_and_eval(expr)))
+                except Exception as e:
+                    values.append('')
+                    errors.append({'index': str(i), 'msg': str(e)})
+            return {'values': values, 'errors': errors}
+        finally:
+            if (thread is not None or frame is not None) and \
+                    old_thread is not None and old_thread.is_valid():
+                old_thread.switch()
+                if old_frame is not None and old_frame.is_valid():
+                    old_frame.select()
+
+_EvaluateMany()
+'''
+
+def install(gdb):
+    ''' Install -gdbmi-evaluate-many into a synchronous client's GDB.
+
+        Returns whether it is now available. Installing again replaces
+        the command, which is harmless.
+    '''
+    with gdb.batch() as b:
+        b.cli_python('exec(%r)' % _helper_source)
+        b.mi_info_gdb_mi_command(command)
+    try:
+        info = result_record(b.results[1])
+    except MiError:
+        return False
+    return info is not None and info.command['exists'] == b'true'
+
+
+class Evaluator(object):
+    ''' Evaluates lists of expressions for a synchronous client
+        (sync.GdbMi, pipe.PipeGdbMi or threaded.ThreadedGdbMi).
+
+        Create one right after connecting; it installs the helper. If
+        that fails, `helper` is false, and evaluate_many() falls back
+        to a Batch.
+    '''
+    def __init__(self, gdb):
+        self._gdb = gdb
+        self.helper = install(gdb)
+
+    def evaluate_many(self, exprs, thread=None, frame=None):
+        ''' Return a list with the value (bytes) of each expression,
+            or a MiError (not raised) for those that failed.
+
+            `thread` (a thread id) and `frame` (a level) select where to
+            evaluate; GDB's selection is unchanged afterwards. If they do
+            not exist, raises MiError (or without the helper, returns a
+            MiError for every expression).
+        '''
+        exprs = list(exprs)
+        if not exprs:
+            return []
+        if self.helper:
+            return self._helper(exprs, thread, frame)
+        return self._batch(exprs, thread, frame)
+
+    def _helper(self, exprs, thread, frame):
+        reply = result_record(self._gdb.mi_gdbmi_evaluate_many(
+                *exprs, thread=thread, frame=frame))
+        values = list(reply.values)
+        for error in reply.errors:
+            values[int(error['index'])] = _error(error['msg'])
+        return values
+
+    def _batch(self, exprs, thread, frame):
+        # MI's own --thread and --frame select only for the one command,
+        # but the mi_* methods would put a '--' after them.
+        options = b''
+        if thread is not None:
+            options += b' --thread ' + encode_arg(thread)
+        if frame is not None:
+            options += b' --frame ' + encode_arg(frame)
+        with self._gdb.batch() as b:
+            for expr in exprs:
+                token = next(b.counter)
+                b.raw_command(token, b'%d-data-evaluate-expression%s %s' % (
+                        token, options, encode_arg(expr)))
+        values = []
+        for records in b.results:
+            try:
+                values.append(result_record(records).value)
+            except MiError as e:
+                values.append(e)
+        return values
+
+def _error(msg):
+    return MiError(ResultRecord(None, None, 'error', {'msg': msg}))
@@ -0,0 +1,57 @@
+class LineBuffer(object):
+    ''' Splits a stream of bytes into lines, incrementally.
+
+        Data is appended to a single growable buffer, and only the bytes
+        that arrived since the last call are searched for the delimiter,
+        so a line that arrives in many chunks costs linear time overall.
+    '''
+    def __init__(self, delimiter=b'\n', max_length=None):
+        self.delimiter = delimiter
+        self.max_length = max_length
+        self._buffer = bytearray()
+        # Everything before this offset is known not to start a delimiter.
+        self._scanned = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data):
+        ''' Append some data, and return a list of all complete lines.
+
+            The lines do not include the delimiter. This never checks
+            `max_length`; see overflowed().
+        '''
+        buf = self._buffer
+        buf += data
+        delimiter = self.delimiter
+        dlen = len(delimiter)
+        start = 0
+        lines = []
+        pos = buf.find(delimiter, self._scanned)
+        if pos != -1:
+            with memoryview(buf) as view:
+                while pos != -1:
+                    lines.append(bytes(view[start:pos]))
+                    start = pos + dlen
+                    pos = buf.find(delimiter, start)
+            # CPython deletes from the front of a bytearray in O(1).
+            del buf[:start]
+        self._scanned = max(len(buf) - dlen + 1, 0)
+        return lines
+
+    def overflowed(self):
+        ''' Return true if the partial line left by feed() is already
+            longer than `max_length`.
+
+            The complete lines before it have been returned by feed(), so
+            callers handle those first, then clear() the partial line.
+        '''
+        return self.max_length is not None and len(self._buffer) > self.max_length
+
+    def clear(self):
+        ''' Discard any partial line, returning it.
+        '''
+        rv = bytes(self._buffer)
+        del self._buffer[:]
+        self._scanned = 0
+        return rv
@@ -0,0 +1,72 @@
+''' How to start GDB, shared by all the backends.
+'''
+import os
+import shutil
+import time
+
+
+class Profile(object):
+    ''' A way to start GDB.
+
+        `args` are extra command-line arguments, `settings` are GDB
+        commands run before anything else (even init files), and `env`
+        is a list of the environment variables to pass on, or None for
+        all of them. `extra_env` is set on top.
+    '''
+    def __init__(self, args=(), settings=(), env=None, extra_env=None):
+        self.args = list(args)
+        self.settings = list(settings)
+        self.env = env
+        self.extra_env = dict(extra_env or {})
+
+profiles = {
+    # GDB as the user has configured it.
+    'default': Profile(),
+    # For short-lived jobs: skip everything that is not needed to
+    # answer MI commands, and anything that could touch the network.
+    'fast': Profile(
+        args=['-nx', '-q'],
+        settings=[
+            'set auto-load off',
+            'set pagination off',
+            'set confirm off',
+            # Errors (but is otherwise harmless) before GDB 12.
+            'set debuginfod enabled off',
+        ],
+        env=['PATH', 'HOME', 'USER', 'TMPDIR', 'LANG', 'LC_ALL', 'LC_CTYPE'],
+        extra_env={'TERM': 'dumb'},
+    ),
+}
+
+def gdb_command(exe='gdb', profile='default'):
+    ''' Return (full_exe, args, env) to spawn an instance of GDB/MI.
+
+        `profile` is a Profile, or the name of one in `profiles`.
+    '''
+    if not isinstance(profile, Profile):
+        profile = profiles[profile]
+    full_exe = shutil.which(exe)
+    args = [exe, '--interpreter=mi2'] + profile.args
+    for setting in profile.settings:
+        args += ['-iex', setting]
+    if profile.env is None:
+        env = os.environ.copy() # The default is retarded.
+    else:
+        env = {k: os.environ[k] for k in profile.env if k in os.environ}
+    #env['SHELL'] = 'gdb-xterm-sh'
+    env.update(profile.extra_env)
+    return full_exe, args, env
+
+
+# Each is called with (client, seconds), when a client has got GDB's first
+# prompt; `seconds` is the time since it spawned GDB.
+startup_hooks = []
+
+def report_startup(client, spawned):
+    ''' Call the startup_hooks, and return the seconds since `spawned`
+        (a time.monotonic()).
+    '''
+    seconds = time.monotonic() - spawned
+    for hook in startup_hooks:
+        hook(client, seconds)
+    return seconds
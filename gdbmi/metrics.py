@@ -0,0 +1,220 @@
+''' Instrumentation of commands, replies and parsing.
+
+    Nothing is recorded unless a sink is installed with set_sink(); until
+    then, instrumented code only pays for checking `metrics.enabled`.
+
+    A sink is any object with the methods of NullSink. MemorySink keeps
+    histograms to look at later, and LoggingSink logs every event.
+'''
+import collections
+import logging
+import math
+import threading
+import time
+
+from .parser import AsyncRecord, OutOfBandRecord, PromptRecord, parse
+
+
+class NullSink(object):
+    ''' Ignores everything. Subclass this to make a sink.
+    '''
+    def command_latency(self, command, seconds):
+        ''' An MI command (e.g. '-break-insert') got its reply.
+        '''
+    def reply_size(self, nbytes, nlines):
+        ''' All lines up to a prompt were received.
+        '''
+    def parse_time(self, seconds, nlines):
+        ''' A batch of lines was parsed.
+        '''
+    def queue_depth(self, queue, depth):
+        ''' A client's queue changed size. `queue` is 'records' (for
+            records not yet returned by a synchronous client) or
+            'in_flight' (for commands without a reply yet).
+        '''
+    def oob_record(self, key):
+        ''' An out-of-band record was received. `key` is its Class for
+            async records, or e.g. 'ConsoleStreamRecord' for streams.
+        '''
+
+enabled = False
+sink = NullSink()
+
+def set_sink(new_sink):
+    ''' Install a sink, or None to disable instrumentation.
+    '''
+    global sink, enabled
+    if new_sink is None:
+        new_sink = NullSink()
+    sink = new_sink
+    enabled = type(new_sink) is not NullSink
+
+
+def command_name(line):
+    ''' The command of an encoded command line, e.g. '-break-insert'
+        for b'12-break-insert main'.
+    '''
+    return line.split(None, 1)[0].lstrip(b'0123456789').decode('ascii')
+
+def track_command(command, start, reply):
+    ''' Report the latency of a command sent at `start` (a perf_counter()).
+
+        `reply` is what raw_command() returned: a list of records from a
+        synchronous client, or a Future or Deferred to be reported when
+        it fires. Anything else (a bare token, or a pipeline.Reply) is
+        not tracked here; batches and pipelines report their commands
+        themselves, as the replies arrive. Returns `reply`.
+    '''
+    if isinstance(reply, list):
+        sink.command_latency(command, time.perf_counter() - start)
+    elif hasattr(reply, 'add_done_callback'):
+        reply.add_done_callback(lambda _:
+                sink.command_latency(command, time.perf_counter() - start))
+    elif hasattr(reply, 'addBoth'):
+        def done(result):
+            sink.command_latency(command, time.perf_counter() - start)
+            return result
+        reply.addBoth(done)
+    return reply
+
+
+class ReplyMeter(object):
+    ''' Per-connection state, to report the size of each reply.
+
+        Clients call parse() instead of parser.parse() while metrics are
+        enabled.
+    '''
+    def __init__(self):
+        self._bytes = 0
+        self._lines = 0
+
+    def parse(self, lines, lazy=False, compact=False):
+        start = time.perf_counter()
+        records = [parse(line, lazy=lazy, compact=compact) for line in lines]
+        sink.parse_time(time.perf_counter() - start, len(lines))
+        for line, record in zip(lines, records):
+            # Plus the newline.
+            self._bytes += len(line) + 1
+            self._lines += 1
+            if isinstance(record, PromptRecord):
+                sink.reply_size(self._bytes, self._lines)
+                self._bytes = 0
+                self._lines = 0
+            elif isinstance(record, AsyncRecord):
+                sink.oob_record(record._class)
+            elif isinstance(record, OutOfBandRecord):
+                sink.oob_record(type(record).__name__)
+        return records
+
+
+class Histogram(object):
+    ''' Counts of values, in buckets that double in size.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        # exponent -> count of values in [2**(e-1), 2**e).
+        self.buckets = collections.Counter()
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.buckets[math.frexp(value)[1]] += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        ''' Return an upper bound on the `q` quantile (0 <= q <= 1).
+        '''
+        if not self.count:
+            return None
+        seen = 0
+        for e in sorted(self.buckets):
+            seen += self.buckets[e]
+            if seen >= q * self.count:
+                return min(math.ldexp(1, e), self.max)
+        return self.max
+
+
+class MemorySink(NullSink):
+    ''' Keeps histograms of everything, for report() or inspection.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = collections.defaultdict(Histogram)
+        self.reply_bytes = Histogram()
+        self.reply_lines = Histogram()
+        self.parse_seconds = Histogram()
+        self.parsed_lines = 0
+        self.queue_depths = collections.defaultdict(Histogram)
+        self.oob_records = collections.Counter()
+
+    def command_latency(self, command, seconds):
+        with self._lock:
+            self.latency[command].add(seconds)
+    def reply_size(self, nbytes, nlines):
+        with self._lock:
+            self.reply_bytes.add(nbytes)
+            self.reply_lines.add(nlines)
+    def parse_time(self, seconds, nlines):
+        with self._lock:
+            self.parse_seconds.add(seconds)
+            self.parsed_lines += nlines
+    def queue_depth(self, queue, depth):
+        with self._lock:
+            self.queue_depths[queue].add(depth)
+    def oob_record(self, key):
+        with self._lock:
+            self.oob_records[key] += 1
+
+    def report(self):
+        ''' Return a human-readable summary, slowest commands first.
+        '''
+        with self._lock:
+            out = ['%-36s %8s %10s %10s %10s' % ('command', 'count', 'mean', 'p99', 'max')]
+            for cmd, h in sorted(self.latency.items(), key=lambda i: -i[1].total):
+                out.append('%-36s %8d %8.2fms %8.2fms %8.2fms' % (cmd, h.count,
+                        1000 * h.mean(), 1000 * h.quantile(0.99), 1000 * h.max))
+            if self.reply_bytes.count:
+                out.append('replies: %d, mean %.0f bytes, %.1f lines' % (
+                        self.reply_bytes.count, self.reply_bytes.mean(),
+                        self.reply_lines.mean()))
+            out.append('parsing: %d lines in %.2fms' % (
+                    self.parsed_lines, 1000 * self.parse_seconds.total))
+            for queue, h in sorted(self.queue_depths.items()):
+                out.append('queue %s: max %d, mean %.1f' % (queue, h.max, h.mean()))
+            for key, n in self.oob_records.most_common():
+                out.append('out-of-band %s: %d' % (key, n))
+        return '\n'.join(out)
+
+
+class LoggingSink(NullSink):
+    ''' Logs every event, with its fields also in the record's `extra`.
+    '''
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('gdbmi.metrics')
+        self.level = level
+
+    def _log(self, event, **fields):
+        fields['event'] = event
+        self.logger.log(self.level, '%s %s', event,
+                ' '.join('%s=%s' % i for i in sorted(fields.items()) if i[0] != 'event'),
+                extra={'gdbmi': fields})
+
+    def command_latency(self, command, seconds):
+        self._log('command_latency', command=command, seconds=seconds)
+    def reply_size(self, nbytes, nlines):
+        self._log('reply_size', bytes=nbytes, lines=nlines)
+    def parse_time(self, seconds, nlines):
+        self._log('parse_time', seconds=seconds, lines=nlines)
+    def queue_depth(self, queue, depth):
+        self._log('queue_depth', queue=queue, depth=depth)
+    def oob_record(self, key):
+        self._log('oob_record', key=str(key))
@@ -1,10 +1,72 @@
 import enum
+import re
+import time
+
+from . import metrics
 
 
 def quote(s):
+    ''' Quote a str argument, escaping every character.
+
+        This is the old encoding, kept for code outside this module;
+        _mi uses encode_arg().
+    '''
     s.encode('ascii') # just for side-effects
     return '"%s"' % ''.join('\\%03o' % ord(c) for c in s)
 
+# How gdb's parse_escape() reads the escapes used here.
+_short_escapes = {
+    b'"': b'\\"', b'\\': b'\\\\', b'\n': b'\\n', b'\t': b'\\t', b'\r': b'\\r',
+    b'\x07': b'\\a', b'\x08': b'\\b', b'\x0b': b'\\v', b'\x0c': b'\\f',
+}
+_arg_escapes = {}
+for _c in range(1, 256):
+    _b = bytes([_c])
+    _arg_escapes[_b] = _short_escapes.get(_b, b'\\%03o' % _c)
+del _c, _b
+# Arguments that mi_parse_argv() reads literally, without quotes.
+_plain_arg_re = re.compile(br'[!#-~][!-~]*')
+_escaped_char_re = re.compile(br'[^ !#-\[\]-~]')
+
+def encode_arg(a):
+    ''' Encode one argument of an MI command, as bytes.
+
+        Quotes are only used when needed (for empty arguments, ones that
+        start with a quote, and ones with spaces or unprintable bytes),
+        and then with the shortest escapes. Ints are written in decimal;
+        str must be ASCII. NUL cannot be sent at all.
+    '''
+    if isinstance(a, int):
+        return b'%d' % a
+    if isinstance(a, str):
+        a = a.encode('ascii')
+    if _plain_arg_re.fullmatch(a):
+        return a
+    if b'\0' in a:
+        raise ValueError('MI arguments cannot contain NUL: %r' % a)
+    return b'"%s"' % _escaped_char_re.sub(lambda m: _arg_escapes[m.group()], a)
+
+def encode_line(line):
+    ''' Return a command line as bytes. raw_command() and friends take
+        bytes, but also accept ASCII str, as they always have.
+    '''
+    if isinstance(line, str):
+        return line.encode('ascii')
+    return line
+
+# (cmd, kwargs names in the method's order) -> (command bytes, [(name, option bytes)]),
+# with the options sorted as they are sent.
+_templates = {}
+
+def _template(cmd, kwargs):
+    options = []
+    for k in sorted(kwargs):
+        opt = k.replace('_', '-')
+        opt = ('--' if len(opt) > 1 else '-') + opt
+        options.append((k, opt.encode('ascii')))
+    rv = _templates[cmd, tuple(kwargs)] = (cmd.encode('ascii'), options)
+    return rv
+
 def flag(b):
     return '' if b else None
 
@@ -18,7 +80,7 @@ class PrintValues(enum.IntEnum):
 class DisassembleMode(enum.IntEnum):
     disassembly_only = 0
     mixed_source_and_disassembly_deprecated = 1
-    disassembly_with_raw opcodes = 2
+    disassembly_with_raw_opcodes = 2
     mixed_source_and_disassembly_with_raw_opcodes_deprecated = 3
     mixed_source_and_disassembly = 4
     mixed_source_and_disassembly_with_raw_opcodes = 5
@@ -30,33 +92,57 @@ class MiCommandsMixin(object):
         All MI commands are provided, though arguments are a WIP.
 
         Additionally, some CLI commands are provided.
+
+        Classes using this must provide `counter` (an iterator of
+        tokens) and raw_command(token, line), where `line` is bytes.
+        They may also override raw_commands(tokens, lines), to send
+        many commands at once; see batch().
     '''
 
+    def batch(self):
+        ''' Return a Batch, to send many commands in a single write.
+        '''
+        return Batch(self)
+
+    def raw_commands(self, tokens, lines):
+        ''' Send many commands, and return a list of what raw_command()
+            would have returned for each.
+
+            This sends them one at a time; clients override it to write
+            them all at once.
+        '''
+        return [self.raw_command(t, l) for (t, l) in zip(tokens, lines)]
+
     def _mi(self, cmd, args, kwargs, extra_lines=[]):
         token = next(self.counter)
-        bits = ['%d%s' % (token, cmd)]
+        try:
+            head, options = _templates[cmd, tuple(kwargs)]
+        except KeyError:
+            head, options = _template(cmd, kwargs)
+        bits = [b'%d%s' % (token, head)]
         has_kwargs = False
-        for (k, v) in sorted(kwargs.items()):
+        for (k, opt) in options:
+            v = kwargs[k]
             if v is None:
                 continue
             has_kwargs = True
-            k = k.replace('_', '-')
-            if len(k) > 1:
-                bits.append('--' + k)
-            else:
-                bits.append('-' + k)
-            if v:
-                bits.append(quote(v))
+            bits.append(opt)
+            # flag() gives '' for options without a value.
+            if v != '':
+                bits.append(encode_arg(v))
         if args:
             if has_kwargs:
-                bits.append('--')
+                bits.append(b'--')
             for a in args:
                 if a is None:
                     continue
-                bits.append(quote(a))
-        line = ' '.join(bits)
+                bits.append(encode_arg(a))
+        line = b' '.join(bits)
         if extra_lines:
-            line = '\n'.join([line] + extra_lines)
+            line = b'\n'.join([line] + [l.encode('ascii') for l in extra_lines])
+        if metrics.enabled:
+            return metrics.track_command(cmd, time.perf_counter(),
+                    self.raw_command(token, line))
         return self.raw_command(token, line)
 
     # Breakpoint Commands
@@ -66,7 +152,7 @@ class MiCommandsMixin(object):
         return self._mi('-break-after', args, kwargs)
 
     def mi_break_commands(self, number, *commands):
-        args = [number] + commands
+        args = [number] + list(commands)
         kwargs = {}
         return self._mi('-break-commands', args, kwargs)
 
@@ -110,7 +196,7 @@ class MiCommandsMixin(object):
         return self._mi('-break-insert', args, kwargs)
 
     def mi_dprintf_insert(self, location=None, format=None, *arguments, temporary=False, pending=False, disabled=False, condition=None, ignore_count=None, thread=None):
-        args = [location, format] + arguments
+        args = [location, format] + list(arguments)
         kwargs = {
             't': flag(temporary),
             'f': flag(pending),
@@ -325,31 +411,31 @@ class MiCommandsMixin(object):
     def mi_stack_list_arguments(self, print_values, low_frame=None, high_frame=None, no_frame_filters=False, skip_unavailable=False):
         args = ['--' + print_values.name.replace('_', '-'), low_frame, high_frame]
         kwargs = {
-            no_frame_filters = flag(no_frame_filters),
-            skip_unavailable = flag(skip_unavailable),
+            'no_frame_filters': flag(no_frame_filters),
+            'skip_unavailable': flag(skip_unavailable),
         }
         return self._mi('-stack-list-arguments', args, kwargs)
 
     def mi_stack_list_frames(self, low_frame=None, high_frame=None, no_frame_filters=False):
         args = [low_frame, high_frame]
         kwargs = {
-            no_frame_filters = flag(no_frame_filters),
+            'no_frame_filters': flag(no_frame_filters),
         }
         return self._mi('-stack-list-frames', args, kwargs)
 
     def mi_stack_list_locals(self, print_values, no_frame_filters=False, skip_unavailable=False):
         args = [print_values]
         kwargs = {
-            no_frame_filters = flag(no_frame_filters),
-            skip_unavailable = flag(skip_unavailable),
+            'no_frame_filters': flag(no_frame_filters),
+            'skip_unavailable': flag(skip_unavailable),
         }
         return self._mi('-stack-list-locals', args, kwargs)
 
     def mi_stack_list_variables(self, print_values, no_frame_filters=False, skip_unavailable=False):
         args = [print_values]
         kwargs = {
-            no_frame_filters = flag(no_frame_filters),
-            skip_unavailable = flag(skip_unavailable),
+            'no_frame_filters': flag(no_frame_filters),
+            'skip_unavailable': flag(skip_unavailable),
         }
         return self._mi('-stack-list-variables', args, kwargs)
 
@@ -392,11 +478,9 @@ class MiCommandsMixin(object):
         return self._mi('-var-info-num-children', args, kwargs)
 
     def mi_var_list_children(self, name, from_=None, to=None, print_values=PrintValues.no_values):
-        args = [name, from_, to]
-        kwargs = {
-            # This is possible here because there are no other kwargs.
-            print_values.name: '',
-        }
+        # GDB does not accept a '--' after the print values.
+        args = ['--' + print_values.name.replace('_', '-'), name, from_, to]
+        kwargs = {}
         return self._mi('-var-list-children', args, kwargs)
 
     def mi_var_info_type(self, name):
@@ -432,15 +516,12 @@ class MiCommandsMixin(object):
         return self._mi('-var-assign', args, kwargs)
 
     def mi_var_update(self, name, print_values=PrintValues.no_values):
-        args = [name]
-        kwargs = {
-            # This is possible here because there are no other kwargs.
-            print_values.name: '',
-        }
+        args = ['--' + print_values.name.replace('_', '-'), name]
+        kwargs = {}
         return self._mi('-var-update', args, kwargs)
 
     def mi_var_set_frozen(self, name, flag):
-        args = [name, int.__str__(flag)]
+        args = [name, int(flag)]
         kwargs = {}
         return self._mi('-var-set-frozen', args, kwargs)
 
@@ -482,9 +563,9 @@ class MiCommandsMixin(object):
         return self._mi('-data-list-register-names', args, kwargs)
 
     def mi_data_list_register_values(self, fmt, *regnos, skip_unavailable=False):
-        args = [fmt] + regnos
+        args = [fmt] + list(regnos)
         kwargs = {
-            skip_unavailable = flag(skip_unavailable),
+            'skip_unavailable': flag(skip_unavailable),
         }
         return self._mi('-data-list-register-values', args, kwargs)
 
@@ -508,7 +589,7 @@ class MiCommandsMixin(object):
 
     # Tracepoint Commands
     def mi_trace_find(self, mode, *parameters):
-        args = [mode] + parameters
+        args = [mode] + list(parameters)
         kwargs = {}
         return self._mi('-trace-find', args, kwargs)
 
@@ -608,7 +689,7 @@ class MiCommandsMixin(object):
         return self._mi('-target-download', args, kwargs)
 
     def mi_target_select(self, type, *parameters):
-        args = [type] + parameters
+        args = [type] + list(parameters)
         kwargs = {}
         return self._mi('-target-select', args, kwargs)
 
@@ -652,8 +733,8 @@ class MiCommandsMixin(object):
 
     # Miscellaneous Commands
     def mi_gdb_exit(self):
-        #args = []
-        #kwargs = {}
+        args = []
+        kwargs = {}
         return self._mi('-gdb-exit', args, kwargs)
 
     def mi_gdb_set(self):
@@ -737,3 +818,77 @@ class MiCommandsMixin(object):
 
     def cli_apropos(self, regex):
         return self._cli('apropos', regex)
+
+    def cli_python(self, statement):
+        # A single line only; see _cli.
+        return self._cli('python', statement)
+
+    # Installed by evaluate.install().
+    def mi_gdbmi_evaluate_many(self, *exprs, thread=None, frame=None):
+        args = list(exprs)
+        if thread is None and frame is None:
+            # _mi() only puts '--' after options, and an expression such
+            # as -f must not be taken for one.
+            args.insert(0, '--')
+        kwargs = {
+            't': thread,
+            'f': frame,
+        }
+        return self._mi('-gdbmi-evaluate-many', args, kwargs)
+
+
+class Batch(MiCommandsMixin):
+    ''' Collects commands for any client, to be sent in a single write.
+
+        Calling mi_* methods on a Batch only encodes and queues the
+        command, and returns its index in `results`. When the `with`
+        block exits (or on flush()), all queued commands are passed to
+        the client's raw_commands(), and `results` is extended with what
+        raw_command() would have returned for each, in submission order:
+        lists of records from a synchronous client, Futures or Deferreds
+        from an asynchronous one.
+
+            with gdb.batch() as b:
+                for loc in locations:
+                    b.mi_break_insert(loc)
+            numbers = [parser.result_record(r).bkpt['number'] for r in b.results]
+
+        Commands that do not end with a prompt (e.g. -gdb-exit) must not
+        be batched.
+    '''
+    def __init__(self, gdb):
+        self._gdb = gdb
+        self._tokens = []
+        self._lines = []
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ty, v, tb):
+        if ty is None:
+            self.flush()
+
+    def __len__(self):
+        return len(self.results) + len(self._lines)
+
+    @property
+    def counter(self):
+        return self._gdb.counter
+
+    def raw_command(self, token, line):
+        index = len(self)
+        self._tokens.append(token)
+        self._lines.append(line)
+        return index
+
+    def flush(self):
+        ''' Send all queued commands, and return `results`.
+        '''
+        tokens = self._tokens
+        lines = self._lines
+        if lines:
+            self._tokens = []
+            self._lines = []
+            self.results.extend(self._gdb.raw_commands(tokens, lines))
+        return self.results
@@ -1,4 +1,9 @@
 import abc
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import re
 
 import six
 
@@ -43,7 +48,8 @@ Class('memory_changed')
 Class._sealed = True
 
 
-class Record:
+@six.add_metaclass(abc.ABCMeta)
+class Record(object):
     _simple = False
 
     def __init__(self, token, simple_value, complex_class, complex_args):
@@ -66,8 +72,30 @@ class Record:
                 assert not k.startswith('_'), k
                 setattr(self, k, v)
 
+    def __getattr__(self, name):
+        # Only reached when normal lookup fails. For a lazy record, this
+        # is the first access to the payload, so parse it now. If that
+        # fails, it stays pending, so every access raises the same way.
+        pending = self.__dict__.get('_pending')
+        if pending is None:
+            raise AttributeError(name)
+        self._load(*pending)
+        del self.__dict__['_pending']
+        return getattr(self, name)
+
+    def _load(self, line, pos, decode, mk_tuple):
+        payload = _lazy_payload(self.__class__, line, pos, decode, mk_tuple)
+        if self.__class__._simple:
+            self._value = payload
+        else:
+            for k, v in payload.items():
+                setattr(self, k, v)
+
     def __repr__(self):
         cls = self.__class__
+        if '_pending' in self.__dict__:
+            self._load(*self.__dict__['_pending'])
+            del self.__dict__['_pending']
         if cls._simple:
             bits = [repr(self._value)]
         else:
@@ -128,6 +156,30 @@ class LogStreamRecord(StreamRecord):
     '''
     _lead = '&'
 
+
+class MiError(Exception):
+    ''' A command failed with ^error.
+    '''
+    def __init__(self, record):
+        msg = getattr(record, 'msg', b'error')
+        if isinstance(msg, bytes):
+            msg = msg.decode('utf-8', 'replace')
+        Exception.__init__(self, msg)
+        self.record = record
+
+def result_record(records):
+    ''' Return the ResultRecord in a reply from a synchronous client.
+
+        Raises MiError if it is ^error. Returns None if there is none
+        (e.g. because GDB exited).
+    '''
+    for r in records:
+        if isinstance(r, ResultRecord):
+            if r._class == Class.ERROR:
+                raise MiError(r)
+            return r
+    return None
+
 _prefix_classes = {
     cls._lead: cls
     for cls in [
@@ -142,6 +194,169 @@ _prefix_classes = {
 ]}
 
 
+# The compact layout. These are not real subclasses of the classes above
+# (since those have a __dict__), but are registered with them, so that
+# isinstance() checks work the same for both layouts.
+# Results are stored as a dict from each key to its index, which is
+# shared between all records (and tuples) with the same keys, and a
+# parallel tuple of values. The dict iterates in the keys' order.
+_key_indexes = {}
+_no_keys = {}
+_values = utils.InternTable(limit=1 << 16)
+# Keys whose values are usually the same across many records.
+_interned_keys = frozenset([
+    'func', 'file', 'fullname', 'from', 'addr', 'arch',
+    'thread_id', 'id', 'target_id', 'state', 'core', 'thread_group',
+])
+
+def _compact_items(items):
+    keys = []
+    values = []
+    for k, v in items:
+        if k in _interned_keys:
+            v = _values(v)
+        keys.append(k)
+        values.append(v)
+    keys = tuple(keys)
+    try:
+        index = _key_indexes[keys]
+    except KeyError:
+        index = _key_indexes[keys] = {k: i for (i, k) in enumerate(keys)}
+    return index, tuple(values)
+
+class Tuple(Mapping):
+    ''' Read-only mapping used for MI tuples in the compact layout.
+
+        Compares equal to a dict with the same items.
+    '''
+    __slots__ = ('_keys', '_values')
+
+    def __init__(self, keys, values):
+        self._keys = keys
+        self._values = values
+
+    @classmethod
+    def _from_dict(cls, d):
+        return cls(*_compact_items(d.items()))
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._keys[key]]
+        except TypeError:
+            # Unhashable, so not a key.
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return repr(dict(zip(self._keys, self._values)))
+
+class CompactRecord(object):
+    __slots__ = ('_token', '_class', '_value', '_keys', '_values', '_pending')
+    _simple = False
+
+    def __init__(self, token, simple_value, complex_class, complex_args):
+        # As for Record, only the slots that apply to this kind of record
+        # are set; the others raise AttributeError.
+        self._keys = _no_keys
+        self._values = ()
+        self._pending = None
+        if self.__class__._simple:
+            assert token is None, 'simple forbids token'
+            assert simple_value is not None, 'simple requires value'
+            assert complex_class is None, 'simple forbids class'
+            assert complex_args is None, 'simple forbids args'
+            self._value = simple_value
+        else:
+            assert simple_value is None, 'complex forbids value'
+            assert complex_class is not None, 'complex requires class'
+            assert complex_args is not None, 'complex requires args'
+            if self.__class__._lead == '^' and complex_class == 'running':
+                complex_class = 'done'
+            self._token = token
+            self._class = Class(complex_class)
+            self._set_results(complex_args)
+
+    def _set_results(self, results):
+        for k in results:
+            assert not k.startswith('_'), k
+        self._keys, self._values = _compact_items(results.items())
+
+    def __getattr__(self, name):
+        # Only reached for result keys, or slots that don't apply to
+        # this kind of record (or are still pending).
+        pending = self._pending
+        if pending is not None:
+            # As for Record; only cleared once the payload has parsed.
+            self._load(*pending)
+            self._pending = None
+            return getattr(self, name)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._values[self._keys[name]]
+        except KeyError:
+            raise AttributeError(name)
+
+    def _load(self, line, pos, decode, mk_tuple):
+        payload = _lazy_payload(self.__class__, line, pos, decode, mk_tuple)
+        if self.__class__._simple:
+            self._value = payload
+        else:
+            self._set_results(payload)
+
+    def __repr__(self):
+        cls = self.__class__
+        if self._pending is not None:
+            self._load(*self._pending)
+            self._pending = None
+        if cls._simple:
+            bits = [repr(self._value)]
+        else:
+            items = list(zip(self._keys, self._values))
+            items.append(('_class', self._class))
+            items.append(('_token', self._token))
+            bits = ['%s=%r' % (k, v) for (k, v) in sorted(items)]
+        return '%s(%s)' % (cls.__name__, ', '.join(bits))
+
+def _compact_class(cls):
+    rv = type('Compact' + cls.__name__, (CompactRecord,), {
+        '__slots__': (),
+        '__doc__': cls.__doc__,
+        '_lead': cls._lead,
+        '_simple': cls._simple,
+    })
+    cls.register(rv)
+    return rv
+
+_compact_prefix_classes = {
+    lead: _compact_class(cls)
+    for (lead, cls) in _prefix_classes.items()
+}
+
+def with_token(record, token):
+    ''' Return a shallow copy of a record (of either layout), with
+        another token.
+    '''
+    cls = record.__class__
+    rv = cls.__new__(cls)
+    if isinstance(record, CompactRecord):
+        for name in CompactRecord.__slots__:
+            # Without going through __getattr__, which would load a
+            # lazy record, or fail for slots that are not set.
+            try:
+                object.__setattr__(rv, name, object.__getattribute__(record, name))
+            except AttributeError:
+                pass
+    else:
+        rv.__dict__.update(record.__dict__)
+    rv._token = token
+    return rv
+
 _escapes = {
     'a': b'\a',
     'b': b'\b',
@@ -152,9 +367,60 @@ _escapes = {
     'r': b'\r',
     '"': b'\"',
     '\\': b'\\',
+    # Gdb's printchar() also emits this one, but it isn't part of C.
+    'e': b'\x1b',
 }
 
-def _c_string(s):
+# Table for the bulk decoder: maps the bytes after a backslash to the
+# byte they stand for. Every 3-digit octal escape is precomputed, so
+# decoding never needs to look at individual digits.
+_unescapes = {k.encode('ascii'): v for (k, v) in _escapes.items()}
+_unescapes.update((('%03o' % i).encode('ascii'), six.int2byte(i)) for i in range(256))
+_unescape_re = re.compile(br'\\([0-7]{3}|.)', re.DOTALL)
+
+def _c_string(s, checked=False):
+    ''' Decode a quoted c-string (including the quotes) into bytes.
+
+        Both str and bytes-like input is accepted.
+
+        If `checked` is true, verify that the string is exactly in the
+        canonical form that gdb emits, one character at a time.
+    '''
+    if checked:
+        return _c_string_checked(s)
+    return _c_body(s[1:-1])
+
+def _c_body(body):
+    ''' Decode the inside of a c-string, without validating it.
+
+        Runs without escapes are copied as whole slices, and all the
+        escapes in the string are translated in one pass over a table.
+    '''
+    if isinstance(body, six.text_type):
+        body = body.encode('latin-1')
+    else:
+        body = bytes(body)
+    if b'\\' not in body:
+        return body
+    parts = _unescape_re.split(body)
+    # Odd indices are the escapes; even indices are the literal runs.
+    try:
+        parts[1::2] = [_unescapes[e] for e in parts[1::2]]
+    except KeyError as e:
+        raise ValueError('invalid escape %r in %r' % (e.args[0], body))
+    return b''.join(parts)
+
+def _c_body_checked(body):
+    if not isinstance(body, six.text_type):
+        body = bytes(body).decode('latin-1')
+    return _c_string_checked('"%s"' % body)
+
+# Control characters that printchar() writes as a letter, not in octal.
+_named_escapes = frozenset(b'\a\b\t\n\f\r\x1b')
+
+def _c_string_checked(s):
+    if not isinstance(s, six.text_type):
+        s = bytes(s).decode('latin-1')
     rv = bytearray()
     try:
         s = iter(s[1:-1])
@@ -169,7 +435,7 @@ def _c_string(s):
                     c += next(s)
                     c = int(c, 8)
                     assert 0 <= c < 256, 'invalid'
-                    assert c >= 127 or (0 < c < 32 and not (7 <= c <= 13)), 'noncanonical'
+                    assert c >= 127 or (c < 32 and c not in _named_escapes), 'noncanonical'
             else:
                 c = ord(c)
                 assert 32 <= c <= 126, 'nonprintable'
@@ -185,8 +451,8 @@ def nop(v):
 tokenizer = Tokenizer([
     ('INTEGER', r'\d+', int),
     ('PREFIX', r'(^|(?<=\d))[+*=^~@&]', nop),
-    ('WORD', r'[-A-Za-z0-9]+', lambda s: s.replace('-', '_')),
-    ('STRING', r'"([^\\"]|\\.)*"', _c_string),
+    ('WORD', r'[-_A-Za-z0-9]+', lambda s: s.replace('-', '_')),
+    ('STRING', r'"([^\\"]|\\.)*"', _c_string_checked),
     ('TUPLE_EMPTY', r'\{}', nop),
     ('TUPLE_BEGIN', r'\{', nop),
     ('TUPLE_END', r'}', nop),
@@ -198,8 +464,53 @@ tokenizer = Tokenizer([
 ])
 tokenizer.END = 'END'
 
-def parse(line):
-    # Does not support tokens (yet)
+def parse(line, fast=True, checked=False, lazy=False, compact=False):
+    ''' Parse one line of GDB/MI output (without the newline) into a Record.
+
+        By default this uses the single-pass engine; pass `fast=False`
+        to use the original Tokenizer-based one instead. Both produce
+        identical Records for well-formed input.
+
+        If `checked` is true, strings are validated to be in the exact
+        canonical form gdb emits. The Tokenizer-based engine always does.
+
+        If `lazy` is true (fast engine only), only the prefix, token and
+        class are parsed up front. The results (or stream value) are
+        parsed the first time one of them is read, so errors in them are
+        not reported until then either.
+
+        If `compact` is true (fast engine only), the records use the
+        slotted CompactRecord layout, and MI tuples are returned as
+        Tuple rather than dict. Common keys and values are interned.
+
+        The line may be str, or any bytes-like object (including a
+        memoryview); the fast engine works on bytes internally, so
+        passing bytes avoids a conversion. A lazy record keeps a
+        reference to the line, so it must not be modified afterwards.
+    '''
+    if fast:
+        if isinstance(line, six.text_type):
+            line = line.encode('latin-1')
+        decode = _c_body_checked if checked else _c_body
+        if compact:
+            classes, mk_tuple = _compact_prefix_classes, Tuple._from_dict
+        else:
+            classes, mk_tuple = _prefix_classes, None
+        try:
+            if lazy:
+                return _parse_lazy(line, classes, decode, mk_tuple)
+            return _parse_fast(line, classes, decode, mk_tuple)
+        except IndexError:
+            # Ran off the end; fail like the Tokenizer-based engine.
+            assert False, 'truncated: %r' % bytes(line)
+    assert not lazy, 'lazy parsing requires the fast engine'
+    assert not compact, 'compact layout requires the fast engine'
+
+    if not isinstance(line, six.text_type):
+        line = bytes(line).decode('latin-1')
+    return _parse_tokenized(line)
+
+def _parse_tokenized(line):
     assert '\n' not in line, repr(line)
     assert '\r' not in line, repr(line)
     if line == '(gdb) ':
@@ -288,3 +599,230 @@ def _parse_value(n, legacy=False):
     assert kind == tokenizer.STRING, kind
     # Tokenizer has already called _c_string as a callback.
     return match
+
+
+# The single-pass engine. Rather than going through the Tokenizer, this
+# dispatches on the current byte and only uses regexes for the
+# variable-length tokens. Positions are threaded through explicitly.
+# It works on bytes-like input, so string values are copied straight
+# out of the line, and nothing else is copied at all.
+_token_re = re.compile(br'\d*')
+_word_re = re.compile(br'[-_A-Za-z0-9]+')
+_string_re = re.compile(br'"([^\\"]*(?:\\.[^\\"]*)*)"', re.DOTALL)
+_eol_re = re.compile(br'[\r\n]')
+# Indexing bytes gives ints in Python 3, and bytearray always does.
+_QUOTE, _COMMA, _EQUALS, _LBRACE, _RBRACE, _LBRACKET, _RBRACKET = bytearray(b'",={}[]')
+
+def _parse_fast(line, classes, decode, mk_tuple):
+    if line == b'(gdb) ':
+        return PromptRecord()
+    token, prefix_class, pos = _parse_header(line, classes)
+
+    if line[pos] == _QUOTE:
+        value, pos = _fast_string(line, pos, decode)
+        assert pos == len(line), line[pos:]
+        return prefix_class(token, value, None, None)
+
+    complex_class, pos = _fast_word(line, pos)
+    complex_args = _fast_results(line, pos, decode, mk_tuple)
+    return prefix_class(token, None, complex_class, complex_args)
+
+def _parse_lazy(line, classes, decode, mk_tuple):
+    if line == b'(gdb) ':
+        return PromptRecord()
+    token, prefix_class, pos = _parse_header(line, classes)
+
+    if line[pos] == _QUOTE:
+        assert token is None, 'simple forbids token'
+        rv = prefix_class.__new__(prefix_class)
+    else:
+        complex_class, pos = _fast_word(line, pos)
+        rv = prefix_class(token, None, complex_class, {})
+    rv._pending = (line, pos, decode, mk_tuple)
+    return rv
+
+def _lazy_payload(cls, line, pos, decode, mk_tuple):
+    ''' Parse what _parse_lazy() left pending: the value of a stream
+        record, or the results of any other. Errors are reported as by
+        parse().
+    '''
+    try:
+        if cls._simple:
+            value, pos = _fast_string(line, pos, decode)
+            assert pos == len(line), line[pos:]
+            return value
+        return _fast_results(line, pos, decode, mk_tuple)
+    except IndexError:
+        assert False, 'truncated: %r' % bytes(line)
+
+def _parse_header(line, classes):
+    ''' Returns (token, prefix_class, pos) with pos just after the prefix.
+    '''
+    assert not _has_eol(line), repr(line)
+    token = None
+    match = _token_re.match(line)
+    pos = match.end()
+    if pos:
+        token = int(match.group())
+    prefix_class = classes[chr(line[pos])]
+    return token, prefix_class, pos + 1
+
+def _has_eol(line):
+    if isinstance(line, memoryview):
+        return _eol_re.search(line) is not None
+    return b'\n' in line or b'\r' in line
+
+def _fast_word(line, pos):
+    match = _word_re.match(line, pos)
+    assert match is not None, line[pos:]
+    return match.group().decode('ascii').replace('-', '_'), match.end()
+
+def _fast_results(line, pos, decode, mk_tuple):
+    rv = {}
+    end = len(line)
+    while pos != end:
+        assert line[pos] == _COMMA, line[pos:]
+        k, v, pos = _fast_result(line, pos + 1, decode, mk_tuple)
+        assert k not in rv, k
+        rv[k] = v
+    return rv
+
+def _fast_string(line, pos, decode):
+    match = _string_re.match(line, pos)
+    assert match is not None, line[pos:]
+    return decode(match.group(1)), match.end()
+
+def _fast_result(line, pos, decode, mk_tuple):
+    key, pos = _fast_word(line, pos)
+    assert line[pos] == _EQUALS, line[pos:]
+    value, pos = _fast_value(line, pos + 1, decode, mk_tuple)
+    return key, value, pos
+
+def _fast_value(line, pos, decode, mk_tuple):
+    c = line[pos]
+    if c == _QUOTE:
+        return _fast_string(line, pos, decode)
+    if c == _LBRACE:
+        pos += 1
+        rv = {}
+        if line[pos] != _RBRACE:
+            while True:
+                k, v, pos = _fast_result(line, pos, decode, mk_tuple)
+                assert k not in rv, k
+                rv[k] = v
+                c = line[pos]
+                pos += 1
+                if c != _COMMA:
+                    break
+            assert c == _RBRACE, c
+        else:
+            pos += 1
+        if mk_tuple is not None:
+            rv = mk_tuple(rv)
+        return rv, pos
+    if c == _LBRACKET:
+        pos += 1
+        rv = []
+        if line[pos] == _RBRACKET:
+            return rv, pos + 1
+        while True:
+            if line[pos] not in (_QUOTE, _LBRACE, _LBRACKET):
+                # Legacy list of results; the keys are discarded.
+                _, pos = _fast_word(line, pos)
+                assert line[pos] == _EQUALS, line[pos:]
+                pos += 1
+            v, pos = _fast_value(line, pos, decode, mk_tuple)
+            rv.append(v)
+            c = line[pos]
+            pos += 1
+            if c != _COMMA:
+                break
+        assert c == _RBRACKET, c
+        return rv, pos
+    assert False, line[pos:]
+
+
+class ListStream(object):
+    ''' Pull parser for one list-valued result of a (huge) record.
+
+        Iterating yields the elements of the result named `key` (e.g.
+        'files', 'lines' or 'asm_insns') one at a time, each decoded
+        just before it is yielded, so the list itself is never built.
+        For legacy lists of results, the keys are discarded as usual.
+
+        The other results are parsed normally and set on `record`, which
+        starts out with only the token and class; it is complete once
+        iteration has finished. If there is no such result (e.g. for an
+        ^error record), iteration raises KeyError after that.
+
+        `line`, `checked` and `compact` are as for parse(); `compact`
+        only affects the elements. A ListStream can only be iterated once.
+    '''
+    def __init__(self, line, key, checked=False, compact=False):
+        if isinstance(line, six.text_type):
+            line = line.encode('latin-1')
+        self._line = line
+        self._key = key
+        self._decode = _c_body_checked if checked else _c_body
+        self._mk_tuple = Tuple._from_dict if compact else None
+        token, prefix_class, pos = _parse_header(line, _prefix_classes)
+        assert not prefix_class._simple, 'no results in a stream record'
+        complex_class, self._pos = _fast_word(line, pos)
+        self.record = prefix_class(token, None, complex_class, {})
+
+    @classmethod
+    def from_lazy(cls, record, key):
+        ''' A ListStream over a record from parse(lazy=True) whose
+            results have not been read yet. As for a new ListStream,
+            `record` is a plain Record, whatever the layout of the one
+            it came from.
+        '''
+        assert not record.__class__._simple, 'no results in a stream record'
+        if isinstance(record, CompactRecord):
+            pending, record._pending = record._pending, None
+        else:
+            pending = record.__dict__.pop('_pending')
+        self = cls.__new__(cls)
+        self._line, self._pos, self._decode, self._mk_tuple = pending
+        self._key = key
+        self.record = _prefix_classes[record._lead](
+                record._token, None, record._class.name, {})
+        return self
+
+    def __iter__(self):
+        line = self._line
+        decode = self._decode
+        mk_tuple = self._mk_tuple
+        pos = self._pos
+        end = len(line)
+        found = False
+        while pos != end:
+            assert line[pos] == _COMMA, line[pos:]
+            k, pos = _fast_word(line, pos + 1)
+            assert line[pos] == _EQUALS, line[pos:]
+            pos += 1
+            if k != self._key or found:
+                v, pos = _fast_value(line, pos, decode, mk_tuple)
+                assert not hasattr(self.record, k), k
+                setattr(self.record, k, v)
+                continue
+            found = True
+            assert line[pos] == _LBRACKET, '%s is not a list' % k
+            pos += 1
+            if line[pos] == _RBRACKET:
+                pos += 1
+                continue
+            while True:
+                if line[pos] not in (_QUOTE, _LBRACE, _LBRACKET):
+                    _, pos = _fast_word(line, pos)
+                    assert line[pos] == _EQUALS, line[pos:]
+                    pos += 1
+                v, pos = _fast_value(line, pos, decode, mk_tuple)
+                yield v
+                c = line[pos]
+                pos += 1
+                if c != _COMMA:
+                    break
+            assert c == _RBRACKET, c
+        if not found:
+            raise KeyError(self._key)
@@ -0,0 +1,239 @@
+''' Synchronous client using plain pipes and selectors.
+
+    This does the same job as .sync.GdbMi, but without Twisted, so it
+    is much cheaper to import and start. Prefer it for short-lived
+    scripts.
+'''
+from collections import deque
+import errno
+import itertools
+import os
+import selectors
+import signal
+import subprocess
+import time
+
+from .framing import LineBuffer
+from .launch import gdb_command, report_startup
+from .metrics import ReplyMeter
+from .mixin import MiCommandsMixin, encode_line
+from .parser import parse
+from .pipeline import Pipeline, Stream, run_batch, stream_reply
+from .timeouts import Timeout, TimeoutsMixin
+from . import metrics
+from . import parser
+
+
+class PipeGdbMi(TimeoutsMixin, MiCommandsMixin):
+    ''' Synchronous GDB/MI client on top of subprocess and selectors.
+
+        mi_* methods return the list of records up to, and including,
+        the next PromptRecord, exactly like sync.GdbMi. That includes
+        the initial records, which are returned along with the reply to
+        the first command. Timeouts work as for sync.GdbMi.
+
+        `profile` is a launch.Profile, or the name of one. If
+        `transcript` (a transcript.TranscriptWriter) is given, all
+        traffic is recorded to it.
+    '''
+    # See parser.parse().
+    lazy = False
+    compact = False
+    read_size = 1 << 16
+
+    def __init__(self, exe='gdb', profile='default', transcript=None):
+        full_exe, args, env = gdb_command(exe, profile)
+        spawned = time.monotonic()
+        # Like ExecGdbMiEndpoint, stderr is passed through.
+        self._popen = subprocess.Popen(args, executable=full_exe, env=env,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self._stdin = self._popen.stdin.fileno()
+        self._stdout = self._popen.stdout.fileno()
+        os.set_blocking(self._stdin, False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._stdout, selectors.EVENT_READ)
+        self._lines = LineBuffer()
+        self._meter = ReplyMeter()
+        self._transcript = transcript
+        self._queue = deque()
+        self._output = bytearray()
+        self._eof = False
+        self._records = []
+        self.counter = itertools.count()
+        # There is an initial set of records; they are returned with the
+        # reply to the first command, as in sync.GdbMi.
+        self._records = self.wait_for_replies()
+        # Seconds from spawning GDB to its first prompt.
+        self.startup_time = report_startup(self, spawned)
+
+    def raw_command(self, token, line):
+        if not self._alive():
+            raise ConnectionError('gdb is not running')
+        self._send_lines([encode_line(line)])
+        return self._wait_with_deadline()
+
+    def _alive(self):
+        return not self._eof
+
+    def raw_commands(self, tokens, lines):
+        if not self._alive():
+            raise ConnectionError('gdb is not running')
+        return run_batch(self, tokens, [encode_line(line) for line in lines])
+
+    def pipeline(self):
+        ''' Return a Pipeline, to send many commands in a single write.
+        '''
+        return Pipeline(self)
+
+    def stream(self, key):
+        ''' Return a Stream, whose mi_* methods return a ListStream over
+            the result named `key` instead of the whole reply.
+        '''
+        return Stream(self, key)
+
+    def raw_command_stream(self, token, line, key):
+        ''' Like raw_command(), but return a parser.ListStream over the
+            result named `key`; see pipeline.Stream.
+        '''
+        lazy = self.lazy
+        self.lazy = True
+        try:
+            records = self.raw_command(token, line)
+        finally:
+            self.lazy = lazy
+        stream, rest = stream_reply(records, token, key)
+        self._records[:0] = rest
+        return stream
+
+    def _send_lines(self, lines):
+        # Only queued here; _pump() writes as much as the pipe will take
+        # while also reading, since otherwise both sides could block
+        # with full pipes when a lot is sent at once.
+        if self._transcript is not None:
+            self._transcript.sent(lines)
+        for line in lines:
+            self._output += line
+            self._output += b'\n'
+        self._flush_output()
+
+    def wait_for_replies(self, deadline=None):
+        ''' Return all records up to, and including, the next prompt.
+
+            If GDB exits first, return whatever was received until then.
+            If the deadline (a time.monotonic()) passes first, raise
+            Timeout with the records so far.
+        '''
+        rv = self._records
+        self._records = []
+        queue = self._queue
+        while True:
+            while queue:
+                record = queue.popleft()
+                rv.append(record)
+                if isinstance(record, parser.PromptRecord):
+                    return rv
+            if self._eof:
+                return rv
+            if deadline is None:
+                self._pump(None)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Timeout(rv)
+            self._pump(remaining)
+
+    def _flush_output(self):
+        output = self._output
+        if not output:
+            return
+        try:
+            n = os.write(self._stdin, output)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                n = 0
+            elif e.errno == errno.EPIPE:
+                del output[:]
+                return
+            else:
+                raise
+        del output[:n]
+        if output:
+            self._selector.modify(self._stdout, selectors.EVENT_READ)
+            try:
+                self._selector.register(self._stdin, selectors.EVENT_WRITE)
+            except KeyError:
+                pass
+        else:
+            try:
+                self._selector.unregister(self._stdin)
+            except KeyError:
+                pass
+
+    def _pump(self, timeout):
+        ''' Wait for at least one event, or the timeout, and handle it.
+
+            Returns false on timeout.
+        '''
+        events = self._selector.select(timeout)
+        for key, mask in events:
+            if key.fd == self._stdin:
+                self._flush_output()
+            else:
+                self._read()
+        return bool(events)
+
+    def _read(self):
+        data = os.read(self._stdout, self.read_size)
+        if not data:
+            self._eof = True
+            self._selector.unregister(self._stdout)
+            return
+        lazy = self.lazy
+        compact = self.compact
+        lines = self._lines.feed(data)
+        if self._transcript is not None and lines:
+            self._transcript.received(lines)
+        if metrics.enabled:
+            self._queue.extend(self._meter.parse(lines, lazy, compact))
+            metrics.sink.queue_depth('records', len(self._queue))
+        else:
+            self._queue.extend(parse(line, lazy=lazy, compact=compact) for line in lines)
+
+    @property
+    def pid(self):
+        return self._popen.pid
+
+    def do_signal_interrupt(self):
+        ''' Ask GDB to sit down, shut up, and pay attention.
+
+            You should probably use mi_exec_interrupt() instead,
+            but in certain cases that may not be appropriate.
+        '''
+        self._popen.send_signal(signal.SIGINT)
+    def do_signal_terminate(self):
+        ''' Kill GDB politely.
+
+            You should probably use mi_gdb_exit() instead.
+        '''
+        self._popen.terminate()
+    def do_signal_kill(self):
+        ''' Kill GDB unstoppably.
+
+            You should probably use mi_gdb_exit() instead.
+        '''
+        self._popen.kill()
+    def do_close(self):
+        ''' Close I/O streams, letting GDB die out of our control.
+
+            You should probably use mi_gdb_exit() instead.
+        '''
+        try:
+            self._selector.unregister(self._stdin)
+        except KeyError:
+            pass
+        self._popen.stdin.close()
+
+    def wait(self, timeout=None):
+        ''' Wait for GDB to exit, and return its exit status.
+        '''
+        return self._popen.wait(timeout)
@@ -0,0 +1,177 @@
+import time
+
+from .mixin import MiCommandsMixin, encode_line
+from .timeouts import Timeout
+from . import metrics
+from . import parser
+
+
+class Pipeline(MiCommandsMixin):
+    ''' Batches commands for a synchronous client (sync.GdbMi or
+        pipe.PipeGdbMi), so they cost one round trip total.
+
+        Calling mi_* methods on a Pipeline only queues the command, and
+        returns a Reply. All queued commands are written to GDB at once
+        by flush(), which is called when a `with` block exits, or when
+        the result of any unresolved Reply is asked for.
+
+        GDB still runs the commands one at a time, in order. Each reply
+        (all records up to and including the prompt, as returned by the
+        client) is matched to its command by the token of its ResultRecord
+        only. Records that come with a prompt but no ResultRecord of a
+        queued command (e.g. *stopped, which GDB follows with a prompt
+        of its own) are included in the next reply.
+
+        The client's `timeout` applies to each reply in turn, and its
+        `deadline` to all of them. If either passes, flush() recovers as
+        a single command would, and raises timeouts.Timeout with every
+        record received from then on; the replies not received yet stay
+        unresolved.
+
+        Commands that do not end with a prompt (e.g. -gdb-exit) must not
+        be pipelined.
+    '''
+    def __init__(self, gdb):
+        self._gdb = gdb
+        self._lines = []
+        self._replies = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ty, v, tb):
+        if ty is None:
+            self.flush()
+
+    @property
+    def counter(self):
+        return self._gdb.counter
+
+    def raw_command(self, token, line):
+        reply = Reply(self, token)
+        self._lines.append(encode_line(line))
+        self._replies.append(reply)
+        return reply
+
+    def flush(self):
+        ''' Send all queued commands, and wait for all their replies.
+        '''
+        lines = self._lines
+        replies = self._replies
+        if not replies:
+            return
+        self._lines = []
+        self._replies = []
+
+        gdb = self._gdb
+        timed = metrics.enabled
+        if timed:
+            start = time.perf_counter()
+            names = {reply.token: metrics.command_name(line)
+                    for (reply, line) in zip(replies, lines)}
+        gdb._send_lines(lines)
+
+        def resolve(reply, records):
+            reply._records = records
+            if timed:
+                metrics.sink.command_latency(names[reply.token],
+                        time.perf_counter() - start)
+
+        unresolved = {reply.token: reply for reply in replies}
+        # Records received since the last reply was complete.
+        pending = []
+        while unresolved:
+            try:
+                records = gdb.wait_for_replies(gdb._command_deadline())
+            except Timeout as e:
+                e.records[:0] = pending
+                e.recovered = gdb._recover(e.records, len(unresolved))
+                raise
+            pending.extend(records)
+            reply = None
+            for r in records:
+                if isinstance(r, parser.ResultRecord):
+                    reply = unresolved.pop(r._token, None)
+                    if reply is not None:
+                        break
+            if reply is not None:
+                resolve(reply, pending)
+                pending = []
+            elif not gdb._alive():
+                # As for a single command, the first gets what there is.
+                for reply in unresolved.values():
+                    resolve(reply, pending)
+                    pending = []
+                break
+            # Otherwise these are records that end with a prompt of
+            # their own, such as *stopped after -exec-next; they go with
+            # the next reply.
+
+def run_batch(gdb, tokens, lines):
+    ''' raw_commands() for a synchronous client: send all the commands
+        in one write, and return the list of records for each.
+    '''
+    p = Pipeline(gdb)
+    replies = [p.raw_command(t, l) for (t, l) in zip(tokens, lines)]
+    p.flush()
+    return [reply.result() for reply in replies]
+
+class Reply(object):
+    ''' Placeholder for the reply to a command in a Pipeline.
+    '''
+    def __init__(self, pipeline, token):
+        self._pipeline = pipeline
+        self.token = token
+        self._records = None
+
+    def done(self):
+        return self._records is not None
+
+    def result(self):
+        ''' Return the list of records, flushing the pipeline if needed.
+        '''
+        if self._records is None:
+            self._pipeline.flush()
+        return self._records
+
+
+class Stream(MiCommandsMixin):
+    ''' Sends commands for a synchronous client (sync.GdbMi or
+        pipe.PipeGdbMi), streaming one list-valued result of each reply.
+
+        Calling mi_* methods on a Stream sends the command at once, and
+        returns a parser.ListStream over the result named `key`, so a
+        huge list is decoded one element at a time as it is iterated:
+
+            for insn in gdb.stream('asm_insns').mi_data_disassemble(
+                    DisassembleMode.disassembly_only, start, end):
+                ...
+
+        The other records of the reply are returned with the next one,
+        like the initial records; its prompt is dropped.
+    '''
+    def __init__(self, gdb, key):
+        self._gdb = gdb
+        self._key = key
+
+    @property
+    def counter(self):
+        return self._gdb.counter
+
+    def raw_command(self, token, line):
+        return self._gdb.raw_command_stream(token, line, self._key)
+
+def stream_reply(records, token, key):
+    ''' Split a reply, parsed lazily, into a ListStream over the result
+        named `key` of its ResultRecord, and the out-of-band records.
+    '''
+    stream = None
+    rest = []
+    for r in records:
+        if isinstance(r, parser.ResultRecord) and r._token == token and stream is None:
+            stream = parser.ListStream.from_lazy(r, key)
+        elif not isinstance(r, parser.PromptRecord):
+            rest.append(r)
+    if stream is None:
+        raise ConnectionError('gdb has exited')
+    return stream, rest
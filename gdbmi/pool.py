@@ -0,0 +1,269 @@
+''' A pool of warm GDB sessions, with symbols already loaded.
+
+    Starting GDB and loading the symbols of a large executable can take
+    seconds, so tasks that each need a session for the same executable
+    (e.g. looking at many core dumps from one build) should lease one
+    from a SessionPool rather than start their own.
+'''
+from collections import OrderedDict
+import contextlib
+import os
+import threading
+import time
+
+from .elf import build_id
+from .pipe import PipeGdbMi
+from .timeouts import Timeout
+from . import parser
+
+
+class PoolExhausted(Exception):
+    ''' No session could be leased before the timeout.
+    '''
+
+
+class SessionPool(object):
+    ''' Leases out GDB sessions, each with one executable loaded.
+
+        At most `max_processes` GDBs run at once, whether leased or
+        idle. When a session for a new executable is needed and the pool
+        is full, the least recently used idle session is closed to make
+        room; if none is idle, the caller waits for one to be returned.
+        Idle sessions are closed after `idle_timeout` seconds.
+
+        Sessions are keyed by build-id, if the executable has one (so a
+        rebuilt binary at the same path does not get stale symbols),
+        and otherwise by its path, size and mtime.
+
+        `factory` is called with no arguments to start a session; the
+        default is PipeGdbMi(exe, profile). Sessions are used from one thread at
+        a time, but the pool itself may be shared between threads.
+
+        If `index_cache` (a symcache.IndexCache) is given, new sessions
+        use it, so symbols load faster from the second session on.
+    '''
+    # Seconds allowed for loading an executable, or None.
+    load_timeout = None
+    # Seconds allowed for resetting or closing a session.
+    reset_timeout = 10.0
+
+    def __init__(self, max_processes=4, idle_timeout=300.0, exe='gdb',
+            factory=None, index_cache=None, profile='default'):
+        if factory is None:
+            factory = lambda: PipeGdbMi(exe, profile)
+        self.max_processes = max_processes
+        self.idle_timeout = idle_timeout
+        self._factory = factory
+        self.index_cache = index_cache
+        self._cond = threading.Condition()
+        # Idle sessions, least recently returned first,
+        # mapped to (key, time returned).
+        self._idle = OrderedDict()
+        # Leased sessions, mapped to key.
+        self._leased = {}
+        # Includes sessions that are still starting.
+        self._total = 0
+        self._closed = False
+
+    def key(self, path):
+        ''' Return the key for sessions that can be used for `path`.
+        '''
+        bid = build_id(path)
+        if bid is not None:
+            return ('build-id', bid)
+        st = os.stat(path)
+        return ('path', os.path.realpath(path), st.st_size, st.st_mtime)
+
+    @contextlib.contextmanager
+    def lease(self, path, timeout=None):
+        ''' Context manager for acquire() and release().
+        '''
+        gdb = self.acquire(path, timeout)
+        try:
+            yield gdb
+        finally:
+            self.release(gdb)
+
+    def acquire(self, path, timeout=None):
+        ''' Return a session with `path` loaded, waiting for one if needed.
+
+            Raises PoolExhausted if `timeout` seconds pass first, or
+            MiError if GDB could not load `path`.
+        '''
+        key = self.key(path)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        doomed = []
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ValueError('pool is closed')
+                doomed.extend(self._expire())
+                gdb = self._take_idle(key)
+                if gdb is not None:
+                    break
+                if self._total >= self.max_processes and self._idle:
+                    # Make room by closing the least recently used.
+                    victim, _ = self._idle.popitem(last=False)
+                    self._total -= 1
+                    doomed.append(victim)
+                if self._total < self.max_processes:
+                    self._total += 1
+                    break
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._close_all(doomed)
+                        raise PoolExhausted(path)
+                    self._cond.wait(remaining)
+            if gdb is not None:
+                self._leased[gdb] = key
+        self._close_all(doomed)
+        if gdb is not None:
+            return gdb
+
+        # Starting GDB and loading symbols are slow, so are done
+        # without holding the lock.
+        try:
+            gdb = self._factory()
+            with gdb.limits(timeout=self.load_timeout):
+                if self.index_cache is None:
+                    parser.result_record(gdb.mi_file_exec_and_symbols(path))
+                else:
+                    self.index_cache.configure(gdb)
+                    self.index_cache.load(gdb, path)
+        except BaseException:
+            if gdb is not None:
+                self._close(gdb)
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._leased[gdb] = key
+        return gdb
+
+    def release(self, gdb):
+        ''' Return a session to the pool.
+
+            It is reset() first, and closed instead if it is dead, fails
+            to reset, or the pool has been closed.
+        '''
+        with self._cond:
+            key = self._leased.pop(gdb)
+            ok = not self._closed
+        # Resetting is slow, so is done without holding the lock; the
+        # pool may be closed meanwhile, which is checked again below.
+        ok = ok and gdb._alive()
+        if ok:
+            try:
+                with gdb.limits(timeout=self.reset_timeout):
+                    self.reset(gdb)
+            except (Timeout, ConnectionError):
+                ok = False
+            ok = ok and gdb._alive()
+        doomed = []
+        with self._cond:
+            if ok and not self._closed:
+                self._idle[gdb] = (key, time.monotonic())
+            else:
+                self._total -= 1
+                doomed.append(gdb)
+            doomed.extend(self._expire())
+            self._cond.notify()
+        self._close_all(doomed)
+
+    def discard(self, gdb):
+        ''' Close a leased session instead of returning it.
+        '''
+        with self._cond:
+            del self._leased[gdb]
+            self._total -= 1
+            self._cond.notify()
+        self._close(gdb)
+
+    def reset(self, gdb):
+        ''' Put a session back how it was just after loading symbols.
+
+            Errors from GDB are ignored, since most of these have
+            nothing to do most of the time. Subclasses may extend this.
+        '''
+        gdb.mi_break_delete()
+        # Kill any live inferior, and drop any core file.
+        gdb._cli('kill')
+        gdb._cli('core-file')
+        # Undo limits() set by the last user.
+        gdb.__dict__.pop('timeout', None)
+        gdb.__dict__.pop('deadline', None)
+
+    def evict_idle(self):
+        ''' Close all sessions that have been idle for too long.
+
+            This also happens whenever a session is acquired or released.
+        '''
+        with self._cond:
+            doomed = self._expire()
+        self._close_all(doomed)
+
+    def close(self):
+        ''' Close all idle sessions. Leased ones are closed when released.
+        '''
+        with self._cond:
+            self._closed = True
+            doomed = list(self._idle)
+            self._idle.clear()
+            self._total -= len(doomed)
+            self._cond.notify_all()
+        self._close_all(doomed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ty, v, tb):
+        self.close()
+
+    def __len__(self):
+        ''' The number of GDB processes, leased or idle.
+        '''
+        return self._total
+
+    def _take_idle(self, key):
+        # Prefer the most recently used, which is least likely to have
+        # been swapped out.
+        for gdb, (k, _) in reversed(list(self._idle.items())):
+            if k == key:
+                del self._idle[gdb]
+                return gdb
+        return None
+
+    def _expire(self):
+        if self.idle_timeout is None:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        doomed = []
+        for gdb, (_, since) in list(self._idle.items()):
+            if since > cutoff:
+                # The rest were returned more recently.
+                break
+            del self._idle[gdb]
+            self._total -= 1
+            doomed.append(gdb)
+        return doomed
+
+    def _close_all(self, sessions):
+        for gdb in sessions:
+            self._close(gdb)
+
+    def _close(self, gdb):
+        if gdb._alive():
+            try:
+                with gdb.limits(timeout=self.reset_timeout):
+                    gdb.mi_gdb_exit()
+            except (Timeout, ConnectionError, OSError):
+                pass
+        if gdb._alive():
+            gdb.do_signal_kill()
+        wait = getattr(gdb, 'wait', None)
+        if wait is not None:
+            wait()
@@ -1,15 +1,18 @@
 import itertools
-import os
-import shutil
+import time
 
-from twisted.internet import endpoints
-from twisted.protocols import basic
+from twisted.internet import defer, endpoints, protocol
 
-from .mixin import MiCommandsMixin
-from .parser import parse
+from .dispatch import Dispatcher
+from .framing import LineBuffer
+from .launch import gdb_command, report_startup
+from .metrics import ReplyMeter
+from .mixin import MiCommandsMixin, encode_line
+from . import metrics
+from .parser import PromptRecord, parse
 
 
-class GdbMiProtocol(basic.LineOnlyReceiver, MiCommandsMixin):
+class GdbMiProtocol(protocol.Protocol, MiCommandsMixin):
     ''' Twisted Protocol that parses GDB/MI lines.
 
         Nothing interesting is done with them - subclass me!
@@ -17,10 +20,25 @@ class GdbMiProtocol(basic.LineOnlyReceiver, MiCommandsMixin):
         You should subclass this to actually *do* something with the MI.
 
         Note: all methods provided by this package use snake_case. Only
-        methods inherited from twisted use camelCase.
+        methods inherited from twisted use camelCase. (`lineReceived` and
+        `sendLine` are kept from twisted's LineOnlyReceiver, which this
+        used to be.)
+
+        Lines are handled a read at a time, by lines_received(). A
+        subclass that still overrides lineReceived() is given each line
+        instead, and can pass them on to lines_received() itself.
     '''
     MAX_LENGTH = float('inf')
     delimiter = b'\n'
+    # If true, records only have their results parsed when first used.
+    # See parser.parse().
+    lazy = False
+    # If true, records use the slotted CompactRecord layout.
+    compact = False
+    # Seconds from connecting (i.e. spawning GDB) to its first prompt.
+    startup_time = None
+    # A transcript.TranscriptWriter to record all lines to, or None.
+    transcript = None
 
     @property
     def _proc(self):
@@ -33,7 +51,13 @@ class GdbMiProtocol(basic.LineOnlyReceiver, MiCommandsMixin):
         if not hasattr(self.transport, 'disconnecting'):
             self.transport.disconnecting = False
 
+        self._connected = time.monotonic()
         self.counter = itertools.count()
+        max_length = self.MAX_LENGTH
+        if max_length == float('inf'):
+            max_length = None
+        self._lines = LineBuffer(self.delimiter, max_length)
+        self._meter = ReplyMeter()
         self.handle_begin()
 
     def connectionLost(self, reason):
@@ -43,12 +67,57 @@ class GdbMiProtocol(basic.LineOnlyReceiver, MiCommandsMixin):
         del self.counter
         self.handle_end()
 
-    def lineReceived(self, line):
+    def dataReceived(self, data):
         ''' Implements twisted's interface.
         '''
-        line = line.decode('ascii')
-        record = parse(line)
-        self.handle_record(record)
+        buf = self._lines
+        lines = buf.feed(data)
+        if buf.max_length is not None:
+            # As LineOnlyReceiver did: lines up to the first that is too
+            # long are handled, then lineLengthExceeded() is called.
+            for i, line in enumerate(lines):
+                if len(line) > buf.max_length:
+                    self._deliver(lines[:i])
+                    buf.clear()
+                    return self.lineLengthExceeded(line)
+        self._deliver(lines)
+        if buf.overflowed():
+            return self.lineLengthExceeded(buf.clear())
+
+    def _deliver(self, lines):
+        if not lines:
+            return
+        if type(self).lineReceived is not GdbMiProtocol.lineReceived:
+            for line in lines:
+                self.lineReceived(line)
+        else:
+            self.lines_received(lines)
+
+    def lineLengthExceeded(self, line):
+        return self.transport.loseConnection()
+
+    def lineReceived(self, line):
+        ''' Implements twisted's interface; see the class docstring.
+        '''
+        self.lines_received([line])
+
+    def lines_received(self, lines):
+        ''' Parse a batch of complete lines, and handle the records.
+        '''
+        lazy = self.lazy
+        compact = self.compact
+        if self.transcript is not None:
+            self.transcript.received(lines)
+        if metrics.enabled:
+            records = self._meter.parse(lines, lazy, compact)
+        else:
+            records = [parse(line, lazy=lazy, compact=compact) for line in lines]
+        if self.startup_time is None:
+            for record in records:
+                if isinstance(record, PromptRecord):
+                    self.startup_time = report_startup(self, self._connected)
+                    break
+        self.handle_records(records)
 
     def handle_begin(self):
         pass
@@ -56,14 +125,35 @@ class GdbMiProtocol(basic.LineOnlyReceiver, MiCommandsMixin):
     def handle_end(self):
         pass
 
+    def handle_records(self, records):
+        ''' Handle all the records parsed from one read.
+
+            Override this to handle them as a batch.
+        '''
+        for record in records:
+            self.handle_record(record)
+
     def handle_record(self, record):
         raise NotImplementedError()
 
+    def sendLine(self, line):
+        line = encode_line(line)
+        if self.transcript is not None:
+            self.transcript.sent([line])
+        return self.transport.writeSequence((line, self.delimiter))
+
     def raw_command(self, token, line):
-        line = line.encode('ascii')
         self.sendLine(line)
         return token
 
+    def raw_commands(self, tokens, lines):
+        lines = [encode_line(line) for line in lines]
+        if self.transcript is not None:
+            self.transcript.sent(lines)
+        delimiter = self.delimiter
+        self.transport.writeSequence([b for line in lines for b in (line, delimiter)])
+        return tokens
+
     def do_signal_interrupt(self):
         ''' Ask GDB to sit down, shut up, and pay attention.
 
@@ -91,14 +181,64 @@ class GdbMiProtocol(basic.LineOnlyReceiver, MiCommandsMixin):
         self.transport.loseConnection()
 
 
+class DeferredGdbMiProtocol(GdbMiProtocol):
+    ''' GdbMiProtocol whose mi_* methods return Deferreds.
+
+        Each Deferred fires with (result_record, out_of_band_records),
+        where the latter are the records that arrived while the command
+        was the oldest one in flight. Note that ^error results are *not*
+        errbacks; check `result_record._class`. If the connection is
+        lost, all outstanding Deferreds errback with the reason.
+
+        Records that do not complete a command are passed on to
+        handle_unclaimed(), which is what you should override instead of
+        handle_record().
+
+        Set `max_in_flight` to limit how many commands are sent to GDB
+        before their replies arrive; the rest are queued here.
+    '''
+    max_in_flight = None
+
+    def connectionMade(self):
+        self._dispatcher = Dispatcher(self.sendLine,
+                _resolve_deferred, _fail_deferred, self.max_in_flight)
+        GdbMiProtocol.connectionMade(self)
+
+    def connectionLost(self, reason):
+        GdbMiProtocol.connectionLost(self, reason)
+        self._dispatcher.fail_all(reason)
+
+    def raw_command(self, token, line):
+        d = defer.Deferred()
+        self._dispatcher.submit(token, encode_line(line), d)
+        return d
+
+    def raw_commands(self, tokens, lines):
+        ds = [defer.Deferred() for _ in tokens]
+        self._dispatcher.submit_many(zip(tokens, map(encode_line, lines), ds))
+        return ds
+
+    def handle_record(self, record):
+        if not self._dispatcher.handle_record(record):
+            self.handle_unclaimed(record)
+
+    def handle_unclaimed(self, record):
+        pass
+
+def _resolve_deferred(d, record, oob):
+    d.callback((record, oob))
+
+def _fail_deferred(d, reason):
+    d.errback(reason)
+
+
 class ExecGdbMiEndpoint(endpoints.ProcessEndpoint):
-    def __init__(self, reactor, exe='gdb'):
+    def __init__(self, reactor, exe='gdb', profile='default'):
         ''' Endpoint that spawns an instance of GDB/MI.
+
+            `profile` is a launch.Profile, or the name of one.
         '''
-        full_exe = shutil.which(exe)
-        args = [exe, '--interpreter=mi2']
-        env = os.environ.copy() # The default is retarded.
-        #env['SHELL'] = 'gdb-xterm-sh'
+        full_exe, args, env = gdb_command(exe, profile)
         # Default is to pipe stderr, but passthrough is a better idea.
         #childFDs= { 0: "w", 1: "r", 2: "r" }
         childFDs = { 0: "w", 1: "r", 2: 2 }
@@ -0,0 +1,125 @@
+''' An on-disk cache of symbol indexes, keyed by build-id.
+
+    Without an index, GDB has to scan all of an executable's DWARF every
+    time it is loaded, which can take a long time for big ones. GDB's
+    own index cache (`set index-cache`) can look up a saved index by
+    build-id; this fills it synchronously with `save gdb-index`, and
+    keeps its size bounded.
+'''
+import errno
+import os
+import shutil
+import tempfile
+
+from .elf import build_id
+from .parser import MiError, result_record
+
+
+class IndexCache(object):
+    ''' A directory of <build-id>.gdb-index files, at most `max_bytes`
+        in total. The least recently used are deleted first.
+
+        Use configure() on a new session, then load() instead of
+        mi_file_exec_and_symbols(). Several processes may share one
+        directory.
+    '''
+    suffix = '.gdb-index'
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def configure(self, gdb):
+        ''' Point a session's GDB at the cache.
+
+            This must be done before loading any symbols.
+        '''
+        gdb._cli('set index-cache directory', self.directory)
+        try:
+            result_record(gdb._cli('set index-cache enabled on'))
+        except MiError:
+            # Before GDB 12.
+            result_record(gdb._cli('set index-cache on'))
+
+    def path(self, bid):
+        return os.path.join(self.directory, bid + self.suffix)
+
+    def load(self, gdb, path, symbol_file=False):
+        ''' Load `path` into a configured session, and return the reply.
+
+            If its index is not in the cache yet, it is saved there.
+            With `symbol_file`, only the symbols are loaded (as with
+            mi_file_symbol_file()).
+        '''
+        if symbol_file:
+            rv = gdb.mi_file_symbol_file(path)
+        else:
+            rv = gdb.mi_file_exec_and_symbols(path)
+        result_record(rv)
+        bid = build_id(path)
+        if bid is None:
+            return rv
+        cached = self.path(bid)
+        try:
+            # Mark it as recently used.
+            os.utime(cached, None)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self._save(gdb, cached)
+            self.evict()
+        return rv
+
+    def _save(self, gdb, cached):
+        # `save gdb-index` names the file after the executable, so use a
+        # private directory, and rename it into place atomically.
+        tmp = tempfile.mkdtemp(prefix='.save-', dir=self.directory)
+        try:
+            try:
+                result_record(gdb._cli('save gdb-index', tmp))
+            except MiError:
+                # e.g. the executable already has an index, or no DWARF.
+                return
+            for name in os.listdir(tmp):
+                if name.endswith(self.suffix):
+                    os.rename(os.path.join(tmp, name), cached)
+                    break
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def size(self):
+        ''' Return the total size of the cached indexes, in bytes.
+        '''
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self):
+        ''' Delete the least recently used indexes, until the cache fits.
+        '''
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError as e:
+                # Another process got there first.
+                if e.errno != errno.ENOENT:
+                    raise
+            total -= size
+
+    def _entries(self):
+        # (mtime, path, size) for each cached index.
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(self.suffix):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            yield st.st_mtime, entry.path, st.st_size
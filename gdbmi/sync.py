@@ -1,11 +1,21 @@
 from collections import OrderedDict, deque
 import importlib
+import time
 
 from twisted.internet import base
+try:
+    from twisted.internet.process import reapAllProcesses as _reap_all_processes
+except ImportError: # Windows
+    _reap_all_processes = None
+# Seconds between checks for GDB having exited.
+_reap_interval = 0.1
 
-from .mixin import MiCommandsMixin
+from .mixin import MiCommandsMixin, encode_line
+from . import metrics
 from . import parser
+from .pipeline import Pipeline, Reply, Stream, run_batch, stream_reply
 from .protocol import GdbMiProtocol, ExecGdbMiEndpoint
+from .timeouts import Timeout, TimeoutsMixin
 
 
 def _init_reactor_map(__reactor_map=OrderedDict()):
@@ -46,29 +56,98 @@ def list_reactor_classes():
 
 # Is it actually worth making this a separate class, or should I just
 # merge them?
-class GdbMi(MiCommandsMixin):
+class GdbMi(TimeoutsMixin, MiCommandsMixin):
     ''' Synchronous wrapper for GdbMiProtocol and a twisted reactor.
+
+        See TimeoutsMixin for `timeout` and `deadline`; when a command
+        hits either, it raises timeouts.Timeout.
+
+        If `transcript` (a transcript.TranscriptWriter) is given, all
+        traffic is recorded to it.
     '''
-    def __init__(self, exe='gdb'):
+    def __init__(self, exe='gdb', profile='default', transcript=None):
         from twisted.internet import endpoints
 
         reactor = (guess_reactor_class())()
-        endpoint = endpoint = ExecGdbMiEndpoint(reactor, exe=exe)
+        endpoint = endpoint = ExecGdbMiEndpoint(reactor, exe=exe, profile=profile)
         proto = _SyncGdbMiProtocol(reactor)
+        proto.transcript = transcript
         _ = endpoints.connectProtocol(endpoint, proto)
+        self._proto = proto
 
     def raw_command(self, token, line):
-        self._proto.sendLine(line.encode('ascii'))
-        return self._proto.wait_for_replies()
+        if not self._alive():
+            raise ConnectionError('gdb is not running')
+        self._proto.sendLine(line)
+        return self._wait_with_deadline()
+
+    def wait_for_replies(self, deadline=None):
+        return self._proto.wait_for_replies(deadline)
+
+    def _alive(self):
+        return self._proto._running
+
+    def _send_lines(self, lines):
+        delimiter = self._proto.delimiter
+        if self._proto.transcript is not None:
+            self._proto.transcript.sent(lines)
+        self._proto.transport.writeSequence([b for line in lines for b in (line, delimiter)])
+
+    def raw_commands(self, tokens, lines):
+        if not self._alive():
+            raise ConnectionError('gdb is not running')
+        return run_batch(self, tokens, [encode_line(line) for line in lines])
+
+    def pipeline(self):
+        ''' Return a Pipeline, to send many commands in a single write.
+        '''
+        return Pipeline(self)
+
+    def stream(self, key):
+        ''' Return a Stream, whose mi_* methods return a ListStream over
+            the result named `key` instead of the whole reply.
+        '''
+        return Stream(self, key)
+
+    def raw_command_stream(self, token, line, key):
+        ''' Like raw_command(), but return a parser.ListStream over the
+            result named `key`; see pipeline.Stream.
+        '''
+        proto = self._proto
+        lazy = proto.lazy
+        proto.lazy = True
+        try:
+            records = self.raw_command(token, line)
+        finally:
+            proto.lazy = lazy
+        stream, rest = stream_reply(records, token, key)
+        proto._records[:0] = rest
+        return stream
 
     @property
     def counter(self):
+        # The protocol drops its counter when the connection is lost.
+        if not self._alive():
+            raise ConnectionError('gdb is not running')
         return self._proto.counter
 
     @property
     def _proc(self):
         return self._proto._proc
 
+    @property
+    def startup_time(self):
+        return self._proto.startup_time
+
+    def do_signal_interrupt(self):
+        return self._proto.do_signal_interrupt()
+    def do_signal_terminate(self):
+        return self._proto.do_signal_terminate()
+    def do_signal_kill(self):
+        return self._proto.do_signal_kill()
+    def do_close(self):
+        return self._proto.do_close()
+
 
 class _SyncGdbMiProtocol(GdbMiProtocol):
     def __init__(self, reactor):
@@ -98,27 +177,48 @@ class _SyncGdbMiProtocol(GdbMiProtocol):
                 self._hook = None
         else:
             self._queue.append(r)
-            print('DEBUG:', 'len(_queue) =', len(self._queue))
+            if metrics.enabled:
+                metrics.sink.queue_depth('records', len(self._queue))
     def _requeue(self):
         ''' When a new hook has been installed, apply it to old records.
         '''
         while self._hook is not None and self._queue:
             self.handle_record(self._queue.popleft())
-    def _pump_once(self):
+    def _pump_once(self, delay=None):
         ''' Start the reactor, wait for at least one event, then stop it again.
 
             This will ultimately result in .handle_record() being called
             0 or more times, since FD events are not lines.
+
+            If `delay` is not None, wait at most that many seconds.
         '''
         assert self._running, 'Pumped when not running!'
-        self._reactor.iterate(None)
-    def _pump_harder(self):
+        # The reactor only installs its SIGCHLD handler when it is run()
+        # normally, so GDB's exit is only noticed by polling. Once its
+        # pipes are closed there is nothing else to wake us up, so never
+        # block for long.
+        if _reap_all_processes is not None:
+            if delay is None or delay > _reap_interval:
+                delay = _reap_interval
+        self._reactor.iterate(delay)
+        if _reap_all_processes is not None:
+            _reap_all_processes()
+    def _pump_harder(self, deadline=None):
         ''' Pump the reactor until the hook is satisfied.
+
+            Returns false if the deadline (a time.monotonic()) passed first.
         '''
         while self._hook is not None:
-            self._pump_once()
+            if deadline is None:
+                self._pump_once()
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._pump_once(remaining)
+        return True
 
-    def _run_until(self, hook):
+    def _run_until(self, hook, deadline=None):
         ''' Install a hook, and run until it is satisfied.
 
             This returns all records up to, and including, the one the
@@ -126,18 +226,25 @@ class _SyncGdbMiProtocol(GdbMiProtocol):
 
             If the hook is entirely satisfied from the queue, this might
             not even need to start the reactor.
+
+            If the deadline passes first, the hook is removed, and
+            Timeout is raised with the records so far. Later records go
+            to the queue as usual.
         '''
         assert self._hook is None
         self._hook = hook
 
         self._requeue()
-        self._pump_harder()
+        satisfied = self._pump_harder(deadline)
+        self._hook = None
 
         rv = self._records
         self._records = []
+        if not satisfied:
+            raise Timeout(rv)
         return rv
 
-    def wait_for_replies(self):
+    def wait_for_replies(self, deadline=None):
         ''' "How do we know when the replies are done" is a nontrivial question.
 
             The documentation is wrong, since notifications can occur *after*
@@ -153,4 +260,4 @@ class _SyncGdbMiProtocol(GdbMiProtocol):
             of notifications) without asking.
         '''
         # EOF handling is elsewhere.
-        return self._run_until(lambda rec: isinstance(rec, parser.PromptRecord))
+        return self._run_until(lambda rec: isinstance(rec, parser.PromptRecord), deadline)
@@ -0,0 +1,224 @@
+''' Thread-safe synchronous client.
+
+    Unlike .sync.GdbMi and .pipe.PipeGdbMi, which read GDB's output on
+    whichever thread is waiting for a reply, this owns one background
+    reader thread, so any number of threads can issue commands at once
+    and each only blocks on its own reply. A writer thread does all
+    writes to GDB, so nothing blocks on a full pipe while holding the
+    lock the reader needs.
+'''
+import itertools
+import os
+import signal
+import subprocess
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .dispatch import Dispatcher
+from .framing import LineBuffer
+from .launch import gdb_command, report_startup
+from .metrics import ReplyMeter
+from .mixin import MiCommandsMixin, encode_line
+from .parser import parse
+from . import metrics
+from . import parser
+
+
+class ThreadedGdbMi(MiCommandsMixin):
+    ''' Synchronous GDB/MI client that may be shared between threads.
+
+        mi_* methods block the calling thread until the ResultRecord
+        with their token arrives, then return a list of the out-of-band
+        records that arrived while the command was the oldest in flight,
+        followed by the ResultRecord. If GDB exits first, they raise
+        ConnectionError.
+
+        Every record other than a ResultRecord for a command (so also
+        the out-of-band records returned with replies, and prompts) is
+        put on `events`, a queue.Queue; a None is put there once GDB
+        has exited. If nothing reads the queue, set `keep_events` to
+        false.
+
+        If `transcript` (a transcript.TranscriptWriter) is given, all
+        traffic is recorded to it.
+    '''
+    # See parser.parse().
+    lazy = False
+    compact = False
+    keep_events = True
+    read_size = 1 << 16
+
+    def __init__(self, exe='gdb', max_in_flight=None, profile='default', transcript=None):
+        full_exe, args, env = gdb_command(exe, profile)
+        spawned = time.monotonic()
+        # Like ExecGdbMiEndpoint, stderr is passed through.
+        self._popen = subprocess.Popen(args, executable=full_exe, env=env,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self.counter = itertools.count()
+        self._transcript = transcript
+        self.events = queue.Queue()
+        self._lock = threading.Lock()
+        self._dispatcher = Dispatcher(self._send,
+                _resolve_waiter, _fail_waiter, max_in_flight)
+        self._ready = threading.Event()
+        self._exited = False
+        # Bytes for the writer thread to send; None closes stdin.
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop,
+                name='gdbmi-writer-%d' % self._popen.pid)
+        self._writer.daemon = True
+        self._writer.start()
+        self._reader = threading.Thread(target=self._read_loop,
+                name='gdbmi-reader-%d' % self._popen.pid)
+        self._reader.daemon = True
+        self._reader.start()
+        # Wait for the initial prompt; the records before it are events.
+        self._ready.wait()
+        # Seconds from spawning GDB to its first prompt.
+        self.startup_time = report_startup(self, spawned)
+
+    def raw_command(self, token, line):
+        waiter = _Waiter()
+        with self._lock:
+            if self._exited:
+                raise ConnectionError('gdb has exited')
+            self._dispatcher.submit(token, encode_line(line), waiter)
+        return waiter.wait()
+
+    def raw_commands(self, tokens, lines):
+        waiters = [_Waiter() for _ in tokens]
+        with self._lock:
+            if self._exited:
+                raise ConnectionError('gdb has exited')
+            self._dispatcher.submit_many(zip(tokens, map(encode_line, lines), waiters))
+        return [waiter.wait() for waiter in waiters]
+
+    def _send(self, line):
+        # Called with the lock held, so lines are queued in the same
+        # order as commands are put in flight. Writing could block until
+        # GDB reads, and GDB may be waiting for the reader to make room
+        # for its output, so that is left to the writer thread.
+        if self._transcript is not None:
+            self._transcript.sent([line])
+        self._writes.put(line + b'\n')
+
+    def _write_loop(self):
+        stdin = self._popen.stdin
+        try:
+            while True:
+                data = self._writes.get()
+                if data is None:
+                    break
+                # stdin is unbuffered, so writes may be partial.
+                data = memoryview(data)
+                while data:
+                    data = data[stdin.write(data):]
+        except (BrokenPipeError, ValueError):
+            # GDB has gone; the reader will notice.
+            pass
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def _read_loop(self):
+        lines = LineBuffer()
+        meter = ReplyMeter()
+        fd = self._popen.stdout.fileno()
+        lazy = self.lazy
+        compact = self.compact
+        try:
+            while True:
+                data = os.read(fd, self.read_size)
+                if not data:
+                    break
+                batch = lines.feed(data)
+                if self._transcript is not None and batch:
+                    self._transcript.received(batch)
+                if metrics.enabled:
+                    records = meter.parse(batch, lazy, compact)
+                else:
+                    records = [parse(line, lazy=lazy, compact=compact) for line in batch]
+                for record in records:
+                    with self._lock:
+                        claimed = self._dispatcher.handle_record(record)
+                    if claimed:
+                        continue
+                    if isinstance(record, parser.PromptRecord):
+                        self._ready.set()
+                    if self.keep_events:
+                        self.events.put(record)
+        finally:
+            with self._lock:
+                self._exited = True
+                self._dispatcher.fail_all(ConnectionError('gdb has exited'))
+            self._writes.put(None)
+            self._ready.set()
+            self.events.put(None)
+
+    @property
+    def pid(self):
+        return self._popen.pid
+
+    def do_signal_interrupt(self):
+        ''' Ask GDB to sit down, shut up, and pay attention.
+
+            You should probably use mi_exec_interrupt() instead,
+            but in certain cases that may not be appropriate.
+        '''
+        self._popen.send_signal(signal.SIGINT)
+    def do_signal_terminate(self):
+        ''' Kill GDB politely.
+
+            You should probably use mi_gdb_exit() instead.
+        '''
+        self._popen.terminate()
+    def do_signal_kill(self):
+        ''' Kill GDB unstoppably.
+
+            You should probably use mi_gdb_exit() instead.
+        '''
+        self._popen.kill()
+    def do_close(self):
+        ''' Close I/O streams, letting GDB die out of our control.
+
+            You should probably use mi_gdb_exit() instead.
+        '''
+        with self._lock:
+            self._writes.put(None)
+
+    def wait(self, timeout=None):
+        ''' Wait for GDB to exit (and the reader to finish); return its status.
+        '''
+        rv = self._popen.wait(timeout)
+        self._reader.join(timeout)
+        self._writer.join(timeout)
+        return rv
+
+
+class _Waiter(object):
+    __slots__ = ('_event', '_result', '_error')
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+def _resolve_waiter(waiter, record, oob):
+    waiter._result = oob + [record]
+    waiter._event.set()
+
+def _fail_waiter(waiter, reason):
+    waiter._error = reason
+    waiter._event.set()
@@ -0,0 +1,107 @@
+''' Timeouts for the synchronous clients.
+'''
+import contextlib
+import time
+
+
+class Timeout(Exception):
+    ''' A command did not get its reply in time.
+
+        `records` are all the records received for it (including any
+        received while recovering). If `recovered` is true, GDB is back
+        at a prompt, with every reply consumed, and can be used as
+        normal. Otherwise it has been killed.
+    '''
+    def __init__(self, records, recovered=False):
+        Exception.__init__(self, 'timed out after %d records' % len(records))
+        self.records = records
+        self.recovered = recovered
+
+
+class TimeoutsMixin(object):
+    ''' Per-command timeouts and an overall deadline.
+
+        Needs wait_for_replies(deadline), which raises Timeout (with the
+        records so far) at the deadline, _send_lines(), _alive() and
+        the do_signal_* methods.
+
+        When a command times out, GDB is first sent -exec-interrupt,
+        then SIGINT, waiting `escalation_delay` seconds after each for
+        it to come back to a prompt, and finally SIGKILL.
+    '''
+    # Seconds allowed for each command, or None.
+    timeout = None
+    # time.monotonic() after which all commands time out, or None.
+    deadline = None
+    escalation_delay = 1.0
+
+    @contextlib.contextmanager
+    def limits(self, timeout=None, deadline=None):
+        ''' Temporarily set `timeout` and `deadline` (if not None).
+        '''
+        old = self.timeout, self.deadline
+        if timeout is not None:
+            self.timeout = timeout
+        if deadline is not None:
+            self.deadline = deadline
+        try:
+            yield self
+        finally:
+            self.timeout, self.deadline = old
+
+    def _command_deadline(self):
+        deadline = self.deadline
+        if self.timeout is not None:
+            end = time.monotonic() + self.timeout
+            if deadline is None or end < deadline:
+                deadline = end
+        return deadline
+
+    def _wait_with_deadline(self):
+        try:
+            return self.wait_for_replies(self._command_deadline())
+        except Timeout as e:
+            e.recovered = self._recover(e.records)
+            raise
+
+    def _recover(self, records, owed=1):
+        ''' After a timeout, try ever harder to get GDB back to a prompt.
+
+            `owed` is the number of prompts still due: one for the
+            command that timed out, plus one for each sent after it.
+            Returns true if that worked, and every prompt we were owed
+            has been consumed.
+        '''
+        for step in [self._send_interrupt_command, self.do_signal_interrupt]:
+            if not self._alive():
+                return False
+            owed += step() or 0
+            owed = self._collect_prompts(owed, records,
+                    time.monotonic() + self.escalation_delay)
+            if not owed:
+                return self._alive()
+        if self._alive():
+            self.do_signal_kill()
+            # Wait for EOF, so the client knows it is dead.
+            self._collect_prompts(1, records,
+                    time.monotonic() + self.escalation_delay)
+        return False
+
+    def _send_interrupt_command(self):
+        token = next(self.counter)
+        self._send_lines([('%d-exec-interrupt' % token).encode('ascii')])
+        return 1
+
+    def _collect_prompts(self, n, records, deadline):
+        ''' Wait for `n` more prompts, and return how many are still owed.
+        '''
+        while n:
+            try:
+                records.extend(self.wait_for_replies(deadline))
+            except Timeout as e:
+                records.extend(e.records)
+                return n
+            if not self._alive():
+                return n
+            n -= 1
+        return 0
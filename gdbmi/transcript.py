@@ -0,0 +1,213 @@
+''' Recording MI traffic, and replaying it without GDB.
+
+    A transcript is a text file: a header line, then one line per MI
+    line sent or received, as
+
+        <direction><microseconds since the previous line> <MI line>
+
+    where direction is '>' for lines sent to GDB and '<' for lines from
+    it. Pass a TranscriptWriter as `transcript` to a client to record.
+
+    To replay, run `python -m gdbmi.transcript FILE` in place of GDB, or
+    use write_stand_in() to make an executable that any client (e.g.
+    ExecGdbMiEndpoint) can be given as `exe`. Each command gets the reply
+    that was recorded for the same command (ignoring its token), after
+    the recorded delay.
+'''
+import argparse
+from collections import defaultdict, deque
+import os
+import re
+import stat
+import sys
+import threading
+import time
+
+
+_header = b'gdbmi-transcript 1\n'
+_token_re = re.compile(br'^(\d*)(.*)$', re.S)
+_prompt = b'(gdb)'
+
+
+class TranscriptWriter(object):
+    ''' Appends the lines sent to and received from GDB to a transcript.
+
+        `f` is a path, or a binary file opened for writing. sent() and
+        received() may be called from different threads.
+    '''
+    def __init__(self, f):
+        if not hasattr(f, 'write'):
+            f = open(f, 'wb')
+        self._f = f
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+        f.write(_header)
+
+    def sent(self, lines):
+        self._write(b'>', lines)
+
+    def received(self, lines):
+        self._write(b'<', lines)
+
+    def _write(self, direction, lines):
+        with self._lock:
+            now = time.monotonic()
+            delta = b'%d ' % int((now - self._last) * 1e6)
+            self._last = now
+            out = []
+            for line in lines:
+                # A command with extra lines is sent as one string.
+                for bit in line.split(b'\n'):
+                    out += [direction, delta, bit, b'\n']
+                    delta = b'0 '
+            self._f.write(b''.join(out))
+            self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def read_transcript(f):
+    ''' Yield (direction, seconds since previous line, line) from a transcript.
+    '''
+    if not hasattr(f, 'read'):
+        with open(f, 'rb') as f:
+            for event in read_transcript(f):
+                yield event
+        return
+    assert f.readline() == _header, 'not a transcript'
+    for line in f:
+        line = line.rstrip(b'\n')
+        delta, _, payload = line[1:].partition(b' ')
+        yield line[:1], int(delta) / 1e6, payload
+
+
+class Replay(object):
+    ''' The replies in a transcript, indexed by command.
+
+        Each reply is a list of (delay, line). The reply to a command is
+        every line GDB sent from the command until its prompt, plus any
+        lines (e.g. *stopped) that arrived before the next command.
+    '''
+    def __init__(self, events):
+        self.startup = []
+        # command (without token) -> deque of (token, reply)
+        self._replies = defaultdict(deque)
+        # Replies whose prompt has not arrived yet, and when sent.
+        waiting = deque()
+        # Received lines go to `current`, which is complete once `done`.
+        current = self.startup
+        done = False
+        last = now = 0.0
+        for direction, delta, line in events:
+            now += delta
+            if direction == b'>':
+                token, cmd = _token_re.match(line).groups()
+                if not cmd.startswith(b'-'):
+                    # More lines of the previous command.
+                    continue
+                reply = []
+                self._replies[cmd].append((token, reply))
+                waiting.append((reply, now))
+                continue
+            if done and waiting:
+                current, last = waiting.popleft()
+                done = False
+            current.append((max(0.0, now - last), line))
+            last = now
+            if line.startswith(_prompt):
+                done = True
+
+    def reply(self, cmd):
+        ''' Return (recorded token, reply) for a command (without token).
+
+            Replies to repeated commands are used in order; the last is
+            reused once they run out. Returns None if there is none.
+        '''
+        replies = self._replies.get(cmd)
+        if not replies:
+            return None
+        if len(replies) > 1:
+            return replies.popleft()
+        return replies[0]
+
+
+def replay(transcript, stdin, stdout, speed=1.0, latency=0.0):
+    ''' Act like GDB, answering commands from `stdin` with the replies
+        in `transcript`.
+
+        Delays are divided by `speed` (0 means no delays), and `latency`
+        seconds are added before each reply.
+    '''
+    rep = Replay(read_transcript(transcript))
+    _play(rep.startup, None, None, stdout, speed, 0.0)
+    for line in stdin:
+        line = line.rstrip(b'\n')
+        token, cmd = _token_re.match(line).groups()
+        if not cmd.startswith(b'-'):
+            continue
+        found = rep.reply(cmd)
+        if found is None:
+            msg = b'replay: no recorded reply for ' + cmd
+            msg = msg.replace(b'\\', b'\\\\').replace(b'"', b'\\"')
+            reply = [(0.0, token + b'^error,msg="' + msg + b'"'), (0.0, b'(gdb) ')]
+            _play(reply, None, None, stdout, speed, latency)
+            continue
+        old_token, reply = found
+        _play(reply, old_token, token, stdout, speed, latency)
+        if cmd.startswith(b'-gdb-exit'):
+            break
+
+def _play(reply, old_token, token, stdout, speed, latency):
+    if latency:
+        time.sleep(latency)
+    if old_token is not None and old_token != token:
+        old = old_token + b'^'
+        new = token + b'^'
+    else:
+        old = None
+    out = []
+    for delay, line in reply:
+        if speed and delay:
+            if out:
+                stdout.write(b''.join(out))
+                stdout.flush()
+                out = []
+            time.sleep(delay / speed)
+        if old is not None and line.startswith(old):
+            line = new + line[len(old):]
+        out += [line, b'\n']
+    stdout.write(b''.join(out))
+    stdout.flush()
+
+
+def write_stand_in(path, transcript, speed=1.0, latency=0.0):
+    ''' Write an executable at `path` that replays `transcript`, and
+        can be used as a client's `exe` in place of GDB.
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    def q(s):
+        return "'%s'" % s.replace("'", "'\\''")
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n')
+        f.write('PYTHONPATH=%s${PYTHONPATH:+:$PYTHONPATH} exec %s -m gdbmi.transcript'
+                ' --speed %r --latency %r %s "$@"\n' % (q(root), q(sys.executable),
+                speed, latency, q(os.path.abspath(transcript))))
+    st = os.stat(path)
+    os.chmod(path, st.st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+def main():
+    ap = argparse.ArgumentParser(description='Replay a GDB/MI transcript, in place of GDB.')
+    ap.add_argument('--speed', type=float, default=1.0,
+            help='divide recorded delays by this; 0 for no delays')
+    ap.add_argument('--latency', type=float, default=0.0,
+            help='extra seconds before each reply')
+    ap.add_argument('transcript')
+    # Whatever the client would pass to GDB.
+    ap.add_argument('gdb_args', nargs=argparse.REMAINDER)
+    args = ap.parse_args()
+    replay(args.transcript, sys.stdin.buffer, sys.stdout.buffer,
+            args.speed, args.latency)
+
+if __name__ == '__main__':
+    main()
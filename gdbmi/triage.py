@@ -0,0 +1,173 @@
+''' Collect backtraces of all threads from many core dumps, in parallel.
+
+    Usage: python -m gdbmi.triage [options] EXECUTABLE CORE...
+           python -m gdbmi.triage [options] --pairs FILE
+
+    Writes one JSON object per core to stdout, as each one is done.
+'''
+import argparse
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import json
+import multiprocessing
+import sys
+import time
+
+from .launch import profiles
+from .parser import MiError, result_record
+from .pool import SessionPool
+from .symcache import IndexCache
+from .timeouts import Timeout
+
+
+def backtraces(gdb, core, max_frames=None):
+    ''' Load `core` into a session, and return a JSON-able dict.
+
+        The executable must already be loaded (see pool.SessionPool).
+    '''
+    result_record(gdb.mi_target_select('core', core))
+    info = result_record(gdb.mi_thread_info())
+    low = high = None
+    if max_frames is not None:
+        low, high = 0, max_frames - 1
+    threads = []
+    for thread in info.threads:
+        result_record(gdb.mi_thread_select(thread['id']))
+        stack = result_record(gdb.mi_stack_list_frames(low, high))
+        t = _jsonable(thread)
+        # Only the innermost frame; the full stack replaces it.
+        t.pop('frame', None)
+        t['frames'] = _jsonable(stack.stack)
+        threads.append(t)
+    return {
+        'core': core,
+        'current_thread': _jsonable(getattr(info, 'current_thread_id', None)),
+        'threads': threads,
+    }
+
+def _jsonable(v):
+    if isinstance(v, bytes):
+        return v.decode('utf-8', 'replace')
+    if isinstance(v, Mapping):
+        return {k: _jsonable(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_jsonable(x) for x in v]
+    return v
+
+
+# State of each worker process.
+_pool = None
+_options = None
+
+def _init_worker(exe, profile, sessions, timeout, max_frames, index_cache):
+    global _pool, _options
+    if index_cache is not None:
+        index_cache = IndexCache(*index_cache)
+    _pool = SessionPool(max_processes=sessions, idle_timeout=None, exe=exe,
+            index_cache=index_cache, profile=profile)
+    _options = (timeout, max_frames)
+
+def _triage_one(pair):
+    executable, core = pair
+    timeout, max_frames = _options
+    start = time.monotonic()
+    try:
+        with _pool.lease(executable) as gdb:
+            with gdb.limits(timeout=timeout):
+                rv = backtraces(gdb, core, max_frames)
+    except (MiError, Timeout, ConnectionError, OSError) as e:
+        rv = {'core': core, 'error': '%s: %s' % (type(e).__name__, e)}
+    rv['executable'] = executable
+    rv['seconds'] = round(time.monotonic() - start, 6)
+    return rv
+
+def triage(pairs, processes=None, exe='gdb', sessions=2, timeout=60.0,
+        max_frames=None, index_cache=None, profile='fast'):
+    ''' Yield backtraces() for many (executable, core) pairs.
+
+        The work is spread over `processes` worker processes, each of
+        which keeps up to `sessions` GDBs with symbols loaded. Results
+        are yielded as they are ready, not in order; each also has the
+        executable, and either the threads or an error.
+
+        `index_cache` is an optional (directory, max_bytes) for a shared
+        symcache.IndexCache. `profile` is the name of a launch profile.
+    '''
+    # Sorting sends runs of cores for the same executable to the same
+    # worker, so symbols are loaded as few times as possible.
+    pairs = sorted(pairs)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    chunksize = max(1, min(16, len(pairs) // (4 * processes)))
+    workers = multiprocessing.Pool(processes, _init_worker,
+            (exe, profile, sessions, timeout, max_frames, index_cache))
+    try:
+        for rv in workers.imap_unordered(_triage_one, pairs, chunksize):
+            yield rv
+    finally:
+        # GDB exits when its worker does, on EOF from stdin.
+        workers.terminate()
+        workers.join()
+
+def _read_pairs(f):
+    for line in f:
+        line = line.rstrip('\n')
+        if line and not line.startswith('#'):
+            executable, core = line.split('\t', 1)
+            yield executable, core
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--pairs', metavar='FILE',
+            help='tab-separated executable and core per line, or - for stdin')
+    ap.add_argument('--gdb', default='gdb', help='GDB executable')
+    ap.add_argument('--profile', default='fast', choices=sorted(profiles),
+            help='how to start GDB (see gdbmi.launch)')
+    ap.add_argument('-j', '--processes', type=int, default=None)
+    ap.add_argument('--sessions', type=int, default=2,
+            help='GDBs kept per worker process')
+    ap.add_argument('--timeout', type=float, default=60.0,
+            help='seconds allowed for each command')
+    ap.add_argument('--max-frames', type=int, default=None)
+    ap.add_argument('--index-cache', metavar='DIR',
+            help='directory for cached symbol indexes')
+    ap.add_argument('--index-cache-size', type=int, default=1 << 30,
+            metavar='BYTES')
+    ap.add_argument('--stats', action='store_true',
+            help='report throughput on stderr')
+    ap.add_argument('files', nargs='*', metavar='EXECUTABLE CORE')
+    args = ap.parse_args()
+
+    if args.pairs is not None:
+        if args.files:
+            ap.error('--pairs does not take other arguments')
+        if args.pairs == '-':
+            pairs = list(_read_pairs(sys.stdin))
+        else:
+            with open(args.pairs) as f:
+                pairs = list(_read_pairs(f))
+    else:
+        if len(args.files) < 2:
+            ap.error('need an executable and at least one core')
+        pairs = [(args.files[0], core) for core in args.files[1:]]
+
+    index_cache = None
+    if args.index_cache is not None:
+        index_cache = (args.index_cache, args.index_cache_size)
+
+    start = time.monotonic()
+    errors = 0
+    for rv in triage(pairs, args.processes, args.gdb, args.sessions,
+            args.timeout, args.max_frames, index_cache, args.profile):
+        errors += 'error' in rv
+        sys.stdout.write(json.dumps(rv, sort_keys=True) + '\n')
+        sys.stdout.flush()
+    if args.stats:
+        elapsed = time.monotonic() - start
+        sys.stderr.write('%d cores (%d errors) in %.2fs, %.1f cores/s\n' % (
+            len(pairs), errors, elapsed, len(pairs) / elapsed if elapsed else 0))
+
+if __name__ == '__main__':
+    main()
@@ -28,3 +28,25 @@ class Constant(object):
         self.name = name
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__, self.name)
+
+
+class InternTable(object):
+    ''' Interned plain values, using the same per-table cache idea
+    as Constant, but returning the values themselves.
+
+    Calling the table returns the first equal value it was given, so
+    equal values share one object. If a `limit` is given, the cache is
+    simply dropped whenever it grows past it.
+    '''
+    def __init__(self, limit=None):
+        self._cache = {}
+        self._limit = limit
+    def __call__(self, value):
+        cache = self._cache
+        rv = cache.setdefault(value, value)
+        if rv is value and self._limit is not None and len(cache) > self._limit:
+            cache.clear()
+            cache[value] = value
+        return rv
+    def __len__(self):
+        return len(self._cache)
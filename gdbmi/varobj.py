@@ -0,0 +1,216 @@
+''' A managed tree of GDB variable objects.
+
+    Children are fetched lazily, a window at a time, and kept. After a
+    stop, one -var-update brings every cached value up to date, but GDB
+    only re-evaluates children in a visible window: those scrolled out
+    of view are frozen, and for dynamic varobjs (pretty-printed
+    containers) the update range is set to the window. So the cost of a
+    stop depends on what is shown, not on the size of the containers.
+'''
+from .mixin import PrintValues
+from .parser import result_record
+
+
+class Varobj(object):
+    ''' What is known of one variable object.
+
+        `children` maps indexes to the children fetched so far, and
+        `window` is the (start, stop) range last asked for, or None.
+        `value` is None for a varobj that has no value (e.g. a struct),
+        and `in_scope` is false while its root is out of scope.
+    '''
+    def __init__(self, name, parent=None, index=None):
+        self.name = name
+        self.parent = parent
+        self.index = index
+        self.exp = None
+        self.type = None
+        self.value = None
+        self.numchild = 0
+        self.dynamic = False
+        self.has_more = False
+        self.displayhint = None
+        self.in_scope = True
+        self.frozen = False
+        self.children = {}
+        self.window = None
+
+    def _set(self, get):
+        # get(key, default) gives a field from -var-create, or of a
+        # child from -var-list-children.
+        self.exp = get('exp', self.exp)
+        self.type = get('type', self.type)
+        self.value = get('value')
+        self.numchild = int(get('numchild', 0))
+        self.dynamic = get('dynamic') == b'1'
+        self.has_more = get('has_more') == b'1'
+        self.displayhint = get('displayhint')
+
+    def __repr__(self):
+        return 'Varobj(%r, value=%r, numchild=%d)' % (self.name, self.value, self.numchild)
+
+
+class VarobjTree(object):
+    ''' Variable objects for a synchronous client, with their children
+        cached and updated incrementally.
+
+        Use create() for each watched expression, children() for what is
+        on screen, and update() after each stop. All commands that can
+        be are sent with batch(), so one call is one round trip.
+    '''
+    print_values = PrintValues.all_values
+
+    def __init__(self, gdb):
+        self._gdb = gdb
+        self.roots = []
+        # name -> Varobj, for everything in the tree.
+        self._by_name = {}
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def create(self, expression, frame='*'):
+        ''' Create a root varobj. `frame` is as for -var-create: '*' for
+            the current frame at each update, '@' for a floating one, or
+            a frame address.
+        '''
+        r = result_record(self._gdb.mi_var_create('-', frame, expression))
+        var = Varobj(r.name)
+        var._set(lambda k, default=None: getattr(r, k, default))
+        var.exp = expression
+        self.roots.append(var)
+        self._by_name[var.name] = var
+        return var
+
+    def children(self, var, start=0, stop=None):
+        ''' Return the children of `var` from `start` up to `stop` (or the
+            end), fetching those not cached yet, and make them the
+            visible window: only they are updated by later update()s.
+
+            For a dynamic varobj, stop must be given if it has_more.
+        '''
+        if stop is None or (not var.dynamic and stop > var.numchild):
+            stop = var.numchild
+        start = min(start, stop)
+        old = var.window
+        var.window = (start, stop)
+        missing = [i for i in range(start, stop) if i not in var.children]
+        with self._gdb.batch() as b:
+            if var.dynamic:
+                if old != var.window:
+                    b.mi_var_set_update_range(var.name, start, stop)
+            else:
+                for i, child in var.children.items():
+                    shown = start <= i < stop
+                    if child.frozen == shown:
+                        child.frozen = not shown
+                        b.mi_var_set_frozen(child.name, not shown)
+                        if shown:
+                            # Unfreezing does not update it.
+                            b.mi_var_update(child.name, self.print_values)
+            if missing:
+                listed = b.mi_var_list_children(var.name,
+                        missing[0], missing[-1] + 1, self.print_values)
+            else:
+                listed = None
+        for i, records in enumerate(b.results):
+            if i == listed:
+                r = result_record(records)
+                for n, fields in enumerate(getattr(r, 'children', [])):
+                    self._add_child(var, missing[0] + n, fields)
+                var.has_more = getattr(r, 'has_more', b'0') == b'1'
+            else:
+                r = result_record(records)
+                for change in getattr(r, 'changelist', []):
+                    self._apply(change)
+        return [var.children[i] for i in range(start, stop) if i in var.children]
+
+    def _add_child(self, parent, index, fields):
+        name = fields['name']
+        child = self._by_name.get(name)
+        if child is None:
+            child = Varobj(name, parent, index)
+            self._by_name[name] = child
+        child._set(fields.get)
+        parent.children[index] = child
+        if parent.dynamic:
+            parent.numchild = max(parent.numchild, index + 1)
+
+    def update(self):
+        ''' Update every varobj after a stop, and return a list of those
+            that changed.
+        '''
+        r = result_record(self._gdb.mi_var_update('*', self.print_values))
+        changed = []
+        for change in r.changelist:
+            var = self._apply(change)
+            if var is not None:
+                changed.append(var)
+        return changed
+
+    def _apply(self, change):
+        # One entry of a -var-update changelist.
+        var = self._by_name.get(change['name'])
+        if var is None:
+            return None
+        get = change.get
+        in_scope = get('in_scope', b'true')
+        if in_scope == b'invalid':
+            # It can never be updated again, so GDB wants it deleted.
+            self.delete(var)
+            return var
+        var.in_scope = in_scope == b'true'
+        if 'value' in change:
+            var.value = change['value']
+        if get('type_changed') == b'true':
+            # GDB has deleted its children.
+            self._forget_children(var)
+            var.type = get('new_type', var.type)
+            var.window = None
+        if 'new_num_children' in change:
+            var.numchild = int(change['new_num_children'])
+            for i in [i for i in var.children if i >= var.numchild]:
+                self._forget(var.children.pop(i))
+        if get('new_children'):
+            # Appended to a dynamic varobj; their indexes follow what
+            # GDB had, which need not be what is cached.
+            self._forget_children(var)
+            var.window = None
+        if 'has_more' in change:
+            var.has_more = change['has_more'] == b'1'
+        if 'dynamic' in change:
+            var.dynamic = change['dynamic'] == b'1'
+        if 'displayhint' in change:
+            var.displayhint = change['displayhint']
+        return var
+
+    def delete(self, var):
+        ''' Delete a varobj and its children, in GDB and here.
+        '''
+        result_record(self._gdb.mi_var_delete(var.name))
+        self._forget(var)
+        if var.parent is None:
+            self.roots.remove(var)
+        else:
+            var.parent.children.pop(var.index, None)
+
+    def clear(self):
+        ''' Delete every root varobj.
+        '''
+        with self._gdb.batch() as b:
+            for var in self.roots:
+                b.mi_var_delete(var.name)
+        self.roots = []
+        self._by_name.clear()
+
+    def _forget_children(self, var):
+        for child in var.children.values():
+            self._forget(child)
+        var.children = {}
+
+    def _forget(self, var):
+        self._by_name.pop(var.name, None)
+        self._forget_children(var)
@@ -0,0 +1,10 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def fake_gdb():
+    ''' Path to an executable stand-in for GDB; see fakegdb.py.
+    '''
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fakegdb.py')
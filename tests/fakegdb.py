@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+''' A stand-in for GDB in MI mode, for the tests.
+
+    It answers most commands with ^done, echoing the command and its
+    arguments, and models just enough of GDB for the tests:
+
+      * -hang waits for SIGINT, as a command stuck in the inferior would.
+      * -exec-next/-exec-continue run and stop, with the extra prompt
+        GDB prints after *stopped; they also change register values.
+      * -data-list-register-values and -data-list-changed-registers
+        (whose baseline, like GDB's, moves on every call).
+      * -data-disassemble -s START -e END, one byte per instruction,
+        after a notification.
+      * -thread-info and -stack-list-frames, for `nthreads` threads
+        `nframes` deep, as if a core were loaded.
+      * -data-evaluate-expression (with --thread and --frame), and
+        -gdbmi-evaluate-many once evaluate.install() has run its Python.
+        Expressions are a few `symbols`, $_thread and $pc (which depend
+        on the selected thread and frame), numbers, and negations.
+        With --no-python on the command line, there is no Python.
+      * Variable objects (-var-*) for `arr`, an int[arr_len] whose
+        elements all change on every step, and `vec`, a pretty-printed
+        vector (a dynamic varobj) of vec_len ints that also grows by
+        one; frozen varobjs and update ranges are honoured. Assigning a
+        number to `vec` resizes it.
+      * -file-exec-and-symbols and -file-symbol-file, of any existing
+        file, and the console commands of symcache.IndexCache: `save
+        gdb-index` writes a small index, unless the file's name ends in
+        -indexed (as if it had one already). With --gdb-11 on the
+        command line, `set index-cache enabled` does not exist yet.
+      * -stand-in-info replies with the command line, the settings made
+        with -iex or `set`, and the environment, to check how it was
+        started.
+
+    Arguments are split as GDB does; see parse_argv().
+'''
+import os
+import re
+import signal
+import sys
+import time
+
+
+def c_quote(s):
+    return '"%s"' % s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+_simple_escapes = {
+    'a': 7, 'b': 8, 'f': 12, 'n': 10, 'r': 13, 't': 9, 'v': 11,
+}
+_space = b' \t\n\v\f\r'
+
+def _parse_escape(s, i):
+    # gdb's parse_escape(), from just after the backslash.
+    # Returns (byte, new index); byte is None where gdb would fail.
+    c = s[i:i + 1]
+    if c == b'\n' or not c:
+        return None, i
+    if b'0' <= c <= b'7':
+        n = 0
+        count = 0
+        while count < 3 and i < len(s) and b'0'[0] <= s[i] <= b'7'[0]:
+            n = n * 8 + s[i] - b'0'[0]
+            i += 1
+            count += 1
+        return n & 0xff, i
+    if c == b'^':
+        c2 = s[i + 1:i + 2]
+        if c2 == b'?':
+            return 127, i + 2
+        return s[i + 1] & 31, i + 2
+    return _simple_escapes.get(c.decode('latin-1'), s[i]), i + 1
+
+def parse_argv(s):
+    ''' Split an argument string as gdb's mi_parse_argv() does
+        (gdb/mi/mi-parse.c).
+
+        Returns a list of bytes, or None where gdb would reject it.
+    '''
+    argv = []
+    i = 0
+    while True:
+        while i < len(s) and s[i] in _space:
+            i += 1
+        if i == len(s):
+            return argv
+        if s[i:i + 1] == b'"':
+            i += 1
+            arg = bytearray()
+            while i < len(s) and s[i:i + 1] != b'"':
+                if s[i:i + 1] == b'\\':
+                    c, i = _parse_escape(s, i + 1)
+                    # Do not allow split lines or "\000".
+                    if not c:
+                        return None
+                    arg.append(c)
+                else:
+                    arg.append(s[i])
+                    i += 1
+            # Insist on a closing quote, and then white space.
+            if i == len(s):
+                return None
+            i += 1
+            if i < len(s) and s[i] not in _space:
+                return None
+            argv.append(bytes(arg))
+        else:
+            start = i
+            while i < len(s) and s[i] not in _space:
+                i += 1
+            argv.append(s[start:i])
+
+class FakeGdb(object):
+    nregs = 8
+    nthreads = 4
+    nframes = 12
+
+    symbols = {'x': 42, 'f': 7, 't': 3}
+    arr_len = 100
+    vec_len = 5
+
+    def __init__(self, out, argv=()):
+        self.out = out
+        self.argv = list(argv)
+        self.python = '--no-python' not in self.argv
+        self.version = 11 if '--gdb-11' in self.argv else 13
+        self.settings = [v for (k, v) in zip(self.argv, self.argv[1:]) if k == '-iex']
+        self.file = None
+        self.interrupted = False
+        self.regs = [0] * self.nregs
+        self.base = None
+        self.thread = 1
+        self.frame = 0
+        # Commands added from Python, handled by py_* methods.
+        self.mi_commands = set()
+        self.steps = 0
+        # name -> Var, in order of creation.
+        self.varobjs = {}
+        self.nvarobjs = 0
+
+    def write(self, *lines):
+        self.out.write(''.join(line + '\n' for line in lines))
+        self.out.flush()
+
+    def run(self, stdin):
+        self.write('=thread-group-added,id="i1"', '~"fake gdb\\n"', '(gdb) ')
+        for line in stdin:
+            m = re.match(r'(\d*)(-[-\w]+)\s*(.*)', line.strip())
+            if not m:
+                continue
+            token, cmd, rest = m.groups()
+            if cmd == '-gdb-exit':
+                self.write(token + '^exit')
+                return
+            prefix = 'py_' if cmd in self.mi_commands else 'cmd_'
+            handler = getattr(self, prefix + cmd[1:].replace('-', '_'), None)
+            if handler is None:
+                self.write('%s^done,cmd=%s,args=%s' % (token, c_quote(cmd), c_quote(rest)), '(gdb) ')
+                continue
+            argv = parse_argv(rest.encode('latin-1'))
+            if argv is None:
+                self.error(token, 'Invalid argument string')
+            else:
+                handler(token, [a.decode('latin-1') for a in argv])
+
+    def error(self, token, msg):
+        self.write('%s^error,msg=%s' % (token, c_quote(msg)), '(gdb) ')
+
+    def cmd_hang(self, token, argv):
+        self.interrupted = False
+        while not self.interrupted:
+            time.sleep(0.01)
+        self.write('*stopped,reason="signal-received",signal-name="SIGINT"',
+                token + '^done', '(gdb) ')
+
+    def cmd_exec_next(self, token, argv):
+        self.steps += 1
+        self.regs[1] += 1
+        self.regs[3] += 1
+        self.write(token + '^running', '*running,thread-id="all"', '(gdb) ',
+                '*stopped,reason="end-stepping-range",thread-id="1",'
+                'frame={addr="0x1",func="main"}', '(gdb) ')
+    cmd_exec_continue = cmd_exec_next
+
+    def cmd_data_list_changed_registers(self, token, argv):
+        changed = [i for i in range(self.nregs)
+                if self.base is None or self.regs[i] != self.base[i]]
+        self.base = list(self.regs)
+        self.write('%s^done,changed-registers=[%s]' % (token,
+                ','.join('"%d"' % i for i in changed)), '(gdb) ')
+
+    def cmd_data_list_register_values(self, token, argv):
+        while argv and argv[0].startswith('-'):
+            argv = argv[1:]
+        if not argv:
+            self.write(token + '^error,msg="-data-list-register-values: Usage: '
+                    '-data-list-register-values [--skip-unavailable] <format> [<regnum1>...<regnumN>]"',
+                    '(gdb) ')
+            return
+        want = [int(a) for a in argv[1:]] if argv[1:] else range(self.nregs)
+        for n in want:
+            if not 0 <= n < self.nregs:
+                self.write(token + '^error,msg="bad register number"', '(gdb) ')
+                return
+        self.write('%s^done,register-values=[%s]' % (token, ','.join(
+                '{number="%d",value="%d"}' % (n, self.regs[n]) for n in want)), '(gdb) ')
+
+    def cmd_data_disassemble(self, token, argv):
+        opts = dict(zip(argv[0::2], argv[1::2]))
+        start, end = int(opts['-s'], 0), int(opts['-e'], 0)
+        self.write('=memory-changed,thread-group="i1",addr="0x0",len="0x0"',
+                '%s^done,asm_insns=[%s]' % (token, ','.join(
+                '{address="0x%x",func_name="main",offset="%d",inst="nop"}' % (a, a - start)
+                for a in range(start, end))), '(gdb) ')
+
+    def cmd_thread_info(self, token, argv):
+        self.write('%s^done,threads=[%s],current-thread-id="1"' % (token, ','.join(
+                '{id="%d",target-id="LWP %d",frame={level="0",addr="0x401000",'
+                'func="worker",file="w.c",fullname="/src/w.c",line="10"},state="stopped"}'
+                % (i, 1000 + i) for i in range(1, self.nthreads + 1))), '(gdb) ')
+
+    def cmd_stack_list_frames(self, token, argv):
+        self.write('%s^done,stack=[%s]' % (token, ','.join(
+                'frame={level="%d",addr="0x%x",func="f%d",file="w.c",'
+                'fullname="/src/w.c",line="%d"}' % (i, 0x401000 + 16 * i, i, 10 + i)
+                for i in range(self.nframes))), '(gdb) ')
+
+    def evaluate(self, expr):
+        ''' Return the value of `expr` as a str, or raise ValueError with
+            GDB's message.
+        '''
+        m = re.fullmatch(r'(-*)\s*(\$?\w+)', expr.strip())
+        if m is None:
+            raise ValueError('A syntax error in expression, near `%s\'.' % expr)
+        negations, atom = m.groups()
+        if atom == '$_thread':
+            value = self.thread
+        elif atom == '$pc':
+            value = 0x401000 + 16 * self.frame
+        elif atom.isdigit():
+            value = int(atom)
+        elif atom in self.symbols:
+            value = self.symbols[atom]
+        else:
+            raise ValueError('No symbol "%s" in current context.' % atom)
+        if len(negations) % 2:
+            value = -value
+        return '0x%x' % value if atom == '$pc' else str(value)
+
+    def select(self, thread, frame):
+        ''' Select a thread and frame (None for no change), or raise
+            ValueError.
+        '''
+        if thread is not None:
+            if not 1 <= thread <= self.nthreads:
+                raise ValueError('Invalid thread id: %d' % thread)
+            self.thread = thread
+        if frame is not None:
+            if not 0 <= frame < self.nframes:
+                raise ValueError('No frame at level %d.' % frame)
+            self.frame = frame
+
+    def cmd_data_evaluate_expression(self, token, argv):
+        # --thread and --frame only apply to this command.
+        opts = {}
+        while argv and argv[0] in ('--thread', '--frame'):
+            opts[argv[0]] = int(argv[1])
+            argv = argv[2:]
+        if len(argv) != 1:
+            self.error(token, '-data-evaluate-expression: '
+                    'Usage: -data-evaluate-expression expression')
+            return
+        old = (self.thread, self.frame)
+        try:
+            self.select(opts.get('--thread'), opts.get('--frame'))
+            value = self.evaluate(argv[0])
+        except ValueError as e:
+            self.error(token, str(e))
+            return
+        finally:
+            self.thread, self.frame = old
+        self.write('%s^done,value=%s' % (token, c_quote(value)), '(gdb) ')
+
+    def cmd_interpreter_exec(self, token, argv):
+        words = argv[1].split() if argv[1:2] else []
+        if words[:1] == ['python']:
+            if not self.python:
+                self.error(token, 'Python scripting is not supported in this copy of GDB.')
+                return
+            if 'gdb.MICommand' in argv[1] and '_EvaluateMany' in argv[1]:
+                self.mi_commands.add('-gdbmi-evaluate-many')
+        elif words[:3] == ['set', 'index-cache', 'enabled'] and self.version < 12:
+            self.error(token, 'Undefined set index-cache command: "enabled %s".  '
+                    'Try "help set index-cache".' % ' '.join(words[3:]))
+            return
+        elif words[:1] == ['set']:
+            self.settings.append(argv[1])
+        elif words[:2] == ['save', 'gdb-index']:
+            if self.file is None:
+                self.error(token, 'No object file specified.')
+                return
+            if self.file.endswith('-indexed'):
+                self.error(token, 'Cannot use an index to create the index')
+                return
+            name = os.path.join(words[2], os.path.basename(self.file) + '.gdb-index')
+            with open(name, 'w') as f:
+                f.write('index of %s\n' % self.file)
+        self.write(token + '^done', '(gdb) ')
+
+    def cmd_file_exec_and_symbols(self, token, argv):
+        if not os.path.exists(argv[0]):
+            self.error(token, '%s: No such file or directory.' % argv[0])
+            return
+        self.file = argv[0]
+        self.write(token + '^done', '(gdb) ')
+    cmd_file_symbol_file = cmd_file_exec_and_symbols
+
+    def cmd_stand_in_info(self, token, argv):
+        self.write('%s^done,argv=[%s],settings=[%s],env=[%s]' % (token,
+                ','.join(c_quote(a) for a in self.argv),
+                ','.join(c_quote(a) for a in self.settings),
+                ','.join('{name=%s,value=%s}' % (c_quote(k), c_quote(v))
+                        for (k, v) in sorted(os.environ.items()))), '(gdb) ')
+
+    def cmd_info_gdb_mi_command(self, token, argv):
+        name = '-' + argv[0]
+        exists = name in self.mi_commands or hasattr(self, 'cmd_' + argv[0].replace('-', '_'))
+        self.write('%s^done,command={exists="%s"}' % (token, 'true' if exists else 'false'),
+                '(gdb) ')
+
+    def py_gdbmi_evaluate_many(self, token, argv):
+        # As evaluate._helper_source parses its arguments.
+        thread = frame = None
+        try:
+            while argv and argv[0] in ('-t', '-f'):
+                if argv[0] == '-t':
+                    thread = int(argv[1])
+                else:
+                    frame = int(argv[1])
+                argv = argv[2:]
+        except (IndexError, ValueError) as e:
+            self.error(token, 'Error occurred in Python: %s' % e)
+            return
+        if argv and argv[0] == '--':
+            argv = argv[1:]
+        old = (self.thread, self.frame)
+        values = []
+        errors = []
+        try:
+            self.select(thread, frame)
+            for i, expr in enumerate(argv):
+                try:
+                    values.append(self.evaluate(expr))
+                except ValueError as e:
+                    values.append('')
+                    errors.append('{index="%d",msg=%s}' % (i, c_quote(str(e))))
+        except ValueError as e:
+            self.error(token, str(e))
+            return
+        finally:
+            self.thread, self.frame = old
+        self.write('%s^done,values=[%s],errors=[%s]' % (token,
+                ','.join(c_quote(v) for v in values), ','.join(errors)), '(gdb) ')
+
+    # The program's variables, for varobjs.
+    def element(self, var, index):
+        if var.expr == 'arr':
+            return str(10 * index + self.steps)
+        return str(100 + index + self.steps)
+
+    def length(self, var):
+        if var.expr == 'arr':
+            return self.arr_len
+        return self.vec_len + self.steps
+
+    def var_value(self, var):
+        if var.parent is not None:
+            return self.element(var.parent, var.index)
+        if var.expr == 'arr':
+            return '[%d]' % self.arr_len
+        if var.expr == 'vec':
+            return 'std::vector of length %d' % self.length(var)
+        return str(self.symbols[var.expr])
+
+    def child_fields(self, child):
+        return 'name="%s",exp="%d",numchild="0",value="%s",type="int",thread-id="1"' % (
+                child.name, child.index, child.value)
+
+    def add_child(self, var, index):
+        name = var.name + ('.[%d]' % index if var.dynamic else '.%d' % index)
+        child = var.children.get(index)
+        if child is None:
+            child = var.children[index] = self.varobjs[name] = Var(name, None, var, index)
+        child.value = self.var_value(child)
+        return child
+
+    def delete_var(self, var):
+        for child in var.children.values():
+            self.delete_var(child)
+        del self.varobjs[var.name]
+
+    def cmd_var_create(self, token, argv):
+        name, frame, expr = argv
+        if expr not in ('arr', 'vec') and expr not in self.symbols:
+            self.error(token, '-var-create: unable to create variable object')
+            return
+        if name == '-':
+            self.nvarobjs += 1
+            name = 'var%d' % self.nvarobjs
+        var = self.varobjs[name] = Var(name, expr)
+        var.value = self.var_value(var)
+        if var.dynamic:
+            extra = 'numchild="0",displayhint="array",dynamic="1",has_more="1"'
+        else:
+            extra = 'numchild="%d",has_more="0"' % (self.arr_len if expr == 'arr' else 0)
+        self.write('%s^done,name="%s",%s,value="%s",type="%s",thread-id="1"' % (
+                token, name, extra, var.value,
+                {'arr': 'int [%d]' % self.arr_len, 'vec': 'std::vector<int>'}.get(expr, 'int')),
+                '(gdb) ')
+
+    def cmd_var_list_children(self, token, argv):
+        if argv[0].startswith('--') or argv[0] in ('0', '1', '2'):
+            argv = argv[1:]
+        var = self.varobjs[argv[0]]
+        total = self.length(var) if var.expr in ('arr', 'vec') else 0
+        start, stop = (int(argv[1]), int(argv[2])) if len(argv) == 3 else (0, total)
+        stop = min(stop, total)
+        children = [self.add_child(var, i) for i in range(start, stop)]
+        if var.dynamic:
+            var.known = max(var.known, stop)
+        self.write('%s^done,numchild="%d",children=[%s],has_more="%d"' % (
+                token, len(children),
+                ','.join('child={%s}' % self.child_fields(c) for c in children),
+                var.dynamic and stop < total), '(gdb) ')
+
+    def cmd_var_set_frozen(self, token, argv):
+        self.varobjs[argv[0]].frozen = argv[1] == '1'
+        self.write(token + '^done', '(gdb) ')
+
+    def cmd_var_set_update_range(self, token, argv):
+        self.varobjs[argv[0]].range = (int(argv[1]), int(argv[2]))
+        self.write(token + '^done', '(gdb) ')
+
+    def cmd_var_update(self, token, argv):
+        if argv[0].startswith('--') or argv[0] in ('0', '1', '2'):
+            argv = argv[1:]
+        changes = []
+        if argv[0] == '*':
+            for var in list(self.varobjs.values()):
+                if var.parent is None:
+                    self.update_var(var, False, changes)
+        else:
+            self.update_var(self.varobjs[argv[0]], True, changes)
+        self.write('%s^done,changelist=[%s]' % (token, ','.join(changes)), '(gdb) ')
+
+    def update_var(self, var, explicit, changes):
+        # Frozen varobjs, and their children, are only updated when asked
+        # for by name.
+        if var.frozen and not explicit:
+            return
+        fields = []
+        value = self.var_value(var)
+        if value != var.value:
+            var.value = value
+            fields.append('value="%s"' % value)
+        children = sorted(var.children)
+        if var.dynamic:
+            # Only children in the update range (or all of them) are
+            # fetched again.
+            start, stop = var.range or (0, self.length(var))
+            children = [i for i in children if start <= i < stop]
+            # Until children are listed, GDB does not fetch any.
+            count = min(self.length(var), stop) if var.known else 0
+            if count < var.known:
+                for i in range(count, var.known):
+                    if i in var.children:
+                        self.delete_var(var.children.pop(i))
+                fields.append('new_num_children="%d"' % count)
+            elif count > var.known:
+                added = [self.add_child(var, i) for i in range(var.known, count)]
+                fields.append('new_num_children="%d",new_children=[%s]' % (count,
+                        ','.join('{%s}' % self.child_fields(c) for c in added)))
+            var.known = count
+            if fields:
+                fields.append('dynamic="1",has_more="%d"' % (self.length(var) > count))
+        if fields:
+            changes.append('{name="%s",%s,in_scope="true",type_changed="false"}' % (
+                    var.name, ','.join(fields)))
+        for i in children:
+            if i in var.children:
+                self.update_var(var.children[i], False, changes)
+
+    def cmd_var_assign(self, token, argv):
+        var = self.varobjs[argv[0]]
+        if var.expr != 'vec':
+            self.error(token, '-var-assign: Variable object is not editable')
+            return
+        self.vec_len = int(argv[1]) - self.steps
+        self.write('%s^done,value="%s"' % (token, self.var_value(var)), '(gdb) ')
+
+    def cmd_var_delete(self, token, argv):
+        self.delete_var(self.varobjs[argv[-1]])
+        self.write(token + '^done', '(gdb) ')
+
+class Var(object):
+    def __init__(self, name, expr, parent=None, index=None):
+        self.name = name
+        self.expr = expr
+        self.parent = parent
+        self.index = index
+        self.dynamic = expr == 'vec'
+        self.value = None
+        self.frozen = False
+        self.children = {}
+        # For dynamic varobjs: the update range, and how many children
+        # have been fetched.
+        self.range = None
+        self.known = 0
+
+def main():
+    gdb = FakeGdb(sys.stdout, sys.argv[1:])
+    def on_int(signum, frame):
+        gdb.interrupted = True
+    signal.signal(signal.SIGINT, on_int)
+    gdb.run(sys.stdin)
+
+if __name__ == '__main__':
+    main()
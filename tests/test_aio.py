@@ -0,0 +1,20 @@
+import asyncio
+
+from gdbmi.aio import AsyncGdbMi
+from gdbmi.parser import Class
+
+
+def test_start_and_interrupt(fake_gdb):
+    async def main():
+        gdb = await AsyncGdbMi.start(exe=fake_gdb)
+        r, oob = await gdb.mi_break_insert('a.c:1')
+        assert r.args == b'a.c:1'
+        hang = gdb._mi('-hang', [], {})
+        await asyncio.sleep(0.2)
+        gdb.do_signal_interrupt()
+        r, oob = await asyncio.wait_for(hang, 10)
+        assert r._class == Class.DONE
+        assert oob[0]._class == Class.STOPPED
+        gdb.mi_gdb_exit()
+        await asyncio.wait_for(gdb.wait(), 10)
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import pytest
+
+from gdbmi.cache import StopCache, _cacheable
+from gdbmi.mixin import encode_arg
+from gdbmi.parser import MiError, result_record
+from gdbmi.pipe import PipeGdbMi
+
+
+@pytest.fixture
+def cache(fake_gdb):
+    gdb = PipeGdbMi(exe=fake_gdb)
+    yield StopCache(gdb)
+    if gdb._alive():
+        gdb.mi_gdb_exit()
+
+def _values(records):
+    return [(e['number'], e['value']) for e in result_record(records).register_values]
+
+def _step(cache):
+    cache.mi_exec_next()
+    cache.wait_for_replies()
+
+def test_registers_refreshed_after_stop(cache):
+    assert _values(cache.mi_data_list_register_values('x', 1, 2)) == [(b'1', b'0'), (b'2', b'0')]
+    misses = cache.misses
+    assert _values(cache.mi_data_list_register_values('x', 1)) == [(b'1', b'0')]
+    assert cache.misses == misses
+    _step(cache)
+    assert _values(cache.mi_data_list_register_values('x', 1, 3)) == [(b'1', b'1'), (b'3', b'1')]
+
+def test_changed_registers_from_caller(cache):
+    _step(cache)
+    cache.mi_data_list_register_values('x')
+    _step(cache)
+    # This moves GDB's base past the step; the cache must not then
+    # believe nothing changed.
+    r = result_record(cache.mi_data_list_changed_registers())
+    assert list(r.changed_registers) == [b'1', b'3']
+    assert _values(cache.mi_data_list_register_values('x', 1)) == [(b'1', b'2')]
+
+def test_register_errors_come_from_gdb(cache):
+    cache.mi_data_list_register_values('x')
+    with pytest.raises(MiError) as info:
+        result_record(cache.mi_data_list_register_values('x', 1, 99))
+    assert 'bad register number' in str(info.value)
+    token = next(cache.counter)
+    records = cache.raw_command(token, b'%d-data-list-register-values' % token)
+    with pytest.raises(MiError) as info:
+        result_record(records)
+    assert 'Usage' in str(info.value)
+
+@pytest.mark.parametrize('expr, cacheable', [
+    ('x', True),
+    ('a == b', True),
+    ('a <= b && c != d', True),
+    ('(char) x', True),
+    ('arr[3]', True),
+    ('x = 1', False),
+    ('x += 1', False),
+    ('x <<= 1', False),
+    ('x >>= 1', False),
+    ('x++', False),
+    ('--x', False),
+    ('f()', False),
+    ('f (1)', False),
+    ('obj.reset()', False),
+    ('p->next->reset(2)', False),
+    ('(*fp)(1)', False),
+    ('table[0](1)', False),
+])
+def test_side_effects(expr, cacheable):
+    assert _cacheable(b'-data-evaluate-expression', b' ' + encode_arg(expr)) == cacheable
+
+def test_hit_has_new_token(cache):
+    first = next(cache.counter)
+    records = cache.raw_command(first, b'%d-data-evaluate-expression x' % first)
+    assert result_record(records)._token == first
+    hits = cache.hits
+    token = next(cache.counter)
+    r = result_record(cache.raw_command(token, b'%d-data-evaluate-expression x' % token))
+    assert cache.hits == hits + 1
+    assert r._token == token and r.value == b'42'
+    with cache.batch() as b:
+        b.mi_data_evaluate_expression('x')
+        b.mi_data_evaluate_expression('x')
+    assert cache.hits == hits + 3
+    tokens = [result_record(records)._token for records in b.results]
+    assert len(set(tokens + [first, token])) == 4
+    # The cached record itself is unchanged.
+    assert result_record(cache.raw_command(first, b'%d-data-evaluate-expression x' % first))._token == first
+
+def test_calls_are_not_cached(cache):
+    cache.mi_data_evaluate_expression('f()')
+    misses = cache.misses
+    cache.mi_data_evaluate_expression('f()')
+    assert cache.misses == misses
+    assert cache.hits == 0
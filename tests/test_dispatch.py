@@ -0,0 +1,110 @@
+import pytest
+from twisted.internet.error import ConnectionDone
+from twisted.internet.testing import StringTransport
+from twisted.python.failure import Failure
+
+from gdbmi.dispatch import Dispatcher
+from gdbmi.parser import parse
+from gdbmi.protocol import DeferredGdbMiProtocol
+
+
+class _Recorder(object):
+    ''' The callbacks for a Dispatcher, recording what they were given.
+    '''
+    def __init__(self, max_in_flight=None):
+        self.sent = []
+        self.resolved = []
+        self.failed = []
+        self.dispatcher = Dispatcher(self.sent.append,
+                lambda waiter, record, oob: self.resolved.append((waiter, record, oob)),
+                lambda waiter, reason: self.failed.append((waiter, reason)),
+                max_in_flight)
+
+def _reply(token, *oob):
+    return [parse(line) for line in oob] + [parse(b'%d^done' % token), parse(b'(gdb) ')]
+
+def test_match_by_token():
+    r = _Recorder()
+    d = r.dispatcher
+    d.submit(1, b'1-break-insert a.c:1', 'a')
+    d.submit_many([(2, b'2-break-insert a.c:2', 'b'), (3, b'3-break-insert a.c:3', 'c')])
+    assert r.sent == [b'1-break-insert a.c:1', b'2-break-insert a.c:2\n3-break-insert a.c:3']
+    assert len(d) == 3
+
+    claimed = [d.handle_record(rec) for rec in _reply(1, b'=thread-created,id="1"')]
+    # Out-of-band records are collected, but left unclaimed for others.
+    assert claimed == [False, True, False]
+    # Results with other tokens, or none, are not anyone's.
+    assert not d.handle_record(parse(b'9^done'))
+    assert not d.handle_record(parse(b'^done'))
+    for rec in _reply(3, b'*stopped,reason="breakpoint-hit"') + _reply(2):
+        d.handle_record(rec)
+
+    assert [(w, rec._token) for (w, rec, oob) in r.resolved] == [('a', 1), ('c', 3), ('b', 2)]
+    oob = {w: [o._class.name for o in oob] for (w, rec, oob) in r.resolved}
+    # The oldest command in flight gets them.
+    assert oob == {'a': ['thread_created'], 'b': ['stopped'], 'c': []}
+    assert len(d) == 0 and r.failed == []
+
+def test_max_in_flight():
+    r = _Recorder(max_in_flight=2)
+    d = r.dispatcher
+    for token in range(1, 4):
+        d.submit(token, b'%d-a' % token, token)
+    d.submit_many([(4, b'4-b', 4), (5, b'5-b', 5)])
+    # Only two are sent; the rest wait, in order.
+    assert r.sent == [b'1-a', b'2-a']
+    assert len(d) == 5
+    d.handle_record(parse(b'2^done'))
+    assert r.sent == [b'1-a', b'2-a', b'3-a']
+    d.handle_record(parse(b'1^done'))
+    d.handle_record(parse(b'3^done'))
+    assert r.sent == [b'1-a', b'2-a', b'3-a', b'4-b', b'5-b']
+    d.handle_record(parse(b'5^done'))
+    d.handle_record(parse(b'4^done'))
+    assert [w for (w, rec, oob) in r.resolved] == [2, 1, 3, 5, 4]
+    assert len(d) == 0
+
+def test_new_commands_wait_behind_held_back_ones():
+    r = _Recorder(max_in_flight=1)
+    d = r.dispatcher
+    d.submit(1, b'1-a', 1)
+    d.submit(2, b'2-a', 2)
+    d.handle_record(parse(b'1^done'))
+    # Even though there is room now, 3 must not overtake 2.
+    d.submit_many([(3, b'3-a', 3)])
+    assert r.sent == [b'1-a', b'2-a']
+
+def test_fail_all():
+    r = _Recorder(max_in_flight=1)
+    d = r.dispatcher
+    d.submit_many([(1, b'1-a', 'sent'), (2, b'2-a', 'held')])
+    reason = ConnectionError('gdb has exited')
+    d.fail_all(reason)
+    assert r.failed == [('sent', reason), ('held', reason)]
+    assert len(d) == 0 and r.resolved == []
+    # Late replies are not anyone's.
+    assert not d.handle_record(parse(b'1^done'))
+    assert r.sent == [b'1-a']
+
+def test_duplicate_token():
+    d = _Recorder().dispatcher
+    d.submit(1, b'1-a', 'a')
+    with pytest.raises(AssertionError):
+        d.submit(1, b'1-a', 'b')
+
+def test_deferreds_errback_on_connection_lost():
+    proto = DeferredGdbMiProtocol()
+    proto.max_in_flight = 1
+    proto.makeConnection(StringTransport())
+    done = proto.mi_break_insert('a.c:1')
+    sent, held = proto.raw_commands([90, 91], [b'90-break-insert a.c:2', b'91-break-insert a.c:3'])
+    proto.dataReceived(b'0^done,bkpt={number="1"}\n(gdb) \n')
+    results = []
+    errors = []
+    for d in (done, sent, held):
+        d.addCallbacks(results.append, errors.append)
+    assert results[0][0].bkpt == {'number': b'1'}
+    proto.connectionLost(Failure(ConnectionDone()))
+    assert len(results) == 1 and len(errors) == 2
+    assert all(e.check(ConnectionDone) for e in errors)
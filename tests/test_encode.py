@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from gdbmi.mixin import encode_arg
+
+from fakegdb import parse_argv
+
+
+def _random_args(n):
+    rng = random.Random(21)
+    alphabet = bytes(range(1, 256))
+    for _ in range(n):
+        yield bytes(rng.choice(alphabet) for _ in range(rng.randrange(0, 12)))
+
+@pytest.mark.parametrize('arg', [
+    b'"', b'""', b'x"y', b'"starts', b'ends"',
+    b'\\', b'\\\\', b'\\n', b'\\"', b'back\\slash"quote',
+    b' ', b'a b', b'\t', b'\n', b'\r\n', b'\v\f', b'  lead and trail  ',
+    b'\x7f', b'\x80', b'\xff', b'caf\xc3\xa9', b'\x01\x1b',
+    b'',
+    b'-', b'-1', b'--', b'-x y', b'-"',
+    b'*0x401000', b'node->children[3].name', b'/path with spaces/file.c:12',
+])
+def test_round_trip(arg):
+    # As gdb's mi_parse_argv() would split it, alone and among others.
+    for argv in [[arg], [arg, b'next'], [b'first', arg, arg], [b'', arg, b'']]:
+        line = b' '.join(encode_arg(a) for a in argv)
+        assert parse_argv(line) == argv, line
+
+def test_round_trip_random():
+    for arg in _random_args(5000):
+        line = encode_arg(arg) + b' ' + encode_arg(arg)
+        assert parse_argv(line) == [arg, arg], line
+
+def test_str_and_int():
+    assert parse_argv(encode_arg('a "b"') + b' ' + encode_arg(-12)) == [b'a "b"', b'-12']
+
+def test_nul():
+    with pytest.raises(ValueError):
+        encode_arg(b'a\0b')
@@ -0,0 +1,57 @@
+import itertools
+
+import pytest
+
+from gdbmi.evaluate import Evaluator
+from gdbmi.launch import Profile
+from gdbmi.mixin import MiCommandsMixin
+from gdbmi.parser import MiError
+from gdbmi.pipe import PipeGdbMi
+
+
+@pytest.fixture(params=['helper', 'batch'])
+def evaluator(request, fake_gdb):
+    args = ['--no-python'] if request.param == 'batch' else []
+    gdb = PipeGdbMi(exe=fake_gdb, profile=Profile(args=args))
+    yield Evaluator(gdb)
+    gdb.mi_gdb_exit()
+
+def _values(values):
+    return [str(v) if isinstance(v, MiError) else v for v in values]
+
+def test_install(evaluator):
+    assert evaluator.helper == (evaluator._gdb._popen.args[-1] != '--no-python')
+
+def test_evaluate_many(evaluator):
+    values = evaluator.evaluate_many(['-f', 'x', '-t', '--x', 'nope'])
+    assert _values(values) == [b'-7', b'42', b'-3', b'42',
+            'No symbol "nope" in current context.']
+    assert evaluator.evaluate_many([]) == []
+
+def test_thread_and_frame(evaluator):
+    assert evaluator.evaluate_many(['$_thread', '$pc', '-f'], thread=3, frame=2) == [
+            b'3', b'0x401020', b'-7']
+    assert evaluator.evaluate_many(['$pc'], frame=1) == [b'0x401010']
+    # The selection is as it was.
+    assert evaluator.evaluate_many(['$_thread', '$pc']) == [b'1', b'0x401000']
+
+def test_bad_thread(evaluator):
+    if evaluator.helper:
+        with pytest.raises(MiError):
+            evaluator.evaluate_many(['x', 'f'], thread=99)
+    else:
+        assert _values(evaluator.evaluate_many(['x', 'f'], thread=99)) == [
+                'Invalid thread id: 99'] * 2
+
+class _Lines(MiCommandsMixin):
+    def __init__(self):
+        self.counter = itertools.count(1)
+
+    def raw_command(self, token, line):
+        return line
+
+def test_dashes():
+    # Expressions are never taken for options.
+    gdb = _Lines()
+    assert gdb.mi_gdbmi_evaluate_many('-f', '-t') == b'1-gdbmi-evaluate-many -- -f -t'
+    assert gdb.mi_gdbmi_evaluate_many('-f', frame=2) == b'2-gdbmi-evaluate-many -f 2 -- -f'
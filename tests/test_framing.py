@@ -0,0 +1,75 @@
+from twisted.internet.testing import StringTransport
+
+from gdbmi.framing import LineBuffer
+from gdbmi.protocol import GdbMiProtocol
+
+
+def test_split_delimiter():
+    buf = LineBuffer(b'\r\n')
+    assert buf.feed(b'^done\r') == []
+    assert buf.feed(b'\n(gdb) ') == [b'^done']
+    assert buf.feed(b'\r') == []
+    assert buf.feed(b'\n') == [b'(gdb) ']
+    assert len(buf) == 0
+
+def test_line_in_many_chunks():
+    buf = LineBuffer()
+    for c in b'^done,value="1"':
+        assert buf.feed(bytes([c])) == []
+    assert buf.feed(b'\n') == [b'^done,value="1"']
+
+def test_many_lines_per_chunk():
+    buf = LineBuffer()
+    assert buf.feed(b'a\nb\n\nc') == [b'a', b'b', b'']
+    assert buf.feed(b'd\ne\n') == [b'cd', b'e']
+    assert buf.clear() == b''
+
+def test_overflow_keeps_complete_lines():
+    buf = LineBuffer(max_length=4)
+    assert buf.feed(b'abcd') == []
+    assert not buf.overflowed()
+    assert buf.feed(b'\nef\nghijk') == [b'abcd', b'ef']
+    assert buf.overflowed()
+    assert buf.clear() == b'ghijk'
+    assert not buf.overflowed()
+    assert buf.feed(b'l\n') == [b'l']
+
+
+class _Recorder(GdbMiProtocol):
+    def handle_begin(self):
+        self.records = []
+        self.exceeded = []
+
+    def handle_record(self, record):
+        self.records.append(record)
+
+    def lineLengthExceeded(self, line):
+        self.exceeded.append(line)
+
+def _connect(proto):
+    proto.makeConnection(StringTransport())
+    return proto
+
+def test_protocol_overflow():
+    proto = _Recorder()
+    proto.MAX_LENGTH = 8
+    _connect(proto)
+    proto.dataReceived(b'^done\n~"a"\n^done,x="123456789"')
+    assert [type(r).__name__ for r in proto.records] == ['ResultRecord', 'ConsoleStreamRecord']
+    assert proto.exceeded == [b'^done,x="123456789"']
+
+def test_protocol_overflow_complete_line():
+    proto = _Recorder()
+    proto.MAX_LENGTH = 8
+    _connect(proto)
+    proto.dataReceived(b'^done\n^done,x="123456789"\n^done\n')
+    assert len(proto.records) == 1
+    assert proto.exceeded == [b'^done,x="123456789"']
+
+def test_line_received_override():
+    class Lines(_Recorder):
+        def lineReceived(self, line):
+            self.records.append(line)
+    proto = _connect(Lines())
+    proto.dataReceived(b'^done\n(gdb) \n~"a')
+    assert proto.records == [b'^done', b'(gdb) ']
@@ -0,0 +1,71 @@
+import pytest
+
+from gdbmi import launch
+from gdbmi.launch import Profile, gdb_command, profiles
+from gdbmi.parser import result_record
+from gdbmi.pipe import PipeGdbMi
+
+
+@pytest.fixture
+def environ(monkeypatch):
+    monkeypatch.setenv('GDBMI_TEST_SECRET', 'hunter2')
+    monkeypatch.setenv('TERM', 'xterm-256color')
+    monkeypatch.setenv('LANG', 'C.UTF-8')
+
+def _info(gdb):
+    info = result_record(gdb._mi('-stand-in-info', [], {}))
+    env = {e['name'].decode(): e['value'].decode() for e in info.env}
+    return [a.decode() for a in info.argv], [s.decode() for s in info.settings], env
+
+def test_default_profile(environ):
+    full_exe, args, env = gdb_command('sh')
+    assert full_exe.endswith('/sh')
+    assert args == ['sh', '--interpreter=mi2']
+    assert env['GDBMI_TEST_SECRET'] == 'hunter2'
+    assert env['TERM'] == 'xterm-256color'
+
+def test_fast_profile(environ):
+    full_exe, args, env = gdb_command('sh', 'fast')
+    assert args == ['sh', '--interpreter=mi2', '-nx', '-q',
+            '-iex', 'set auto-load off',
+            '-iex', 'set pagination off',
+            '-iex', 'set confirm off',
+            '-iex', 'set debuginfod enabled off']
+    assert set(env) <= set(profiles['fast'].env) | {'TERM'}
+    assert env['LANG'] == 'C.UTF-8' and env['TERM'] == 'dumb'
+    assert 'GDBMI_TEST_SECRET' not in env
+
+def test_custom_profile(environ):
+    profile = Profile(args=['-nh'], settings=['set width 0'], env=['LANG'],
+            extra_env={'LANG': 'C', 'DEBUGINFOD_URLS': ''})
+    full_exe, args, env = gdb_command('no-such-gdb', profile)
+    assert full_exe is None
+    assert args == ['no-such-gdb', '--interpreter=mi2', '-nh', '-iex', 'set width 0']
+    assert env == {'LANG': 'C', 'DEBUGINFOD_URLS': ''}
+
+def test_spawn_fast(environ, fake_gdb):
+    gdb = PipeGdbMi(exe=fake_gdb, profile='fast')
+    argv, settings, env = _info(gdb)
+    gdb.mi_gdb_exit()
+    # What the fast profile adds, as GDB sees it.
+    assert argv[:2] == ['--interpreter=mi2', '-nx'] and '-q' in argv
+    assert settings == profiles['fast'].settings
+    assert env['TERM'] == 'dumb' and env['LANG'] == 'C.UTF-8'
+    assert 'GDBMI_TEST_SECRET' not in env
+
+def test_spawn_default(environ, fake_gdb):
+    gdb = PipeGdbMi(exe=fake_gdb)
+    argv, settings, env = _info(gdb)
+    gdb.mi_gdb_exit()
+    assert argv == ['--interpreter=mi2'] and settings == []
+    assert env['GDBMI_TEST_SECRET'] == 'hunter2'
+    assert env['TERM'] == 'xterm-256color'
+
+def test_startup_hooks(monkeypatch, fake_gdb):
+    calls = []
+    monkeypatch.setattr(launch, 'startup_hooks', [lambda *args: calls.append(args)])
+    gdb = PipeGdbMi(exe=fake_gdb, profile='fast')
+    gdb.mi_gdb_exit()
+    [(client, seconds)] = calls
+    assert client is gdb
+    assert 0 <= seconds == gdb.startup_time
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from gdbmi import metrics
+from gdbmi.aio import AsyncGdbMi
+from gdbmi.parser import result_record
+from gdbmi.pipe import PipeGdbMi
+from gdbmi.sync import GdbMi
+
+
+@pytest.fixture
+def sink():
+    sink = metrics.MemorySink()
+    metrics.set_sink(sink)
+    yield sink
+    metrics.set_sink(None)
+
+def _counts(sink):
+    return {cmd: h.count for (cmd, h) in sink.latency.items()}
+
+def test_command_name():
+    assert metrics.command_name(b'12-break-insert main') == '-break-insert'
+    assert metrics.command_name(b'3-gdb-exit') == '-gdb-exit'
+    assert metrics.command_name(b'4-break-commands 1\nprint x\nend') == '-break-commands'
+
+@pytest.mark.parametrize('client', [PipeGdbMi, GdbMi])
+def test_batch_and_pipeline_latency(sink, fake_gdb, client):
+    gdb = client(exe=fake_gdb)
+    try:
+        result_record(gdb.mi_thread_info())
+        with gdb.batch() as b:
+            b.mi_break_insert('a.c:1')
+            b.mi_break_insert('a.c:2')
+            b.mi_stack_list_frames()
+        with gdb.pipeline() as p:
+            p.mi_break_insert('a.c:3')
+            p.mi_exec_next()
+        assert _counts(sink) == {
+            '-thread-info': 1,
+            '-break-insert': 3,
+            '-stack-list-frames': 1,
+            '-exec-next': 1,
+        }
+        assert all(h.min >= 0 for h in sink.latency.values())
+    finally:
+        gdb.mi_gdb_exit()
+
+def test_async_batch_latency(sink, fake_gdb):
+    async def main():
+        gdb = await AsyncGdbMi.start(exe=fake_gdb)
+        with gdb.batch() as b:
+            b.mi_break_insert('a.c:1')
+            b.mi_thread_info()
+        await asyncio.wait_for(asyncio.gather(*b.results), 10)
+        await gdb.mi_break_insert('a.c:2')
+        gdb.mi_gdb_exit()
+        await asyncio.wait_for(gdb.wait(), 10)
+    asyncio.run(main())
+    counts = _counts(sink)
+    # -gdb-exit is reported when its Future fails, too.
+    counts.pop('-gdb-exit', None)
+    assert counts == {'-break-insert': 2, '-thread-info': 1}
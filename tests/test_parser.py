@@ -0,0 +1,175 @@
+import pytest
+
+from gdbmi import parser
+
+from benchmarks import corpus
+
+
+# Lines covering every kind of record and value, and every escape
+# gdb's printchar() emits.
+_lines = [
+    b'(gdb) ',
+    b'^done',
+    b'12^done,value="42"',
+    b'3^error,msg="No symbol \\"nope\\" in current context."',
+    b'^running',
+    b'*running,thread-id="all"',
+    b'*stopped,reason="breakpoint-hit",disp="keep",bkptno="1",frame={addr="0x1",'
+    b'func="main",args=[{name="argc",value="1"},{name="argv",value="0x7ffe"}],'
+    b'file="a.c",line="5"},thread-id="1",stopped-threads="all",core="0"',
+    b'=thread-group-added,id="i1"',
+    b'=breakpoint-modified,bkpt={number="1",thread-groups=["i1","i2"],times="0"}',
+    b'~"GNU gdb\\n"',
+    b'@"target output\\r\\n"',
+    b'&"warning: \\"quoted\\" \\\\ backslash\\n"',
+    b'~"\\e[1;32mcolour\\e[0m\\n"',
+    b'~"bell\\a bs\\b tab\\t nl\\n ff\\f cr\\r esc\\e q\\" bs\\\\"',
+    b'~"octal \\000\\001\\013\\037\\177\\200\\377"',
+    b'~"caf\\303\\251"',
+    b'~""',
+    b'5^done,stack=[frame={level="0",func="f"},frame={level="1",func="main"}]',
+    b'6^done,empty_tuple={},empty_list=[],nested=[[["a"]],{x={y="z"}}]',
+    b'7^done,numchild="1",children=[child={name="var1.x",exp="x",numchild="0",'
+    b'value="1",type="int",thread-id="1"}],has_more="0"',
+    b'8^done,changelist=[{name="var1",value="2",in_scope="true",type_changed="false",'
+    b'new_num_children="3",has_more="0"}]',
+]
+
+def _corpus():
+    for line in _lines:
+        yield line
+    for name, make in corpus.scenarios:
+        for line in make(1):
+            yield line
+
+def _same(a, b):
+    return type(a) is type(b) and vars(a) == vars(b)
+
+def test_engines_agree():
+    n = 0
+    for line in _corpus():
+        fast = parser.parse(line)
+        slow = parser.parse(line, fast=False)
+        assert _same(fast, slow), line
+        assert _same(parser.parse(line, checked=True), slow), line
+        n += 1
+    assert n > len(_lines)
+
+@pytest.mark.parametrize('line', [
+    b'~"\\e"',
+    b'~"\\q"',
+    b'~"unterminated',
+    b'^done,x=',
+    b'^done,x={a="1"',
+    b'+download,{section=".text",section-size="1000"}',
+])
+def test_engines_agree_on_errors(line):
+    def outcome(**kwargs):
+        try:
+            return vars(parser.parse(line, **kwargs))
+        except (AssertionError, ValueError):
+            return 'error'
+    assert outcome() == outcome(fast=False)
+
+def test_checked_escapes():
+    # GDB writes ESC as \e; octal is only for characters with no name.
+    for line in (b'~"\\e[1m"', b'~"\\000\\013\\177\\303\\251"'):
+        assert _same(parser.parse(line, checked=True), parser.parse(line))
+    assert parser.parse(b'~"\\e[1m"', checked=True)._value == b'\x1b[1m'
+    for line in (b'~"\\033[1m"', b'~"\\101"', b'~"\\011"'):
+        with pytest.raises(AssertionError):
+            parser.parse(line, checked=True)
+
+def test_list_stream():
+    # Keys with underscores, as in the docstring's asm_insns.
+    line = (b'5^done,asm_insns=[{address="0x1",func_name="main",inst="nop"},'
+            b'{address="0x2",func_name="main",inst="ret"}],next_pc="0x3"')
+    full = parser.parse(line)
+    for stream in (parser.ListStream(line, 'asm_insns'),
+            parser.ListStream.from_lazy(parser.parse(line, lazy=True), 'asm_insns'),
+            parser.ListStream.from_lazy(parser.parse(line, lazy=True, compact=True), 'asm_insns')):
+        assert [dict(i) for i in stream] == full.asm_insns
+        assert stream.record._token == 5
+        assert stream.record.next_pc == b'0x3'
+
+def _load(record):
+    # Any attribute that is not there makes a lazy record parse its payload.
+    getattr(record, '_value', None)
+    return record
+
+def test_lazy_agrees():
+    for line in _lines:
+        eager = parser.parse(line)
+        assert _same(_load(parser.parse(line, lazy=True)), eager), line
+        assert repr(parser.parse(line, lazy=True)) == repr(eager), line
+        compact = parser.parse(line, compact=True)
+        assert repr(_load(parser.parse(line, lazy=True, compact=True))) == repr(compact), line
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('line, name', [
+    (b'^done,x=', 'x'),
+    (b'^done,x={a="1"', 'x'),
+    (b'^done,x="1"junk', 'x'),
+    (b'~"unterminated', '_value'),
+    (b'~"a"b', '_value'),
+])
+def test_lazy_errors(line, name, compact):
+    record = parser.parse(line, lazy=True, compact=compact)
+    # The error is the same every time, not just the first.
+    for _ in range(2):
+        with pytest.raises(AssertionError):
+            getattr(record, name)
+    with pytest.raises(AssertionError):
+        repr(record)
+
+@pytest.mark.parametrize('line', [b'', b'12', b'^'])
+def test_lazy_truncated_header(line):
+    with pytest.raises(AssertionError):
+        parser.parse(line, lazy=True)
+
+def _lookup(record, name):
+    try:
+        return getattr(record, name)
+    except AttributeError:
+        return AttributeError
+
+def _same_values(compact, full):
+    if isinstance(full, dict):
+        assert isinstance(compact, parser.Tuple)
+        assert list(compact) == list(full)
+        for k in full:
+            assert k in compact
+            _same_values(compact[k], full[k])
+        assert 'nope' not in compact and compact.get('nope') is None
+        with pytest.raises(KeyError):
+            compact['nope']
+    elif isinstance(full, list):
+        assert len(compact) == len(full)
+        for c, f in zip(compact, full):
+            _same_values(c, f)
+    else:
+        assert compact == full
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_compact_layout_agrees(lazy):
+    for line in _lines:
+        full = parser.parse(line)
+        compact = parser.parse(line, lazy=lazy, compact=True)
+        assert isinstance(compact, type(full))
+        # Including names that only some kinds of record have.
+        for name in set(vars(full)) | {'_value', '_token', '_class', 'nope'}:
+            if _lookup(full, name) is AttributeError:
+                assert _lookup(compact, name) is AttributeError, (line, name)
+            else:
+                _same_values(getattr(compact, name), getattr(full, name))
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('compact', [False, True])
+def test_with_token(lazy, compact):
+    line = b'7^done,value="42",frame={level="0"}'
+    record = parser.parse(line, lazy=lazy, compact=compact)
+    copy = parser.with_token(record, 12)
+    assert type(copy) is type(record)
+    assert copy._token == 12 and record._token == 7
+    assert copy.value == b'42' and copy.frame == {'level': b'0'}
+    assert repr(copy) == repr(parser.parse(b'12' + line[1:], compact=compact))
@@ -0,0 +1,87 @@
+import pytest
+
+from gdbmi.mixin import DisassembleMode
+from gdbmi.parser import Class, result_record
+from gdbmi.pipe import PipeGdbMi
+from gdbmi.sync import GdbMi
+from gdbmi.timeouts import Timeout
+
+
+@pytest.fixture(params=[PipeGdbMi, GdbMi])
+def gdb(request, fake_gdb):
+    gdb = request.param(exe=fake_gdb)
+    gdb.escalation_delay = 0.5
+    yield gdb
+    if gdb._alive():
+        gdb.mi_gdb_exit()
+
+def test_batch_times_out_and_recovers(gdb):
+    gdb.timeout = 0.5
+    with pytest.raises(Timeout) as info:
+        with gdb.batch() as b:
+            b.mi_break_insert('a.c:1')
+            b._mi('-hang', [], {})
+            b.mi_break_insert('a.c:2')
+    assert info.value.recovered
+    # Every reply has been consumed, so the next command gets its own.
+    r = result_record(gdb.mi_break_insert('a.c:3'))
+    assert r.args == b'a.c:3'
+
+def test_pipeline_deadline(gdb):
+    gdb.timeout = 0.5
+    p = gdb.pipeline()
+    p._mi('-hang', [], {})
+    with pytest.raises(Timeout) as info:
+        p.flush()
+    assert info.value.recovered
+
+def test_stream(gdb):
+    gdb.mi_break_insert('a.c:1')
+    stream = gdb.stream('asm_insns').mi_data_disassemble(
+            DisassembleMode.disassembly_only, 0x10, 0x1010)
+    assert stream.record._class == Class.DONE
+    n = 0
+    for insn in stream:
+        assert insn['address'] == b'0x%x' % (0x10 + n)
+        assert insn['func_name'] == b'main'
+        n += 1
+    assert n == 0x1000
+    # The notification comes with the next reply.
+    records = gdb.mi_break_insert('a.c:2')
+    assert records[0]._class == Class.MEMORY_CHANGED
+    assert result_record(records).args == b'a.c:2'
+
+def test_pipeline_stopped_prompt(gdb):
+    # *stopped comes with an extra prompt, which is not a reply.
+    with gdb.pipeline() as p:
+        a = p.mi_break_insert('a.c:1')
+        step = p.mi_exec_next()
+        b = p.mi_break_insert('a.c:3')
+    assert result_record(a.result()).args == b'a.c:1'
+    assert result_record(step.result())._class == Class.DONE
+    records = b.result()
+    assert any(getattr(r, '_class', None) == Class.STOPPED for r in records)
+    assert result_record(records).args == b'a.c:3'
+    # Nothing is left over for the next command.
+    r = result_record(gdb.mi_break_insert('a.c:4'))
+    assert r.args == b'a.c:4'
+
+def test_batch_ending_with_exec(gdb):
+    with gdb.batch() as b:
+        b.mi_break_insert('a.c:1')
+        b.mi_exec_continue()
+    assert [result_record(r)._token for r in b.results] == sorted(
+            result_record(r)._token for r in b.results)
+    # As after a single -exec-continue, *stopped is still to come.
+    records = gdb.wait_for_replies()
+    assert records[0]._class == Class.STOPPED
+    assert result_record(gdb.mi_break_insert('a.c:2')).args == b'a.c:2'
+
+def test_str_lines(gdb):
+    # Lines may still be given as str, as before they were bytes.
+    assert result_record(gdb.raw_command(100, '100-break-insert a.c:1')).args == b'a.c:1'
+    replies = gdb.raw_commands([101, 102], ['101-break-insert a.c:2', b'102-break-insert a.c:3'])
+    assert [result_record(r).args for r in replies] == [b'a.c:2', b'a.c:3']
+    with gdb.pipeline() as p:
+        reply = p.raw_command(103, '103-break-insert a.c:4')
+    assert result_record(reply.result()).args == b'a.c:4'
@@ -0,0 +1,27 @@
+import threading
+
+from gdbmi.pool import SessionPool
+
+
+def test_release_after_close(fake_gdb):
+    pool = SessionPool(exe=fake_gdb)
+    gdb = pool.acquire(fake_gdb)
+    pool.close()
+    pool.release(gdb)
+    assert not gdb._alive()
+    assert len(pool) == 0
+
+def test_close_while_releasing(fake_gdb):
+    # close() from another thread while release() is resetting.
+    class Pool(SessionPool):
+        def reset(self, gdb):
+            t = threading.Thread(target=self.close)
+            t.start()
+            t.join()
+            SessionPool.reset(self, gdb)
+    pool = Pool(exe=fake_gdb)
+    gdb = pool.acquire(fake_gdb)
+    pool.release(gdb)
+    assert not gdb._alive()
+    assert len(pool) == 0
+    assert not pool._idle
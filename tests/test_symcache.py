@@ -0,0 +1,107 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from gdbmi.elf import build_id
+from gdbmi.launch import Profile
+from gdbmi.parser import MiError
+from gdbmi.pipe import PipeGdbMi
+from gdbmi.symcache import IndexCache
+
+
+def _build(directory, name, build_id_arg):
+    if shutil.which('gcc') is None:
+        pytest.skip('needs gcc')
+    src = os.path.join(directory, 'main.c')
+    with open(src, 'w') as f:
+        f.write('int main(void) { return 0; }\n')
+    exe = os.path.join(directory, name)
+    subprocess.check_call(['gcc', '-g', '-Wl,--build-id=' + build_id_arg, '-o', exe, src])
+    return exe
+
+@pytest.fixture
+def exe(tmp_path):
+    return _build(str(tmp_path), 'prog', '0x0123456789abcdef')
+
+@pytest.fixture
+def session(fake_gdb):
+    sessions = []
+    def new(args=()):
+        gdb = PipeGdbMi(exe=fake_gdb, profile=Profile(args=args))
+        sessions.append(gdb)
+        return gdb
+    yield new
+    for gdb in sessions:
+        if gdb._alive():
+            gdb.mi_gdb_exit()
+
+def test_build_id(tmp_path, exe):
+    assert build_id(exe) == '0123456789abcdef'
+    assert build_id(_build(str(tmp_path), 'none', 'none')) is None
+    assert build_id(__file__) is None
+    assert build_id(str(tmp_path / 'missing')) is None
+
+def test_load_saves_then_reuses(tmp_path, exe, session):
+    cache = IndexCache(str(tmp_path / 'cache'))
+    gdb = session()
+    cache.configure(gdb)
+    cache.load(gdb, exe)
+    cached = cache.path('0123456789abcdef')
+    with open(cached) as f:
+        assert f.read() == 'index of %s\n' % exe
+    # No temporary directories are left behind.
+    assert os.listdir(cache.directory) == [os.path.basename(cached)]
+
+    # A later session finds it, and marks it as recently used.
+    os.utime(cached, (1000, 1000))
+    inode = os.stat(cached).st_ino
+    gdb = session()
+    cache.configure(gdb)
+    cache.load(gdb, exe, symbol_file=True)
+    st = os.stat(cached)
+    assert st.st_ino == inode and st.st_mtime > 1000
+
+    # Rebuilt, it has another build-id, so the old index is not used.
+    rebuilt = _build(str(tmp_path), 'prog', '0xfedcba9876543210')
+    assert rebuilt == exe
+    cache.load(gdb, exe)
+    assert sorted(os.listdir(cache.directory)) == [
+            '0123456789abcdef.gdb-index', 'fedcba9876543210.gdb-index']
+
+def test_configure_before_gdb_12(tmp_path, exe, session):
+    cache = IndexCache(str(tmp_path / 'cache'))
+    gdb = session(['--gdb-11'])
+    cache.configure(gdb)
+    cache.load(gdb, exe)
+    assert cache.size() > 0
+
+def test_nothing_to_save(tmp_path, exe, session):
+    cache = IndexCache(str(tmp_path / 'cache'))
+    gdb = session()
+    cache.configure(gdb)
+    # No build-id, so nothing to key it by.
+    cache.load(gdb, _build(str(tmp_path), 'none', 'none'))
+    # GDB refuses to save an index.
+    indexed = str(tmp_path / 'prog-indexed')
+    shutil.copy(exe, indexed)
+    cache.load(gdb, indexed)
+    assert os.listdir(cache.directory) == []
+    with pytest.raises(MiError):
+        cache.load(gdb, str(tmp_path / 'missing'))
+
+def test_evict_least_recently_used(tmp_path):
+    cache = IndexCache(str(tmp_path / 'cache'), max_bytes=250)
+    for i, bid in enumerate(['aa', 'bb', 'cc', 'dd']):
+        with open(cache.path(bid), 'wb') as f:
+            f.write(b'x' * 100)
+        os.utime(cache.path(bid), (1000 + i, 1000 + i))
+    # Used since it was saved.
+    os.utime(cache.path('aa'), (2000, 2000))
+    with open(os.path.join(cache.directory, 'other'), 'wb') as f:
+        f.write(b'x' * 1000)
+    assert cache.size() == 400
+    cache.evict()
+    assert sorted(os.listdir(cache.directory)) == ['aa.gdb-index', 'dd.gdb-index', 'other']
+    assert cache.size() == 200
@@ -0,0 +1,58 @@
+import threading
+
+from gdbmi.parser import Class, result_record
+from gdbmi.threaded import ThreadedGdbMi
+
+
+def _run(fn, timeout=60):
+    # Run fn on another thread, so a deadlock fails instead of hanging.
+    rv = []
+    t = threading.Thread(target=lambda: rv.append(fn()))
+    t.daemon = True
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), 'deadlocked'
+    return rv[0]
+
+def _big_batch(gdb, n):
+    with gdb.batch() as b:
+        for i in range(n):
+            b.mi_break_insert('walk.c:%d' % i)
+    return b.results
+
+def test_batch_larger_than_pipe_buffer(fake_gdb):
+    gdb = ThreadedGdbMi(exe=fake_gdb)
+    gdb.keep_events = False
+    results = _run(lambda: _big_batch(gdb, 20000))
+    tokens = [result_record(r)._token for r in results]
+    assert tokens == sorted(tokens) and len(tokens) == 20000
+    gdb.mi_gdb_exit()
+    gdb.wait(10)
+
+def test_backlog_larger_than_pipe_buffer(fake_gdb):
+    # The reader thread sends held back commands as replies arrive.
+    gdb = ThreadedGdbMi(exe=fake_gdb, max_in_flight=5000)
+    gdb.keep_events = False
+    results = _run(lambda: _big_batch(gdb, 20000))
+    assert len(results) == 20000
+    gdb.mi_gdb_exit()
+    gdb.wait(10)
+
+def test_signal_interrupt(fake_gdb):
+    gdb = ThreadedGdbMi(exe=fake_gdb)
+    gdb.keep_events = False
+    t = threading.Timer(0.2, gdb.do_signal_interrupt)
+    t.start()
+    records = _run(lambda: gdb._mi('-hang', [], {}))
+    assert records[0]._class == Class.STOPPED
+    gdb.mi_gdb_exit()
+    gdb.wait(10)
+
+def test_str_lines(fake_gdb):
+    gdb = ThreadedGdbMi(exe=fake_gdb)
+    gdb.keep_events = False
+    assert result_record(_run(lambda: gdb.raw_command(100, '100-break-insert a.c:1'))).args == b'a.c:1'
+    replies = _run(lambda: gdb.raw_commands([101], ['101-break-insert a.c:2']))
+    assert result_record(replies[0]).args == b'a.c:2'
+    gdb.mi_gdb_exit()
+    gdb.wait(10)
@@ -0,0 +1,60 @@
+import threading
+
+from gdbmi.parser import result_record
+from gdbmi.pipe import PipeGdbMi
+from gdbmi.threaded import ThreadedGdbMi
+from gdbmi.transcript import TranscriptWriter, read_transcript, write_stand_in
+
+
+def _session(gdb):
+    # What each command returned, without tokens.
+    rv = []
+    rv.append(result_record(gdb.mi_break_insert('a.c:1')).args)
+    rv.append(len(result_record(gdb.mi_stack_list_frames()).stack))
+    with gdb.batch() as b:
+        b.mi_break_insert('a.c:2')
+        b.mi_thread_info()
+    rv.append(result_record(b.results[0]).args)
+    rv.append(result_record(b.results[1]).current_thread_id)
+    rv.append(result_record(gdb.mi_break_insert('a.c:3')).args)
+    gdb.mi_gdb_exit()
+    return rv
+
+def test_record_and_replay(tmp_path, fake_gdb):
+    path = str(tmp_path / 'session.mi')
+    writer = TranscriptWriter(path)
+    recorded = _session(PipeGdbMi(exe=fake_gdb, transcript=writer))
+    writer.close()
+    assert recorded == [b'a.c:1', 12, b'a.c:2', b'1', b'a.c:3']
+
+    stand_in = str(tmp_path / 'gdb')
+    write_stand_in(stand_in, path, speed=0)
+    assert _session(PipeGdbMi(exe=stand_in)) == recorded
+
+def test_threaded_transcript(tmp_path, fake_gdb):
+    # Lines are sent and received on different threads; each must still
+    # be written whole.
+    path = str(tmp_path / 'threads.mi')
+    writer = TranscriptWriter(path)
+    gdb = ThreadedGdbMi(exe=fake_gdb, transcript=writer)
+    gdb.keep_events = False
+    def work(n):
+        for i in range(50):
+            result_record(gdb.mi_break_insert('t%d.c:%d' % (n, i)))
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    gdb.mi_gdb_exit()
+    gdb.wait(10)
+    writer.close()
+
+    sent = []
+    received = []
+    for direction, seconds, line in read_transcript(path):
+        assert seconds >= 0
+        (sent if direction == b'>' else received).append(line)
+    assert sum(b'-break-insert' in line for line in sent) == 200
+    replies = [line for line in received if b'^done,cmd="-break-insert"' in line]
+    assert len(replies) == 200
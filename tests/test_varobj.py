@@ -0,0 +1,86 @@
+import pytest
+
+from gdbmi.pipe import PipeGdbMi
+from gdbmi.varobj import VarobjTree
+
+
+@pytest.fixture
+def tree(fake_gdb):
+    gdb = PipeGdbMi(exe=fake_gdb)
+    yield VarobjTree(gdb)
+    gdb.mi_gdb_exit()
+
+def _step(tree):
+    tree._gdb.mi_exec_next()
+    tree._gdb.wait_for_replies()
+
+def _values(varobjs):
+    return [v.value for v in varobjs]
+
+def test_scroll_freezes_hidden_children(tree):
+    arr = tree.create('arr')
+    assert arr.numchild == 100 and not arr.dynamic
+    assert _values(tree.children(arr, 0, 10)) == [b'%d' % (10 * i) for i in range(10)]
+    assert _values(tree.children(arr, 10, 20)) == [b'%d' % (10 * i) for i in range(10, 20)]
+    assert [arr.children[i].frozen for i in range(20)] == [True] * 10 + [False] * 10
+
+    # Every element changes, but only the window is updated.
+    _step(tree)
+    changed = tree.update()
+    assert sorted(v.index for v in changed) == list(range(10, 20))
+    assert arr.children[0].value == b'0'
+
+    # Scrolling back updates what comes into view, without fetching it.
+    assert _values(tree.children(arr, 0, 10)) == [b'%d' % (10 * i + 1) for i in range(10)]
+    assert [arr.children[i].frozen for i in range(20)] == [False] * 10 + [True] * 10
+    assert len(tree) == 21
+    _step(tree)
+    assert sorted(v.index for v in tree.update()) == list(range(10))
+
+    # A window past the end is cut short.
+    assert len(tree.children(arr, 95, 200)) == 5
+    assert arr.window == (95, 100)
+
+def test_dynamic_window(tree):
+    vec = tree.create('vec')
+    assert vec.dynamic and vec.has_more and vec.numchild == 0
+    assert _values(tree.children(vec, 0, 3)) == [b'100', b'101', b'102']
+    assert vec.has_more and vec.numchild == 3
+
+    # It grows, but beyond the update range, so no more children yet.
+    _step(tree)
+    changed = tree.update()
+    assert vec in changed
+    assert sorted(v.index for v in changed if v is not vec) == [0, 1, 2]
+    assert vec.has_more and vec.numchild == 3
+    assert vec.value == b'std::vector of length 6'
+
+    assert _values(tree.children(vec, 0, 10)) == [b'%d' % (101 + i) for i in range(6)]
+    assert not vec.has_more and vec.numchild == 6
+
+    # Now it grows within the range: GDB reports the new child, and the
+    # cached ones are fetched again, since their indexes may differ.
+    _step(tree)
+    assert vec in tree.update()
+    assert vec.numchild == 7 and not vec.has_more
+    assert vec.children == {} and vec.window is None
+    assert _values(tree.children(vec, 0, 10)) == [b'%d' % (102 + i) for i in range(7)]
+
+    # It shrinks: the children past its end are gone.
+    tree._gdb.mi_var_assign(vec.name, 4)
+    assert vec in tree.update()
+    assert vec.numchild == 4 and not vec.has_more
+    assert sorted(vec.children) == [0, 1, 2, 3]
+    assert len(tree) == 5
+
+def test_delete(tree):
+    arr = tree.create('arr')
+    tree.children(arr, 0, 3)
+    x = tree.create('x')
+    assert x.value == b'42' and len(tree) == 5
+    tree.delete(arr)
+    assert tree.roots == [x] and len(tree) == 1
+    _step(tree)
+    assert tree.update() == []
+    tree.clear()
+    assert len(tree) == 0